@@ -0,0 +1,126 @@
+#! python 2 and 3
+"""
+    Empty image detection on raw interleaved 8 bit pixel buffers, eg. the MImage.pixels() buffer.
+    Does not import any Maya modules and falls back to pure Python if NumPy is not available.
+
+    MIT License
+
+    Copyright (c) 2018 Stefan Tapper
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Bytes tested per block, a multiple of 4 byte RGBA pixels
+BLOCK_SIZE = 4 * 4096 * 16
+
+
+def block_alpha_is_empty(block, depth=4, alpha_index=3):
+    """ True if every alpha byte of the interleaved 8 bit pixel block is zero """
+    if np is not None:
+        return not np.frombuffer(block, dtype=np.uint8)[alpha_index::depth].any()
+
+    alpha = bytearray(block[alpha_index::depth])
+    return alpha.count(b'\x00') == len(alpha)
+
+
+def alpha_is_empty(read_block, size, depth=4, alpha_index=3, block_size=BLOCK_SIZE):
+    """
+        Test the alpha bytes of an interleaved 8 bit pixel buffer block by block and
+        return on the first block containing a non zero alpha value.
+
+    :param read_block: callable(offset, length) returning length bytes of the buffer at offset
+    :param size: buffer size in bytes
+    :param depth: bytes per pixel
+    :param alpha_index: byte offset of the alpha channel inside a pixel
+    :param block_size: bytes to read per block, rounded down to whole pixels
+    """
+    block_size = max(depth, block_size - block_size % depth)
+
+    for offset in range(0, size, block_size):
+        block = read_block(offset, min(block_size, size - offset))
+
+        if not block_alpha_is_empty(block, depth, alpha_index):
+            # Image is not empty
+            return False
+
+    # Image is empty
+    return True
+
+
+def buffer_alpha_is_empty(data, depth=4, alpha_index=3, block_size=BLOCK_SIZE):
+    """ alpha_is_empty for buffers in memory eg. bytes, bytearray or array('B') """
+    return alpha_is_empty(lambda offset, length: data[offset:offset + length],
+                          len(data), depth, alpha_index, block_size)
+
+
+if __name__ == '__main__':
+    from array import array
+
+    def run_tests(block_size):
+        def test_empty():
+            assert buffer_alpha_is_empty(bytearray(64 * 4), block_size=block_size)
+            assert buffer_alpha_is_empty(b'', block_size=block_size)
+
+        def test_color_without_alpha():
+            data = bytearray(b'\xff\xff\xff\x00' * 64)
+            assert buffer_alpha_is_empty(data, block_size=block_size)
+
+        def test_alpha():
+            for pixel in (0, 17, 63):
+                data = bytearray(64 * 4)
+                data[pixel * 4 + 3] = 1
+                assert not buffer_alpha_is_empty(data, block_size=block_size)
+                assert not buffer_alpha_is_empty(bytes(data), block_size=block_size)
+                assert not buffer_alpha_is_empty(array('B', data), block_size=block_size)
+
+        def test_single_channel():
+            data = bytearray(50)
+            assert buffer_alpha_is_empty(data, depth=1, alpha_index=0, block_size=block_size)
+            data[49] = 255
+            assert not buffer_alpha_is_empty(data, depth=1, alpha_index=0, block_size=block_size)
+
+        def test_early_exit():
+            data = bytearray(64 * 4)
+            data[3] = 1
+            blocks_read = list()
+
+            def read_block(offset, length):
+                blocks_read.append(offset)
+                return data[offset:offset + length]
+
+            assert not alpha_is_empty(read_block, len(data), block_size=16)
+            assert blocks_read == [0]
+
+        test_empty()
+        test_color_without_alpha()
+        test_alpha()
+        test_single_channel()
+        test_early_exit()
+
+    for size in (4, 18, BLOCK_SIZE):
+        run_tests(size)
+
+    # Pure Python fallback
+    np = None
+    for size in (4, 18, BLOCK_SIZE):
+        run_tests(size)
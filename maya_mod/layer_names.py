@@ -0,0 +1,58 @@
+#! python 2 and 3
+"""
+    PSD layer naming shared by the mayapy PSD creation and the native PSD writer.
+    Does not import any Maya modules.
+
+    MIT License
+
+    Copyright (c) 2018 Stefan Tapper
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+import re
+from modules.setup_log import setup_logging
+
+LOGGER = setup_logging(__name__)
+
+
+def mladenka_renamer(name):
+    # Replace target looks t_
+    # eg. t_name -> name
+    try:
+        name = re.sub(r"^t_", '', name)
+    except Exception as e:
+        LOGGER.error(e)
+
+    # Remove layer number and _pfad
+    # eg. int_name_123_pfad -> int_name
+    try:
+        pattern = r'(_+)(\d\d\d)(_+)(.*)'
+        name = re.sub(pattern, r'', name)
+    except Exception as e:
+        LOGGER.error(e)
+
+    # Move int_ etc to end
+    # eg. int_name -> name_int
+    try:
+        pattern = r'(^int|ext|miko|tuer|itafel+)(_+)(.*)'
+        name = re.sub(pattern, r'\3\2\1', name)
+    except Exception as e:
+        LOGGER.error(e)
+
+    return name
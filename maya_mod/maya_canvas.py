@@ -34,6 +34,8 @@ from maya.api.OpenMaya import MImage
 
 import ctypes
 
+from maya_mod.image_alpha import alpha_is_empty
+
 
 def image_to_bytearray(img):
     """
@@ -44,6 +46,16 @@ def image_to_bytearray(img):
     return array('B', ctypes.string_at(data_ptr, w * h * 4))
 
 
+def image_alpha_is_empty(img):
+    """
+    test the alpha bytes of an api2 MImage block by block directly from it's pixel buffer,
+    returns on the first block containing alpha
+    """
+    w, h = img.getSize()
+    address = ctypes.cast(img.pixels(), ctypes.c_void_p).value
+    return alpha_is_empty(lambda offset, length: ctypes.string_at(address + offset, length), w * h * 4)
+
+
 def image_to_floatarray(img):
     """
     convert an api2 MImage in float format to a python bytearray
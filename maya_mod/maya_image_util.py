@@ -26,13 +26,15 @@
     SOFTWARE.
 """
 import os
-import re
 import glob
 from time import time, sleep
 import threading
 import maya.cmds as cmds
 from maya_mod.start_mayapy import run_module_in_standalone
-from maya_mod.maya_canvas import Canvas
+from maya.api.OpenMaya import MImage
+from maya_mod.maya_canvas import Canvas, image_alpha_is_empty
+from maya_mod.image_alpha import buffer_alpha_is_empty
+from maya_mod.layer_names import mladenka_renamer
 from modules.app_globals import ImgParams
 from modules.setup_log import setup_logging
 from maya_mod.socket_client import send_message
@@ -155,19 +157,26 @@ class MayaImgUtils(object):
     def open_as_maya_image(img_file):
         return Canvas.from_file(img_file)
 
+    @staticmethod
+    def read_maya_image(img_file):
+        img = MImage()
+        img.readFromFile(img_file)
+        return img
+
     @classmethod
     def detect_empty_image(cls, img_file):
         """
             Use MImage to detect if the provided image is empty.
-            We assume an RGBA image.
+            We assume an RGBA image. The alpha bytes are tested directly
+            on the MImage pixel buffer without creating a Canvas.
         """
-        __img = cls.open_as_maya_image(img_file)
-        return cls.detect_empty_m_image(__img)
+        __img = cls.read_maya_image(img_file)
+        return image_alpha_is_empty(__img)
 
     @staticmethod
     def detect_empty_m_image(maya_img_object):
         """
-            Use MImage to detect if the provided image is empty.
+            Use a Canvas to detect if the provided image is empty.
             We assume an RGBA image.
         """
         w, h = int(maya_img_object.width), int(maya_img_object.height)
@@ -175,18 +184,8 @@ class MayaImgUtils(object):
         if w is None or h is None:
             return False
 
-        for x in range(0, w):
-            for y in range(0, h):
-                _, _, _, __alpha = maya_img_object[x, y]
-
-                if __alpha > 0:
-                    del maya_img_object
-                    # Image is not empty
-                    return False
-
-        del maya_img_object
-        # Image is empty
-        return True
+        # Alpha channel of the Canvas as contiguous byte array
+        return buffer_alpha_is_empty(maya_img_object.channels[3], depth=1, alpha_index=0)
 
     @classmethod
     def delete_empty_images(cls, img_path, img_ext):
@@ -252,29 +251,3 @@ class MayaImgUtils(object):
 
         return False
 
-
-def mladenka_renamer(name):
-    # Replace target looks t_
-    # eg. t_name -> name
-    try:
-        name = re.sub(r"^t_", '', name)
-    except Exception as e:
-        LOGGER.error(e)
-
-    # Remove layer number and _pfad
-    # eg. int_name_123_pfad -> int_name
-    try:
-        pattern = r'(_+)(\d\d\d)(_+)(.*)'
-        name = re.sub(pattern, r'', name)
-    except Exception as e:
-        LOGGER.error(e)
-
-    # Move int_ etc to end
-    # eg. int_name -> name_int
-    try:
-        pattern = r'(^int|ext|miko|tuer|itafel+)(_+)(.*)'
-        name = re.sub(pattern, r'\3\2\1', name)
-    except Exception as e:
-        LOGGER.error(e)
-
-    return name
@@ -0,0 +1,123 @@
+#! python 2 and 3
+"""
+    Persistent mayapy worker process. Initializes Maya standalone once and then runs
+    modules requested by modules/mayapy_pool.py until it is told to exit.
+
+    mayapy.exe "path_to_this_script" [--stub]
+
+    Protocol, one JSON object per line on stdin/stdout:
+        request  {"id": 1, "cmd": "run", "module": "path/to/module.py", "args": ["arg", ...]}
+        response {"id": 1, "ok": true, "exit_code": 0, "error": ""}
+        request  {"id": 2, "cmd": "ping"}   response {"id": 2, "ok": true, "tasks": 1}
+        request  {"id": 3, "cmd": "exit"}   response {"id": 3, "ok": true}
+
+    Everything the executed modules print is redirected to stderr so stdout only carries
+    protocol messages. With --stub Maya is not initialized, modules run in a plain Python
+    interpreter which allows testing the pool without a Maya installation.
+
+    MIT License
+
+    Copyright (c) 2018 Stefan Tapper
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+import json
+import runpy
+import sys
+import traceback
+
+STUB = '--stub' in sys.argv[1:]
+
+
+def initialize_maya():
+    """ Initialize Maya standalone once and make further initialize calls of run modules a no-op """
+    import maya.standalone
+    maya.standalone.initialize()
+    maya.standalone.initialize = lambda *args, **kwargs: None
+
+
+def reset_maya_scene():
+    """ Start every task with an empty scene """
+    import maya.cmds as cmds
+    cmds.file(new=True, force=True)
+
+
+def run_module(module_file, args):
+    """ Run module_file as __main__ with args as command line arguments. Returns exit code and error """
+    argv = sys.argv
+    sys.argv = [module_file] + [str(a) for a in args]
+    exit_code, error = 0, ''
+
+    try:
+        runpy.run_path(module_file, run_name='__main__')
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code:
+            exit_code, error = 1, str(e.code)
+    except Exception:
+        exit_code, error = 1, traceback.format_exc()
+    finally:
+        sys.argv = argv
+
+    if not STUB:
+        try:
+            reset_maya_scene()
+        except Exception:
+            error += traceback.format_exc()
+
+    return exit_code, error
+
+
+def main():
+    # Keep stdout for protocol messages, module output goes to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    def respond(message):
+        protocol_out.write(json.dumps(message) + '\n')
+        protocol_out.flush()
+
+    if not STUB:
+        initialize_maya()
+
+    tasks = 0
+    for line in iter(sys.stdin.readline, ''):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+
+        cmd, request_id = request.get('cmd'), request.get('id')
+
+        if cmd == 'ping':
+            respond(dict(id=request_id, ok=True, tasks=tasks))
+        elif cmd == 'run':
+            exit_code, error = run_module(request.get('module'), request.get('args', list()))
+            tasks += 1
+            respond(dict(id=request_id, ok=exit_code == 0, exit_code=exit_code, error=error))
+        elif cmd == 'exit':
+            respond(dict(id=request_id, ok=True))
+            break
+        else:
+            respond(dict(id=request_id, ok=False, error='Unknown command: {}'.format(cmd)))
+
+
+if __name__ == '__main__':
+    main()
@@ -24,6 +24,7 @@
     OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
     SOFTWARE.
 """
+import os
 import socket
 import threading
 from modules.app_globals import *
@@ -35,14 +36,34 @@ def client(ip, port, message):
     s.close()
 
 
-def send_message(data, address=SocketAddress.main):
+def main_address(environ=None):
+    """
+    Address of the main app job slot this process was started for
+
+    :param environ: environment to read the slot port from, defaults to os.environ
+    :return: tuple (HOST-ADDRESS, PORT)
+    """
+    if environ is None:
+        environ = os.environ
+
+    port = environ.get(SocketAddress.main_port_env, '')
+    if port.isdigit():
+        return SocketAddress.main[0], int(port)
+
+    return SocketAddress.main
+
+
+def send_message(data, address=None):
     """
     Create socket connection and send string data
 
     :param data: string data to send
-    :param address: tuple (HOST-ADDRESS, PORT)
+    :param address: tuple (HOST-ADDRESS, PORT), defaults to the main app job slot address
     :return: None
     """
+    if address is None:
+        address = main_address()
+
     host, port = address
     try:
         client_thread = threading.Thread(target=client, args=(host, port, data))
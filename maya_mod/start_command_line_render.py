@@ -56,7 +56,8 @@ NORMAL_PRIORITY_CLASS = 0x00000020
 REALTIME_PRIORITY_CLASS = 0x00000100
 
 
-def run_command_line_render(my_file, out_dir, res_x, res_y, version, logger, image_format: str='iff'):
+def run_command_line_render(my_file, out_dir, res_x, res_y, version, logger, image_format: str='iff',
+                            env: dict=None):
     global LOGGER
     LOGGER = logger
 
@@ -83,7 +84,7 @@ def run_command_line_render(my_file, out_dir, res_x, res_y, version, logger, ima
 
     # Run Maya command line render
     my_env = dict()
-    my_env.update(os.environ)
+    my_env.update(os.environ if env is None else env)
     if 'MAYA_PLUG_IN_PATH' in my_env.keys():
         LOGGER.info('Creating environment without MAYA_PLUG_IN_PATH to fix mayaHardware2 not rendering issue.')
         my_env.pop('MAYA_PLUG_IN_PATH')
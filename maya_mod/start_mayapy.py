@@ -42,16 +42,19 @@ def run_module_in_standalone(module_file, *args, **kwargs):
     :type args: str
     :keyword version: The Autodesk Maya version to use eg. '2017'
     :keyword pipe_output: bool - Returns a PIPE to STDOUT and STDERR
+    :keyword env: dict - Environment of the mayapy process, defaults to the current environment
     :return: returns the Popen process object
     :rtype: subprocess.Popen
     """
     maya_py = None
 
-    pipe_output, version = False, None
+    pipe_output, version, env = False, None, None
     if 'pipe_output' in kwargs.keys():
         pipe_output = kwargs['pipe_output']
     if 'version' in kwargs.keys():
         version = kwargs['version']
+    if 'env' in kwargs.keys():
+        env = kwargs['env']
 
     # Get Maya installation path
     # if we already run in mayapy and version is None, will return 'MAYA_LOCATION' from os.environ
@@ -83,9 +86,9 @@ def run_module_in_standalone(module_file, *args, **kwargs):
 
     # Run Maya standalone
     if pipe_output:
-        process = sp.Popen(__arg_list, stdout=sp.PIPE, stderr=sp.STDOUT)
+        process = sp.Popen(__arg_list, stdout=sp.PIPE, stderr=sp.STDOUT, env=env)
     else:
-        process = sp.Popen(__arg_list)
+        process = sp.Popen(__arg_list, env=env)
 
     return process
 
@@ -67,6 +67,16 @@ class SocketAddress:
     watcher = ('localhost', 9006)
     time_out = 20
 
+    # Concurrent job slots use the ports of slot 0 offset by slot * slot_port_step
+    slot_port_step = 10
+    # Directs the child processes of a job slot to the main port of their slot
+    main_port_env = 'PFAD_AEFFCHEN_MAIN_PORT'
+
+    @classmethod
+    def slot_address(cls, address, slot=0):
+        host, port = address
+        return host, port + slot * cls.slot_port_step
+
     # Service broadcast
     service_magic = 'paln3s'
     service_port = 52121
@@ -19,19 +19,164 @@
         You should have received a copy of the GNU General Public License
         along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
 """
+import os
+import threading
+import time
 import psutil
 from pathlib import Path
 
 
+def file_is_locked(file_path):
+    """ Dirty method to check if a file is opened by another process on MS Windows """
+    file_object = None
+
+    try:
+        # Request write access without creating or truncating the file
+        file_object = open(file_path, 'r+b', buffering=0)
+        file_lock = False
+    except FileNotFoundError:
+        file_lock = False
+    except OSError:
+        file_lock = True
+    finally:
+        if file_object:
+            file_object.close()
+
+    return file_lock
+
+
+def _normalize_path(file) -> str:
+    return os.path.normcase(os.path.abspath(str(file)))
+
+
+class OpenFilesCache(object):
+    """
+        Open files per process, enumerated at most once every max_age seconds so checking
+        all images of one directory scan costs a single process enumeration.
+
+        Only processes whose name starts with one of process_names are examined, an empty
+        tuple examines every process. Uses /proc/<pid>/fd where available, psutil otherwise.
+    """
+    max_age = 2.0
+    process_names = tuple()
+
+    def __init__(self, process_names: tuple=None, max_age: float=None):
+        if process_names is not None:
+            self.process_names = tuple(n.lower() for n in process_names)
+        self.max_age = max_age or self.max_age
+
+        # pid: (process name, set of normalized open file paths)
+        self.processes = dict()
+        self._files = dict()
+        self._time = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._time = 0.0
+
+    def _match_name(self, name: str) -> bool:
+        if not self.process_names:
+            return True
+        return name.lower().startswith(self.process_names)
+
+    def _enumerate_proc(self) -> dict:
+        processes, own_pid = dict(), os.getpid()
+
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit() or int(pid) == own_pid:
+                continue
+
+            try:
+                with open(f'/proc/{pid}/comm') as f:
+                    name = f.read().strip()
+                if not self._match_name(name):
+                    continue
+
+                fd_dir = f'/proc/{pid}/fd'
+                files = set()
+                for fd in os.listdir(fd_dir):
+                    try:
+                        link = os.readlink(f'{fd_dir}/{fd}')
+                    except OSError:
+                        continue
+                    if link.startswith('/'):
+                        files.add(_normalize_path(link))
+            except OSError:
+                # Process ended or access denied
+                continue
+
+            processes[int(pid)] = (name, files)
+
+        return processes
+
+    def _enumerate_psutil(self, print_msg: bool=False) -> dict:
+        processes, own_pid = dict(), os.getpid()
+
+        for proc in psutil.process_iter():
+            try:
+                if proc.pid == own_pid or not self._match_name(proc.name()):
+                    continue
+
+                # this returns the list of opened files by the current process
+                files = {_normalize_path(nt.path) for nt in proc.open_files()}
+                processes[proc.pid] = (proc.name(), files)
+
+                if print_msg:
+                    print(proc.pid, proc.name(), files)
+            # This catches a race condition where a process ends
+            # before we can examine its files or access to the process is denied
+            except Exception as e:
+                if print_msg:
+                    print('Error accessing process. ', e)
+
+        return processes
+
+    def _update(self, print_msg: bool=False):
+        if os.path.isdir('/proc/self/fd'):
+            self.processes = self._enumerate_proc()
+        else:
+            self.processes = self._enumerate_psutil(print_msg)
+
+        self._files = dict()
+        for pid, (name, files) in self.processes.items():
+            for file in files:
+                self._files[file] = (pid, name)
+
+        self._time = time.monotonic()
+
+    def lookup(self, file: Path, print_msg: bool=False):
+        """ Process id and name of a process that has file opened or None """
+        with self._lock:
+            if time.monotonic() - self._time > self.max_age:
+                self._update(print_msg)
+
+            return self._files.get(_normalize_path(file))
+
+
 class CheckFileAccess(object):
-    def __init__(self, file, print_msg: bool=False):
+    # Shared by all checks of this process that do not provide their own cache
+    open_files = OpenFilesCache()
+
+    # Try to open the file for writing before examining processes, MS Windows only
+    probe_lock = os.name == 'nt'
+
+    def __init__(self, file, print_msg: bool=False, open_files: OpenFilesCache=None):
         self.process_id = None
         self.process_name = None
         self.file = file
         self.print_msg = print_msg
 
+        if open_files is not None:
+            self.open_files = open_files
+
     def check(self):
-        result = self._check_process_for_opened_files(self.file, self.print_msg)
+        # Fast path: file is opened without write sharing
+        if self.probe_lock and file_is_locked(self.file):
+            self.process_name = 'unknown'
+            return True
+
+        result = self._check_process_for_opened_files(self.file, self.open_files, self.print_msg)
 
         if result:
             self.process_id, self.process_name = result
@@ -40,35 +185,10 @@ class CheckFileAccess(object):
         return False
 
     @staticmethod
-    def _check_process_for_opened_files(file: Path, print_msg: bool = False):
-        for proc in psutil.process_iter():
-            try:
-                file_list = None
-
-                try:
-                    # this returns the list of opened files by the current process
-                    file_list = proc.open_files()
-                except PermissionError as e:
-                    if print_msg:
-                        print(e)
-                    continue
-
-                if file_list:
-                    if print_msg:
-                        print(proc.pid, proc.name)
+    def _check_process_for_opened_files(file: Path, open_files: OpenFilesCache, print_msg: bool = False):
+        result = open_files.lookup(file, print_msg)
 
-                    for nt in file_list:
-                        if print_msg:
-                            print("\t", nt.path)
-
-                        if Path(nt.path).as_posix() == file.as_posix():
-                            return proc.pid, proc.name
-
-            # This catches a race condition where a process ends
-            # before we can examine its files or access to the process is denied
-            except Exception as e:
-                if e:
-                    if print_msg:
-                        print('Error accessing process. ', e)
+        if result:
+            return result
 
         return False
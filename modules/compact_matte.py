@@ -0,0 +1,119 @@
+from typing import Tuple, Union
+
+import numpy as np
+
+
+class CompactMatte:
+    """
+        Single channel coverage matte that only stores the bounding box of it's covered pixels.
+
+        Mattes only become a full frame array when to_dense is called, eg. right before
+        the layer image is written. Empty mattes do not store any pixel data at all.
+    """
+    dtype = np.float32
+
+    def __init__(self, shape: Tuple[int, int], x: int=0, y: int=0, data: Union[np.ndarray, None]=None):
+        """
+        :param shape: full frame shape (height, width)
+        :param x: horizontal offset of the bounding box
+        :param y: vertical offset of the bounding box
+        :param data: bounding box coverage values, None for an empty matte
+        """
+        self.shape = tuple(shape)
+        self.x, self.y = x, y
+        self.data = data
+
+    def __repr__(self):
+        return '<{} {}x{} bbox: {}>'.format(self.__class__.__name__, self.shape[1], self.shape[0], self.bbox)
+
+    @classmethod
+    def from_coordinates(cls, shape: Tuple[int, int], flat_idx: np.ndarray, values: np.ndarray):
+        """ Create a matte from flat full frame pixel indices and their coverage values.
+            Values of indices occurring multiple times are summed up.
+        """
+        if not flat_idx.size:
+            return cls(shape)
+
+        h, w = shape
+        ys, xs = np.divmod(flat_idx, w)
+        y0, y1 = int(ys.min()), int(ys.max()) + 1
+        x0, x1 = int(xs.min()), int(xs.max()) + 1
+
+        local_idx = (ys - y0) * (x1 - x0) + (xs - x0)
+        data = np.bincount(local_idx, weights=values, minlength=(y1 - y0) * (x1 - x0))
+        return cls(shape, x0, y0, data.astype(cls.dtype).reshape(y1 - y0, x1 - x0))
+
+    @classmethod
+    def from_dense(cls, matte: np.ndarray):
+        """ Crop a full frame matte to the bounding box of it's non zero pixels """
+        rows, cols = np.nonzero(matte.any(axis=1))[0], np.nonzero(matte.any(axis=0))[0]
+
+        if not rows.size:
+            return cls(matte.shape)
+
+        y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        return cls(matte.shape, int(x0), int(y0), np.array(matte[y0:y1, x0:x1], dtype=cls.dtype))
+
+    @property
+    def bbox(self) -> Tuple[int, int, int, int]:
+        """ Bounding box as x_begin, y_begin, x_end, y_end """
+        if self.data is None:
+            return 0, 0, 0, 0
+        h, w = self.data.shape
+        return self.x, self.y, self.x + w, self.y + h
+
+    @property
+    def nbytes(self) -> int:
+        if self.data is None:
+            return 0
+        return self.data.nbytes
+
+    def is_empty(self) -> bool:
+        return self.data is None
+
+    def max(self) -> float:
+        if self.data is None:
+            return 0.0
+        return float(self.data.max())
+
+    def row_count(self) -> int:
+        """ Number of image rows containing coverage, same as dense_matte.any(axis=-1).sum() """
+        if self.data is None:
+            return 0
+        return int(self.data.any(axis=-1).sum())
+
+    def to_dense(self, out: np.ndarray=None) -> np.ndarray:
+        """ Return the full frame matte, optionally written into the provided array """
+        if out is None:
+            out = np.zeros(self.shape, dtype=self.dtype)
+        else:
+            out[:] = 0.0
+
+        if self.data is not None:
+            x0, y0, x1, y1 = self.bbox
+            out[y0:y1, x0:x1] = self.data
+
+        return out
+
+    def translated(self, shape: Tuple[int, int], y_offset: int=0, x_offset: int=0) -> 'CompactMatte':
+        """ This matte moved by the given offsets into a frame of shape, eg. a band matte into the full frame """
+        return self.__class__(shape, self.x + x_offset, self.y + y_offset, self.data)
+
+    def __iadd__(self, other: 'CompactMatte'):
+        """ Merge the coverage of another matte into this matte """
+        if other.data is None:
+            return self
+        if self.data is None:
+            self.x, self.y, self.data = other.x, other.y, other.data.copy()
+            return self
+
+        ax0, ay0, ax1, ay1 = self.bbox
+        bx0, by0, bx1, by1 = other.bbox
+        x0, y0, x1, y1 = min(ax0, bx0), min(ay0, by0), max(ax1, bx1), max(ay1, by1)
+
+        data = np.zeros((y1 - y0, x1 - x0), dtype=self.dtype)
+        data[ay0 - y0:ay1 - y0, ax0 - x0:ax1 - x0] += self.data
+        data[by0 - y0:by1 - y0, bx0 - x0:bx1 - x0] += other.data
+
+        self.x, self.y, self.data = x0, y0, data
+        return self
@@ -1,11 +1,60 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
 from modules.app_globals import ImgParams
 from modules.decryptomatte import DecyrptoMatte
+from modules.matte_cache import MatteCache
 from modules.utils import OpenImageUtil, MergeLayerByName, create_file_safe_name
 
 
+class BeautyPass:
+    """
+        Beauty render as contiguous planar rgb array(shape: 3, height, width)
+
+        The beauty is read once per job and kept until another beauty file is loaded,
+        so every layer composites from the same contiguous channel planes instead of
+        strided slices of an interleaved image.
+    """
+    _cache = dict()  # {(file, mtime, dtype): planes}
+
+    @classmethod
+    def load(cls, img_file: Path, half_float: bool=False):
+        """ Return the rgb planes of the beauty image, stored as float16 if half_float is set """
+        dtype = np.float16 if half_float else np.float32
+        key = (img_file.as_posix(), img_file.stat().st_mtime_ns, dtype)
+
+        if key not in cls._cache:
+            img = OpenImageUtil.read_image(img_file)
+            if img is None:
+                return None
+
+            planes = np.ascontiguousarray(np.transpose(img[:, :, :3], (2, 0, 1)), dtype=dtype)
+            del img
+
+            # Only keep the beauty of the current job
+            cls._cache = {key: planes}
+
+        return cls._cache[key]
+
+    @classmethod
+    def clear(cls):
+        cls._cache = dict()
+
+
 class CreateCryptomattes:
+    # Pipelined mode: decode all mattes in one pass and write the layers in writer threads
+    pipelined = True
+    writer_threads = 4
+    max_pending_layers = 8  # Number of finished layers allowed to wait for their writer
+    use_matte_cache = True  # Re-use decoded mattes of previous runs from the on disk MatteCache
+    use_memmap = False  # Back layer arrays with memory mapped files in the render output directory
+    beauty_half_float = False  # Store the beauty planes as float16 to halve their memory
+    crop_layers = True  # Write layer images cropped to their matte bounding box
+
     def __init__(self, output_dir: Path, scene_file: Path, logger=None):
         """
         Search for beauty and cryptomatte aov file output and create image file per id layer
@@ -22,6 +71,9 @@ class CreateCryptomattes:
 
         self.res_x, self.res_y = 0, 0
 
+        # Per writer thread re-used RGBA layer buffer
+        self._writer_buffers = threading.local()
+
         if logger:
             global LOGGER
             LOGGER = logger
@@ -41,12 +93,14 @@ class CreateCryptomattes:
 
         # Use beauty render if available
         if beauty_f:
-            beauty_img = self.img_util.read_image(beauty_f[0])
-
+            beauty_img = BeautyPass.load(beauty_f[0], self.beauty_half_float)
         return img_file, beauty_img
 
     def create_cryptomattes(self):
         """ Extract cryptomattes to files and return image_file_watcher dict """
+        if self.pipelined:
+            return self.create_cryptomattes_pipelined()
+
         img_file_dict, beauty_img = dict(), None
         img_file, beauty_img = self._find_files()
         if not img_file:
@@ -81,12 +135,9 @@ class CreateCryptomattes:
         # ---
         # --- Write the mattes to disk ---
         for layer_name, id_matte in output_mattes.items():
-            # Combine beauty and coverage matte
-            rgba_matte = d.merge_matte_and_rgb(id_matte, beauty_img)
-
-            # Pre-multiply RGBA matte
-            rgba_matte = self.img_util.premultiply_image(rgba_matte)
-            matte_img_file = self.output_dir / f'{create_file_safe_name(layer_name)}.{self.cryptomatte_out_file_ext}'
+            # Combine beauty and coverage matte to a pre-multiplied RGBA matte
+            rgba_matte = self.img_util.premultiplied_rgba(id_matte.to_dense(), rgb_planes=beauty_img)
+            matte_img_file = self._matte_img_file(layer_name)
 
             # Create image file dict entry
             img_file_dict.update({matte_img_file.stem: dict(path=matte_img_file, processed=True)})
@@ -101,3 +152,156 @@ class CreateCryptomattes:
             LOGGER.error(e)
 
         return img_file_dict, img_file_dict
+
+    def create_cryptomattes_pipelined(self):
+        """
+            Extract cryptomattes to files and return image_file_watcher dict
+
+            All mattes are decoded in a single pass over the image, they are stored cropped to
+            their bounding box. Every output layer is then handed to a writer thread pool that
+            combines, pre-multiplies and writes it, at most max_pending_layers full layers
+            are held in memory.
+        """
+        img_file_dict = dict()
+        img_file, beauty_img = self._find_files()
+        if not img_file:
+            return img_file_dict, img_file_dict
+
+        d = DecyrptoMatte(LOGGER, img_file)
+        layers = d.list_layers()
+        cache = self._create_matte_cache(img_file, d)
+
+        # Prepare merging of layers target->source looks(DeltaGen specific)
+        # MergeLayerByName removes mapped names from the list it is given
+        layer_re_mappping = MergeLayerByName(list(layers), self.scene).create_layer_mapping()
+
+        # Group source layers by their output layer
+        output_layers = dict()
+        for layer_name in layers:
+            output_layers.setdefault(layer_re_mappping.get(layer_name) or layer_name, list()).append(layer_name)
+
+        id_mattes = self._get_mattes(d, cache, layers)
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.writer_threads) as writer:
+            for layer_name, source_names in output_layers.items():
+                # Merge target look IDs eg. t_seat_a + t_seat_b
+                output_matte = None
+                for source_name in source_names:
+                    id_matte = id_mattes.pop(source_name, None)
+                    if id_matte is None:
+                        continue
+                    if output_matte is None:
+                        output_matte = id_matte
+                    else:
+                        output_matte += id_matte
+
+                if output_matte is None:
+                    # All source mattes were empty
+                    continue
+
+                matte_img_file = self._matte_img_file(layer_name)
+                img_entry = dict(path=matte_img_file, processed=True, bbox=output_matte.bbox)
+                if self.use_memmap:
+                    img_entry['buffer'] = self._layer_buffer_file(matte_img_file)
+                img_file_dict.update({matte_img_file.stem: img_entry})
+
+                # Bound the number of layers waiting for their writer
+                while len(pending) >= self.max_pending_layers:
+                    pending.popleft().result()
+
+                pending.append(writer.submit(self._write_matte, matte_img_file, output_matte, beauty_img,
+                                             img_entry.get('buffer')))
+
+            while pending:
+                pending.popleft().result()
+
+        # The PSD creation places cropped layer images at their offset
+        if self.crop_layers:
+            self.img_util.write_layer_offsets(
+                self.output_dir, {k: v['bbox'][:2] for k, v in img_file_dict.items()})
+
+        # CleanUp
+        d.shutdown()
+        try:
+            del d
+        except Exception as e:
+            LOGGER.error(e)
+
+        return img_file_dict, img_file_dict
+
+    def _create_matte_cache(self, img_file: Path, d: DecyrptoMatte):
+        if not self.use_matte_cache:
+            return None
+
+        try:
+            return MatteCache(img_file, d.manifest_cache, d.alpha_over_compositing)
+        except OSError as e:
+            LOGGER.error('Could not access matte cache: %s', e)
+
+    def _get_mattes(self, d: DecyrptoMatte, cache, layer_names: list) -> dict:
+        """ Return {layer_name: CompactMatte}, only decode the mattes missing from the cache """
+        if cache is None:
+            return d.get_mattes_by_names(layer_names)
+
+        id_mattes, missing = cache.load(layer_names)
+
+        if missing:
+            decoded_mattes = d.get_mattes_by_names(missing)
+            cache.store(decoded_mattes, missing, (self.res_y, self.res_x))
+            id_mattes.update(decoded_mattes)
+
+        return id_mattes
+
+    def _matte_img_file(self, layer_name: str) -> Path:
+        return self.output_dir / f'{create_file_safe_name(layer_name)}.{self.cryptomatte_out_file_ext}'
+
+    def _layer_buffer_file(self, matte_img_file: Path) -> Path:
+        return self.output_dir / self.img_util.layer_buffer_dir_name / f'{matte_img_file.stem}.npy'
+
+    def _writer_buffer(self, shape: tuple, buffer_file: Path=None):
+        """
+            Return a RGBA array of shape, a view of the full frame buffer of the current
+            writer thread or a new memory mapped buffer. Cropped layers use the leading
+            part of the full frame buffer so it is allocated once per thread.
+        """
+        h, w = shape
+        if buffer_file is not None:
+            return self.img_util.create_layer_buffer((h, w, 4), buffer_file=buffer_file)
+
+        size = h * w * 4
+        rgba = getattr(self._writer_buffers, 'rgba', None)
+        if rgba is None or rgba.size < size:
+            rgba = self._writer_buffers.rgba = self.img_util.create_layer_buffer(
+                (max(size, self.res_y * self.res_x * 4),))
+
+        return rgba[:size].reshape(h, w, 4)
+
+    def _write_matte(self, matte_img_file: Path, id_matte, beauty_img: np.ndarray, buffer_file: Path=None):
+        """
+            Writer thread: combine beauty and coverage matte, pre-multiply and write the layer image.
+            All steps work inside one RGBA array, a view of the re-used per thread buffer or
+            a memory mapped array if a buffer_file is provided.
+            With crop_layers the layer image only covers the bounding box of the matte.
+        """
+        try:
+            if self.crop_layers:
+                x0, y0, x1, y1 = id_matte.bbox
+                rgba_matte = self._writer_buffer((y1 - y0, x1 - x0), buffer_file)
+
+                matte = rgba_matte[:, :, 3]
+                matte[:] = id_matte.data
+                if beauty_img is not None:
+                    beauty_img = beauty_img[:, y0:y1, x0:x1]
+            else:
+                rgba_matte = self._writer_buffer(id_matte.shape, buffer_file)
+
+                # Expand the coverage matte directly into the alpha channel
+                matte = id_matte.to_dense(out=rgba_matte[:, :, 3])
+
+            self.img_util.premultiplied_rgba(matte, rgb_planes=beauty_img, out=rgba_matte)
+
+            self.img_util.write_image(matte_img_file, rgba_matte)
+            del matte, rgba_matte
+        except Exception as e:
+            LOGGER.error('Error writing cryptomatte layer %s: %s', matte_img_file.name, e)
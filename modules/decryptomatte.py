@@ -4,14 +4,59 @@ import logging
 import mmh3
 import os
 import struct
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 
 import OpenImageIO as oiio
-from OpenImageIO import ImageBuf
 from pathlib import Path
 from typing import List
 
+from modules.compact_matte import CompactMatte
+
+
+class IdIndex:
+    """
+        Sorted lookup table of cryptomatte ids. Resolves whole arrays of float32 id values
+        to slot indices with np.searchsorted on the uint32 bit patterns of the ids.
+    """
+    def __init__(self, id_bits: np.ndarray, names: List[str]=None):
+        """
+        :param id_bits: uint32 bit patterns of the float32 ids
+        :param names: layer name per id
+        """
+        order = np.argsort(id_bits, kind='mergesort')
+        self.id_bits, unique_idx = np.unique(np.asarray(id_bits, dtype=np.uint32)[order], return_index=True)
+        self.ids = self.id_bits.view(np.float32)
+        self.names = [names[i] for i in order[unique_idx]] if names else list()
+
+    def __len__(self):
+        return self.id_bits.size
+
+    @classmethod
+    def from_ids(cls, id_values: List[float]):
+        return cls(np.array(id_values, dtype=np.float32).view(np.uint32))
+
+    @classmethod
+    def from_manifest(cls, manifest: dict, layer_names: List[str]=None):
+        """ Create the index of all manifest entries or of the given layer names only """
+        if layer_names is None:
+            layer_names = list(manifest.keys())
+
+        names = [n for n in layer_names if n in manifest]
+        return cls(np.array([int(manifest[n], 16) for n in names], dtype=np.uint32), names)
+
+    def resolve(self, id_values: np.ndarray) -> np.ndarray:
+        """ Return the slot index for every id value, -1 for ids not in this index """
+        id_bits = np.ascontiguousarray(id_values, dtype=np.float32).view(np.uint32)
+        if not self.id_bits.size:
+            return np.full(id_bits.shape, -1, dtype=np.int64)
+
+        slots = np.searchsorted(self.id_bits, id_bits)
+        slots[slots == self.id_bits.size] = 0
+        slots[self.id_bits[slots] != id_bits] = -1
+        return slots
+
 
 class DecyrptoMatte:
     """ Most of this code is shamelessly stolen from original cryptomatte_arnold unit tests under BSD-3 license
@@ -20,8 +65,19 @@ class DecyrptoMatte:
     """
     empty_pixel_threshold = 5  # Minimum number of opaque pixels a matte must contain
     empty_value_threshold = 0.2  # Minimum sum of all coverage values of all pixels
+    vectorized_decoding = True  # Decode with NumPy array operations instead of the per pixel loop
 
-    def __init__(self, logger, img_file: Path, alpha_over_compositing=False):
+    tiled_min_pixels = 1920 * 1080  # Images smaller than this are decoded serially
+    tile_band_height = 256  # Number of scanlines decoded per worker task
+    scanline_chunk = 64  # Number of scanlines read from the image file at once
+
+    def __init__(self, logger, img_file: Path, alpha_over_compositing=False, workers: int=0):
+        """
+        :param logger: logger to use, basic logging if None
+        :param img_file: cryptomatte exr image file
+        :param alpha_over_compositing: set the highest ranked id opaque for alpha over compositing
+        :param workers: number of processes for tiled decoding, 0 = cpu count, 1 = serial decoding
+        """
         global LOGGER
         LOGGER = logger
         if logger is None:
@@ -29,22 +85,28 @@ class DecyrptoMatte:
             LOGGER = logging.getLogger(__name__)
 
         self.alpha_over_compositing = alpha_over_compositing
+        self.workers = workers or os.cpu_count() or 1
 
         self.img_file = img_file
-        self.img = ImageBuf(img_file.as_posix())
+        self.img_input = oiio.ImageInput.open(img_file.as_posix())
+        if self.img_input is None:
+            LOGGER.error('Error reading image: %s', oiio.geterror())
+        self.spec = self.img_input.spec() if self.img_input else oiio.ImageSpec()
         self.metadata_cache = {}
         self.manifest_cache = {}
+        self.id_index_cache = None
 
     def shutdown(self):
         """ Release resources """
         try:
             del self.metadata_cache
             del self.manifest_cache
-            self.img.clear()
-            del self.img
+            if self.img_input:
+                self.img_input.close()
+            del self.img_input
             oiio.ImageCache().invalidate(self.img_file.as_posix())
         except Exception as e:
-            LOGGER.error('Error closing img buf: %s', e)
+            LOGGER.error('Error closing image input: %s', e)
 
     def _create_manifest_cache(self, metadata):
         """ Store the manifest contents from extracted metadata """
@@ -75,14 +137,14 @@ class DecyrptoMatte:
 
         metadata = {
             a.name: a.value
-            for a in self.img.spec().extra_attribs
+            for a in self.spec.extra_attribs
             if a.name.startswith("cryptomatte")
         }
 
         for key in metadata.keys():
             if key.endswith("/manif_file"):
                 sidecar_path = os.path.join(
-                    os.path.dirname(self.img.name), metadata[key]
+                    os.path.dirname(self.img_file.as_posix()), metadata[key]
                     )
                 with open(sidecar_path) as f:
                     metadata[key.replace("manif_file", "manifest")] = f.read()
@@ -114,9 +176,9 @@ class DecyrptoMatte:
             ch_id_coverage_names = []
             channels_dict = {
                 ch: i
-                for i, ch in enumerate(self.img.spec().channelnames)
+                for i, ch in enumerate(self.spec.channelnames)
             }
-            for i, ch in enumerate(self.img.spec().channelnames):
+            for i, ch in enumerate(self.spec.channelnames):
                 if not ch.startswith(name):
                     continue
                 if ch.startswith("%s." % name):
@@ -140,43 +202,53 @@ class DecyrptoMatte:
             cryptomatte_streams[cryp_key]["ch_pair_names"] = ch_id_coverage_names
         return cryptomatte_streams
 
-    def get_mattes_by_names(self, layer_names: List[str]) -> dict:
-        id_to_names = dict()
-
+    def id_index(self, layer_names: List[str]=None) -> IdIndex:
+        """ Manifest layer name to slot index lookup table of all or the given layer names """
         if not self.manifest_cache:
             self._create_manifest_cache(self.crypto_metadata())
 
-        for name in layer_names:
-            if name in self.manifest_cache:
-                id_val = self.hex_str_to_id(self.manifest_cache.get(name))
-                id_to_names[id_val] = name
+        if layer_names is not None:
+            return IdIndex.from_manifest(self.manifest_cache, layer_names)
 
-        id_mattes_by_name = dict()
-        for id_val, id_matte in self._get_mattes_per_id(list(id_to_names.keys())).items():
-            id_mattes_by_name[id_to_names.get(id_val)] = id_matte
+        if self.id_index_cache is None:
+            self.id_index_cache = IdIndex.from_manifest(self.manifest_cache)
 
-        return id_mattes_by_name
+        return self.id_index_cache
+
+    def get_mattes_by_names(self, layer_names: List[str]) -> dict:
+        id_index = self.id_index(layer_names)
+        id_mattes = self._get_mattes_per_id(id_index.ids.tolist())
+
+        return {name: id_mattes[id_val] for name, id_val in zip(id_index.names, id_index.ids.tolist())
+                if id_val in id_mattes}
 
     def _get_mattes_per_id(self, target_ids: List[float]) -> dict:
         """
             Get a alpha coverage matte for every given id
-            as dict {id_value[float]: coverage_matte[np.array]}
+            as dict {id_value[float]: coverage_matte[CompactMatte]}
 
-            Matte arrays are single channel two dimensional arrays(shape: image_height, image_width)
+            Mattes are single channel and cropped to their bounding box,
+            CompactMatte.to_dense returns the full frame array(shape: image_height, image_width)
         """
         if not target_ids:
             return dict()
 
         img_nested_md = self.sorted_crypto_metadata()
 
-        w, h = self.img.spec().width, self.img.spec().height
+        w, h = self.spec.width, self.spec.height
 
         start = time.time()
-        id_mattes = self._iterate_image(0, 0, w, h, img_nested_md, target_ids)
+        if self._use_tiled_decoding(w, h):
+            id_mattes = self._iterate_image_tiled(w, h, img_nested_md, target_ids)
+        elif self.vectorized_decoding:
+            id_mattes = self._iterate_image_vectorized(0, 0, w, h, img_nested_md, target_ids)
+        else:
+            id_mattes = {id_val: CompactMatte.from_dense(matte) for id_val, matte in
+                         self._iterate_image(0, 0, w, h, img_nested_md, target_ids).items()}
 
         # Purge mattes below threshold value
         for id_val in target_ids:
-            v, p = id_mattes[id_val].max(), id_mattes[id_val].any(axis=-1).sum()
+            v, p = id_mattes[id_val].max(), id_mattes[id_val].row_count()
 
             if v < self.empty_value_threshold and p < self.empty_pixel_threshold:
                 LOGGER.debug('Purging empty coverage matte: %s %s', v, p)
@@ -188,13 +260,45 @@ class DecyrptoMatte:
 
         return id_mattes
 
+    def _use_tiled_decoding(self, width: int, height: int) -> bool:
+        if not self.vectorized_decoding:
+            return False
+        if self.workers < 2 or height <= self.tile_band_height:
+            return False
+        return width * height >= self.tiled_min_pixels
+
+    def _iterate_image_tiled(self, width: int, height: int, img_nested_md: dict, target_ids: list):
+        """
+            Decode the image in scanline bands inside a process pool. Workers return the
+            CompactMatte's of their band which are merged per id, no full frame array is allocated.
+        """
+        id_mattes = {id_val: CompactMatte((height, width)) for id_val in target_ids}
+
+        bands = range(0, height, self.tile_band_height)
+        workers = min(self.workers, len(bands))
+        LOGGER.debug('Decoding cryptomatte in %s bands with %s processes.', len(bands), workers)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_decode_band, self.img_file.as_posix(), self.alpha_over_compositing,
+                            width, start_y, min(self.tile_band_height, height - start_y),
+                            img_nested_md, target_ids)
+                for start_y in bands
+                ]
+            for start_y, future in zip(bands, futures):
+                for id_val, band_matte in future.result().items():
+                    id_mattes[id_val] += band_matte.translated((height, width), start_y)
+
+        return id_mattes
+
     def _iterate_image(self, start_x: int, start_y: int, width: int, height: int,
                        img_nested_md: dict, target_ids: list):
         id_mattes = {id_val: np.zeros((height, width), dtype=np.float32) for id_val in target_ids}
+        channels = self._read_channels(start_x, start_y, width, height, self._crypto_channel_idxs(img_nested_md))
 
-        for y in range(start_y, start_y + height):
-            for x in range(start_x, start_x + width):
-                result_pixel = self.img.getpixel(x, y)
+        for y in range(height):
+            for x in range(width):
+                result_pixel = {idx: float(channel[y, x]) for idx, channel in channels.items()}
 
                 for cryp_key in img_nested_md:
                     result_id_cov = self._get_id_coverage_dict(
@@ -228,6 +332,134 @@ class DecyrptoMatte:
 
         return id_mattes
 
+    @staticmethod
+    def _crypto_channel_idxs(img_nested_md: dict) -> List[int]:
+        """ Sorted indices of all id and coverage channels of all cryptomatte streams """
+        return sorted({idx for cryp_key in img_nested_md
+                       for ch_pair in img_nested_md[cryp_key]["ch_pair_idxs"] for idx in ch_pair})
+
+    @staticmethod
+    def _channel_runs(channel_idxs: List[int]):
+        """ Split sorted channel indices into contiguous (ch_begin, ch_end) ranges """
+        runs = list()
+        for idx in channel_idxs:
+            if runs and runs[-1][1] == idx:
+                runs[-1][1] = idx + 1
+            else:
+                runs.append([idx, idx + 1])
+        return [tuple(r) for r in runs]
+
+    def _read_channels(self, start_x: int, start_y: int, width: int, height: int, channel_idxs: List[int]) -> dict:
+        """
+            Read only the given channels of the region in chunks of scanline_chunk scanlines.
+            Returns {channel_idx: float array(shape: height, width)}
+
+            start_x and start_y are relative to the data window of the image.
+        """
+        planes = np.zeros((len(channel_idxs), height, width), dtype=np.float32)
+        plane_idx = {idx: i for i, idx in enumerate(channel_idxs)}
+
+        for y in range(start_y, start_y + height, self.scanline_chunk):
+            y_end = min(y + self.scanline_chunk, start_y + height)
+
+            for ch_begin, ch_end in self._channel_runs(channel_idxs):
+                lines = None
+                if self.img_input:
+                    lines = self.img_input.read_scanlines(self.spec.y + y, self.spec.y + y_end, 0,
+                                                          ch_begin, ch_end, oiio.FLOAT)
+                if lines is None:
+                    LOGGER.error('Error reading cryptomatte scanlines %s-%s: %s', y, y_end, oiio.geterror())
+                    continue
+
+                lines = np.asarray(lines, dtype=np.float32).reshape(y_end - y, -1, ch_end - ch_begin)
+                for idx in range(ch_begin, ch_end):
+                    planes[plane_idx[idx], y - start_y:y_end - start_y] = lines[:, start_x:start_x + width,
+                                                                                idx - ch_begin]
+
+        return {idx: planes[plane_idx[idx]] for idx in channel_idxs}
+
+    def _iterate_image_vectorized(self, start_x: int, start_y: int, width: int, height: int,
+                                  img_nested_md: dict, target_ids: list):
+        """
+            Same result as _iterate_image but accumulates the coverage of every rank
+            with array operations.
+
+            Returns CompactMatte's, only the covered pixels of every id are collected so
+            no full frame array is allocated per id.
+        """
+        id_index = IdIndex.from_ids(target_ids)
+
+        channels = self._read_channels(start_x, start_y, width, height, self._crypto_channel_idxs(img_nested_md))
+
+        # Covered pixels of all ranks as flat pixel index, id slot and coverage value
+        entry_idx, entry_slots, entry_cov = list(), list(), list()
+
+        for cryp_key in img_nested_md:
+            coverage_sum = np.zeros(height * width, dtype=np.float32)
+            high_rank_found = np.zeros(height * width, dtype=np.bool_)
+            stream_idx, stream_slots, stream_cov, stream_high_rank = list(), list(), list(), list()
+
+            for id_idx, cov_idx in img_nested_md[cryp_key]["ch_pair_idxs"]:
+                rank_ids, rank_cov = channels[id_idx].ravel(), channels[cov_idx].ravel()
+
+                # Pixels of this rank that belong to one of the requested ids,
+                # unknown ids are dropped in bulk
+                rank_slots = id_index.resolve(rank_ids)
+                in_targets = (rank_slots >= 0) & ((rank_ids != 0.0) | (rank_cov != 0.0))
+                flat_idx = np.flatnonzero(in_targets)
+                if not flat_idx.size:
+                    continue
+
+                cov = rank_cov[flat_idx]
+                stream_idx.append(flat_idx)
+                stream_slots.append(rank_slots[flat_idx])
+                stream_cov.append(cov)
+
+                # Sum overall coverage per pixel of all ids
+                coverage_sum[flat_idx] += cov
+
+                # The first matching rank of a pixel holds the id with the highest rank
+                stream_high_rank.append(~high_rank_found[flat_idx])
+                high_rank_found[flat_idx] = True
+
+            if not stream_idx:
+                continue
+
+            stream_idx, stream_cov = np.concatenate(stream_idx), np.concatenate(stream_cov)
+
+            # Highest ranked Id will be set fully opaque for the whole pixel
+            # if multiple Ids are contributing to this pixel
+            if self.alpha_over_compositing:
+                high_rank = np.concatenate(stream_high_rank)
+                stream_cov[high_rank] = coverage_sum[stream_idx[high_rank]]
+
+            entry_idx.append(stream_idx)
+            entry_slots.append(np.concatenate(stream_slots))
+            entry_cov.append(stream_cov)
+
+        id_mattes = {id_val: CompactMatte((height, width)) for id_val in target_ids}
+        if not entry_idx:
+            return id_mattes
+
+        # Group entries by id slot and sum coverage per id
+        entry_idx, entry_slots, entry_cov = np.concatenate(entry_idx), np.concatenate(entry_slots), np.concatenate(entry_cov)
+        order = np.argsort(entry_slots, kind='mergesort')
+        entry_idx, entry_cov = entry_idx[order], entry_cov[order]
+        slot_counts = np.bincount(entry_slots, minlength=len(id_index))
+        slot_ends = np.cumsum(slot_counts)
+        slot_starts = slot_ends - slot_counts
+
+        for id_val, slot_start, slot_end in zip(id_index.ids.tolist(), slot_starts, slot_ends):
+            if slot_start == slot_end:
+                continue
+            id_mattes[id_val] = CompactMatte.from_coordinates(
+                (height, width), entry_idx[slot_start:slot_end], entry_cov[slot_start:slot_end]
+                )
+
+        LOGGER.debug('Read cryptomatte region with %s channels (%sx%s)', len(channels), width, height)
+
+        return id_mattes
+
     @staticmethod
     def _get_id_coverage_dict(pixel_values, ch_pair_idxs):
         return {
@@ -270,10 +502,12 @@ class DecyrptoMatte:
         return cls.id_to_hex_str(cls.mm3hash_float(layer_name))[:-1]
 
     @classmethod
-    def merge_matte_and_rgb(cls, matte: np.ndarray, rgb_img: np.ndarray=None):
-        """ Merge matte and rgb img array to rgba img array"""
+    def merge_matte_and_rgb(cls, matte: np.ndarray, rgb_img: np.ndarray=None, out: np.ndarray=None):
+        """ Merge matte and rgb img array to rgba img array, optionally into the provided out array.
+            The matte may be a view of the alpha channel of out.
+        """
         h, w = matte.shape
-        rgba = np.empty((h, w, 4), dtype=matte.dtype)
+        rgba = out if out is not None else np.empty((h, w, 4), dtype=matte.dtype)
 
         if rgb_img is None:
             rgba[:, :, 3] = rgba[:, :, 2] = rgba[:, :, 1] = rgba[:, :, 0] = matte
@@ -284,3 +518,16 @@ class DecyrptoMatte:
             rgba[:, :, 0] = rgb_img[:, :, 0]
 
         return rgba
+
+
+def _decode_band(img_file: str, alpha_over_compositing: bool, width: int,
+                 start_y: int, height: int, img_nested_md: dict, target_ids: list) -> dict:
+    """ Process pool worker decoding one scanline band, returns the non empty band mattes per id """
+    d = DecyrptoMatte(None, Path(img_file), alpha_over_compositing, workers=1)
+
+    try:
+        band_mattes = d._iterate_image_vectorized(0, start_y, width, height, img_nested_md, target_ids)
+    finally:
+        d.shutdown()
+
+    return {id_val: matte for id_val, matte in band_mattes.items() if not matte.is_empty()}
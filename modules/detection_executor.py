@@ -0,0 +1,169 @@
+#! usr/bin/python_3
+"""
+    Bounded process pool for empty image detection
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import heapq
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from modules.app_globals import ImgParams
+from modules.empty_image import ImageDetectionError, detect_empty_image
+from modules.setup_log import setup_logging
+
+LOGGER = setup_logging(__name__)
+
+
+def detect_empty_image_file(img_file: Path, native: bool=True) -> Tuple[Path, Union[bool, None], str]:
+    """
+        Detect if img_file is empty, run in the detection worker processes.
+        Returns the image file, the result and an error message. The result is None if
+        the image needs to be detected by Maya.
+    """
+    error = ''
+
+    # Native SGI, IFF and EXR detection reading as little of the file as possible
+    if native:
+        try:
+            return img_file, detect_empty_image(img_file), error
+        except ImageDetectionError as e:
+            error = f'Native image detection failed, using fallback detection. {e}'
+
+    # Maya IFF files are detected by Maya
+    if img_file.suffix[-3:] == ImgParams.maya_detection_format:
+        return img_file, None, error
+
+    # Pillow detection, images that can not be read are reported as empty
+    image_is_empty = True
+    try:
+        with Image.open(img_file.as_posix()) as img:
+            if np.asarray(img).max() > 0:
+                image_is_empty = False
+    except Exception as e:
+        error = f'Error reading file for image detection: {e}'
+
+    return img_file, image_is_empty, error
+
+
+class DetectionExecutor:
+    """
+        Detects empty images in worker processes. Images wait in a priority queue, oldest
+        images first, and at most max_pending_per_worker images per worker are submitted
+        to the process pool at once. Results are collected with poll from the owning thread.
+
+        The executor is full once max_queued images are waiting, callers should stop adding
+        images until it drained.
+    """
+    max_pending_per_worker = 2
+    max_queued = 64
+    # Seconds of finished detections used to measure throughput
+    throughput_window = 10.0
+
+    def __init__(self, workers: int=1, native: bool=True):
+        self.workers = max(1, workers)
+        self.native = native
+        self._pool = None
+
+        # Heap of (priority, sequence, image file)
+        self._queue = list()
+        self._sequence = count()
+        self._running = dict()
+        self._finished_times = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def active(self) -> int:
+        return len(self._running)
+
+    def busy(self) -> bool:
+        return bool(self._queue or self._running)
+
+    def full(self) -> bool:
+        return len(self._queue) >= self.max_queued
+
+    @property
+    def throughput(self) -> float:
+        """ Detected images per second within the throughput window """
+        self._expire_finished_times()
+        return len(self._finished_times) / self.throughput_window
+
+    def _expire_finished_times(self):
+        now = time.monotonic()
+        while self._finished_times and now - self._finished_times[0] > self.throughput_window:
+            self._finished_times.popleft()
+
+    def submit(self, img_file: Path, priority: float=0.0):
+        """ Queue img_file for detection, images with lower priority values are detected first """
+        heapq.heappush(self._queue, (priority, next(self._sequence), Path(img_file)))
+        self._submit_queued()
+
+    def _submit_queued(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        while self._queue and len(self._running) < self.workers * self.max_pending_per_worker:
+            _, _, img_file = heapq.heappop(self._queue)
+            self._running[self._pool.submit(detect_empty_image_file, img_file, self.native)] = img_file
+
+    def poll(self) -> List[Tuple[Path, Union[bool, None], str]]:
+        """ Results of finished detections as (image file, is empty or None for Maya detection, error) """
+        results = list()
+
+        for future, img_file in list(self._running.items()):
+            if not future.done():
+                continue
+            del self._running[future]
+
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append((img_file, None, f'Image detection process failed: {e}'))
+
+            self._finished_times.append(time.monotonic())
+
+        if results and self._queue:
+            self._submit_queued()
+
+        return results
+
+    def cancel(self):
+        """ Discard queued images and results of running detections """
+        for future in self._running:
+            future.cancel()
+
+        self._queue = list()
+        self._running = dict()
+        self._finished_times.clear()
+
+    def shutdown(self):
+        self.cancel()
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
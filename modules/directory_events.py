@@ -0,0 +1,277 @@
+#! usr/bin/python_3
+"""
+    Event driven directory watching with inotify on Linux and ReadDirectoryChangesW on MS Windows
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from modules.setup_log import setup_logging
+
+try:
+    import pywintypes
+    import win32con
+    import win32event
+    import win32file
+except ImportError:
+    win32file = None
+
+LOGGER = setup_logging(__name__)
+
+
+class DirectoryEvent:
+    created = 'created'
+    # File closed after writing, only reported by inotify
+    closed = 'closed'
+    # File content changed, reported by ReadDirectoryChangesW instead of closed
+    modified = 'modified'
+    removed = 'removed'
+    # Events were lost or the directory itself changed, the directory needs to be re-indexed
+    overflow = 'overflow'
+
+
+class DirectoryWatcher(threading.Thread):
+    """ Watches a single directory in a daemon thread and puts (event, Path) tuples into the events queue """
+    # Seconds between checks for a stop request
+    stop_timeout = 0.5
+
+    def __init__(self, directory: Union[str, Path]):
+        super(DirectoryWatcher, self).__init__(daemon=True)
+        self.directory = Path(directory)
+        self.events = queue.Queue()
+        self._stop_event = threading.Event()
+
+    def put(self, event: str, name: str=''):
+        self.events.put((event, self.directory / name))
+
+    def get_events(self) -> List[Tuple[str, Path]]:
+        """ Remove and return all events received so far """
+        events = list()
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self):
+        self._stop_event.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+
+class InotifyWatcher(DirectoryWatcher):
+    in_modify = 0x00000002
+    in_close_write = 0x00000008
+    in_moved_from = 0x00000040
+    in_moved_to = 0x00000080
+    in_create = 0x00000100
+    in_delete = 0x00000200
+    in_delete_self = 0x00000400
+    in_move_self = 0x00000800
+    in_q_overflow = 0x00004000
+    in_ignored = 0x00008000
+    in_isdir = 0x40000000
+
+    in_nonblock = 0o4000
+    in_cloexec = 0o2000000
+
+    watch_mask = in_create | in_close_write | in_moved_to | in_moved_from | in_delete | in_delete_self | in_move_self
+    event_header = struct.Struct('iIII')
+    read_size = 64 * 1024
+
+    _libc = None
+
+    @classmethod
+    def available(cls) -> bool:
+        if not sys.platform.startswith('linux'):
+            return False
+        return cls._load_libc() is not None
+
+    @classmethod
+    def _load_libc(cls):
+        if cls._libc is None:
+            try:
+                cls._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                cls._libc.inotify_init1, cls._libc.inotify_add_watch
+            except (OSError, AttributeError) as e:
+                LOGGER.error('Inotify is not available: %s', e)
+                return None
+        return cls._libc
+
+    def __init__(self, directory: Union[str, Path]):
+        super(InotifyWatcher, self).__init__(directory)
+        libc = self._load_libc()
+
+        self.fd = libc.inotify_init1(self.in_nonblock | self.in_cloexec)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(self.directory.as_posix()), self.watch_mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f'Could not watch directory {self.directory}')
+
+    def _dispatch(self, mask: int, name: str):
+        if mask & (self.in_q_overflow | self.in_delete_self | self.in_move_self | self.in_ignored):
+            self.put(DirectoryEvent.overflow)
+        elif mask & self.in_isdir:
+            return
+        elif mask & self.in_close_write:
+            self.put(DirectoryEvent.closed, name)
+        elif mask & (self.in_create | self.in_moved_to):
+            self.put(DirectoryEvent.created, name)
+        elif mask & (self.in_delete | self.in_moved_from):
+            self.put(DirectoryEvent.removed, name)
+
+    def run(self):
+        try:
+            while not self.stopped:
+                readable, _, _ = select.select([self.fd], [], [], self.stop_timeout)
+                if not readable:
+                    continue
+
+                try:
+                    data = os.read(self.fd, self.read_size)
+                except BlockingIOError:
+                    continue
+
+                offset = 0
+                while offset < len(data):
+                    _, mask, _, name_len = self.event_header.unpack_from(data, offset)
+                    offset += self.event_header.size
+                    name = data[offset:offset + name_len].rstrip(b'\0')
+                    offset += name_len
+
+                    self._dispatch(mask, os.fsdecode(name))
+        except OSError as e:
+            LOGGER.error('Inotify directory watcher failed: %s', e)
+            self.put(DirectoryEvent.overflow)
+        finally:
+            os.close(self.fd)
+
+
+class ReadDirectoryChangesWatcher(DirectoryWatcher):
+    """ Overlapped ReadDirectoryChangesW so the watcher thread can be stopped while waiting for changes """
+    file_list_directory = 0x0001
+    buffer_size = 64 * 1024
+
+    actions = {1: DirectoryEvent.created, 2: DirectoryEvent.removed, 3: DirectoryEvent.modified,
+               4: DirectoryEvent.removed, 5: DirectoryEvent.created}
+
+    @classmethod
+    def available(cls) -> bool:
+        return win32file is not None
+
+    def __init__(self, directory: Union[str, Path]):
+        super(ReadDirectoryChangesWatcher, self).__init__(directory)
+
+        self.handle = win32file.CreateFile(
+            str(self.directory),
+            self.file_list_directory,
+            win32con.FILE_SHARE_READ | win32con.FILE_SHARE_WRITE | win32con.FILE_SHARE_DELETE,
+            None,
+            win32con.OPEN_EXISTING,
+            win32con.FILE_FLAG_BACKUP_SEMANTICS | win32file.FILE_FLAG_OVERLAPPED,
+            None
+            )
+
+    def run(self):
+        overlapped = pywintypes.OVERLAPPED()
+        overlapped.hEvent = win32event.CreateEvent(None, True, False, None)
+        buffer = win32file.AllocateReadBuffer(self.buffer_size)
+        wait_ms = int(self.stop_timeout * 1000)
+
+        try:
+            while not self.stopped:
+                win32file.ReadDirectoryChangesW(
+                    self.handle, buffer, False,
+                    win32con.FILE_NOTIFY_CHANGE_FILE_NAME |
+                    win32con.FILE_NOTIFY_CHANGE_SIZE |
+                    win32con.FILE_NOTIFY_CHANGE_LAST_WRITE,
+                    overlapped
+                    )
+
+                while not self.stopped:
+                    if win32event.WaitForSingleObject(overlapped.hEvent, wait_ms) == win32event.WAIT_OBJECT_0:
+                        break
+
+                if self.stopped:
+                    win32file.CancelIo(self.handle)
+                    break
+
+                size = win32file.GetOverlappedResult(self.handle, overlapped, True)
+                if not size:
+                    # Buffer overflow, changes were lost
+                    self.put(DirectoryEvent.overflow)
+                    continue
+
+                for action, name in win32file.FILE_NOTIFY_INFORMATION(buffer, size):
+                    event = self.actions.get(action)
+                    if event:
+                        self.put(event, name)
+        except pywintypes.error as e:
+            LOGGER.error('ReadDirectoryChanges directory watcher failed: %s', e)
+            self.put(DirectoryEvent.overflow)
+        finally:
+            self.handle.Close()
+
+
+def directory_events_available() -> bool:
+    """ True if an event backend is available on this platform, logs the missing requirement otherwise """
+    if any(w.available() for w in (InotifyWatcher, ReadDirectoryChangesWatcher)):
+        return True
+
+    if sys.platform == 'win32':
+        LOGGER.warning('pywin32 is not installed, directory events are not available. '
+                       'Output directories will be indexed periodically.')
+    else:
+        LOGGER.warning('No directory event backend available on %s. '
+                       'Output directories will be indexed periodically.', sys.platform)
+    return False
+
+
+def create_directory_watcher(directory: Union[str, Path]) -> Union[DirectoryWatcher, None]:
+    """ Start an event watcher for directory, returns None if no event backend is available on this platform """
+    for watcher_class in (InotifyWatcher, ReadDirectoryChangesWatcher):
+        if not watcher_class.available():
+            continue
+
+        try:
+            watcher = watcher_class(directory)
+        except Exception as e:
+            # OSError or pywintypes.error
+            LOGGER.error('Could not create directory watcher for %s: %s', directory, e)
+            return None
+
+        watcher.start()
+        LOGGER.debug('Watching %s with %s', directory, watcher_class.__name__)
+        return watcher
+
+    return None
@@ -0,0 +1,188 @@
+#! usr/bin/python_3
+"""
+    Index of the image files in the render output directory
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+from pathlib import Path
+from typing import Tuple, Union
+
+from modules.app_globals import ImgParams
+from modules.check_file_access import CheckFileAccess, OpenFilesCache
+from modules.directory_events import DirectoryEvent
+from modules.file_stability import FileStabilityTracker
+from modules.setup_log import setup_logging
+
+LOGGER = setup_logging(__name__)
+
+
+def check_file_in_use(img_file: Path, open_files: OpenFilesCache=None):
+    """ Check if file is accessed by another process """
+    try:
+        file_access = CheckFileAccess(img_file, open_files=open_files)
+
+        if file_access.check():
+            LOGGER.debug('File in use by another process: %s - %s', file_access.process_id, file_access.process_name)
+            return True
+    except Exception as e:
+        LOGGER.error('Error checking file usage. %s', e)
+
+    return False
+
+
+class FileDirectoryWorker:
+    """
+        Persistent index of the image files in the output directory. Every scan only
+        reports the image keys created or removed since the last scan.
+
+        Files are indexed once they are completely written, until then they are tracked
+        by the file stability tracker. Indexed files are not stat'ed again.
+    """
+    # Look for files with the following extension
+    image_file_extension = ImgParams.extension
+
+    # Do not index stable files that are still opened by a renderer process
+    check_file_access = True
+    renderer_process_names = ('render', 'mayabatch', 'maya.bin')
+
+    def __init__(self):
+        self.img_file_dict = dict()
+        # Indexed file name: (size, mtime)
+        self.stat_index = dict()
+        # Files still being written by the renderer
+        self.stability = FileStabilityTracker()
+        # Renderer open files, enumerated once for all files of a scan
+        self.open_files = OpenFilesCache(self.renderer_process_names)
+
+    def reset(self):
+        self.img_file_dict = dict()
+        self.stat_index = dict()
+        self.stability.reset()
+
+    def _index_file(self, img_file: Path, stat_result, closed: bool=False) -> bool:
+        """ Index img_file, returns False if the file is still being written """
+        if closed:
+            stable = self.stability.closed(img_file, stat_result)
+        else:
+            stable = self.stability.observe(img_file, stat_result)
+
+        if not stable:
+            return False
+
+        if not closed and self.check_file_access and check_file_in_use(img_file, self.open_files):
+            # Renderer paused writing, keep tracking the file
+            self.stability.observe(img_file, stat_result)
+            return False
+
+        self.stat_index[img_file.name] = (stat_result.st_size, stat_result.st_mtime_ns)
+        self.img_file_dict[img_file.stem] = dict(path=img_file)
+        return True
+
+    def _remove_file(self, img_file: Path) -> bool:
+        """ Remove img_file from the index, returns True if it was an indexed image """
+        self.stability.remove(img_file)
+        if self.stat_index.pop(img_file.name, None) is None:
+            return False
+
+        self.img_file_dict.pop(img_file.stem, None)
+        return True
+
+    def index_img_files(self, img_file_dir: Path) -> Tuple[set, set]:
+        """ Scan the directory and return the created and removed image keys since the last scan """
+        created, removed = set(), set()
+
+        try:
+            with os.scandir(img_file_dir.as_posix()) as entries:
+                names = set()
+
+                for entry in entries:
+                    if not entry.name.endswith(self.image_file_extension):
+                        continue
+                    names.add(entry.name)
+
+                    # Already indexed, no need to stat the file again
+                    if entry.name in self.stat_index:
+                        continue
+
+                    try:
+                        # Cached by scandir on MS Windows
+                        stat_result = entry.stat()
+                    except OSError as e:
+                        LOGGER.error('Error indexing image: %s', e)
+                        # File probably deleted while watching, skip
+                        continue
+
+                    img_file = img_file_dir / entry.name
+                    if self._index_file(img_file, stat_result):
+                        created.add(img_file.stem)
+        except OSError as e:
+            LOGGER.error('Can not find image output directory. Nothing to index.')
+            LOGGER.error(e)
+            return created, removed
+
+        known_files = {img_file_dir / name for name in self.stat_index}.union(self.stability.files)
+        for img_file in known_files:
+            if img_file.name not in names and self._remove_file(img_file):
+                removed.add(img_file.stem)
+
+        return created, removed
+
+    def apply_events(self, events) -> Union[Tuple[set, set], None]:
+        """ Update the index with directory events instead of scanning the directory.
+            Files still being written are observed again once they can be stable.
+
+            Returns created and removed image keys or None if events were lost and the
+            directory needs to be scanned again.
+        """
+        events = list(events)
+        # Leave the index untouched, the scan reports every change
+        if any(event == DirectoryEvent.overflow for event, _ in events):
+            return None
+
+        created, removed = set(), set()
+        events += [(DirectoryEvent.modified, f) for f in self.stability.due_files()]
+
+        for event, img_file in events:
+            if not img_file.name.endswith(self.image_file_extension):
+                continue
+
+            if event == DirectoryEvent.removed:
+                if self._remove_file(img_file):
+                    if img_file.stem in created:
+                        # Created and removed within these events
+                        created.discard(img_file.stem)
+                    else:
+                        removed.add(img_file.stem)
+                continue
+
+            if img_file.name in self.stat_index:
+                continue
+
+            try:
+                stat_result = img_file.stat()
+            except OSError:
+                # Removed, the removed event follows
+                self.stability.remove(img_file)
+                continue
+
+            if self._index_file(img_file, stat_result, closed=event == DirectoryEvent.closed):
+                removed.discard(img_file.stem)
+                created.add(img_file.stem)
+
+        return created, removed
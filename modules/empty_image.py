@@ -0,0 +1,225 @@
+#! usr/bin/python_3
+"""
+    Empty image detection reading only as much of an image file as needed
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import struct
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import OpenImageIO as oiio
+
+from modules.iff_reader import IffError, detect_empty_iff
+
+
+class ImageDetectionError(Exception):
+    """ Image format not supported or image could not be decoded """
+    pass
+
+
+class SgiAlphaDetector:
+    """
+        Reads the alpha channel of a SGI image scanline by scanline. RLE images are read
+        through their scanline offset tables, so only the compressed alpha rows are read.
+        Images without alpha are tested on all channels.
+    """
+    header_size = 512
+    magic = 474
+    # Uncompressed scanlines per read
+    scanline_chunk = 64
+
+    def __init__(self, img_file: Path):
+        self.img_file = Path(img_file)
+
+    def _read_header(self, f):
+        header = f.read(self.header_size)
+        if len(header) != self.header_size:
+            raise ImageDetectionError(f'Unexpected end of SGI file: {self.img_file.name}')
+
+        magic, storage, bpc, _, xsize, ysize, zsize = struct.unpack_from('>HBBHHHH', header)
+        if magic != self.magic or bpc not in (1, 2):
+            raise ImageDetectionError(f'Not a supported SGI image file: {self.img_file.name}')
+
+        return storage == 1, bpc, xsize, ysize, max(1, zsize)
+
+    @staticmethod
+    def _alpha_channels(zsize: int) -> List[int]:
+        """ Channels to test: alpha of RGBA or luminance alpha images, otherwise all channels """
+        if zsize in (2, 4):
+            return [zsize - 1]
+        return list(range(zsize))
+
+    @staticmethod
+    def _rle_row_is_empty(data: bytes, bpc: int) -> bool:
+        """ Test a RLE compressed scanline without decoding it. The low 7 bits of a packet header
+            are the count, 0 ends the row. High bit set: count literal values follow,
+            otherwise the following value is repeated count times.
+        """
+        if bpc == 2:
+            units = np.frombuffer(data[:len(data) // 2 * 2], dtype='>u2')
+
+            i = 0
+            while i < units.size:
+                count = int(units[i]) & 0x7f
+                if not count:
+                    break
+                if int(units[i]) & 0x80:
+                    if units[i + 1:i + 1 + count].any():
+                        return False
+                    i += 1 + count
+                else:
+                    if i + 1 < units.size and units[i + 1]:
+                        return False
+                    i += 2
+            return True
+
+        i = 0
+        while i < len(data):
+            count = data[i] & 0x7f
+            if not count:
+                break
+            if data[i] & 0x80:
+                if data.count(0, i + 1, i + 1 + count) != min(count, len(data) - i - 1):
+                    return False
+                i += 1 + count
+            else:
+                if i + 1 < len(data) and data[i + 1]:
+                    return False
+                i += 2
+        return True
+
+    def _rle_is_empty(self, f, bpc: int, ysize: int, zsize: int) -> bool:
+        for z in self._alpha_channels(zsize):
+            f.seek(self.header_size + z * ysize * 4)
+            starts = np.frombuffer(f.read(ysize * 4), dtype='>u4')
+            f.seek(self.header_size + (zsize + z) * ysize * 4)
+            lengths = np.frombuffer(f.read(ysize * 4), dtype='>u4')
+
+            if starts.size != ysize or lengths.size != ysize:
+                raise ImageDetectionError(f'Invalid SGI offset tables: {self.img_file.name}')
+
+            # Read rows in file order, rows may share their data
+            checked = set()
+            for row in np.argsort(starts, kind='mergesort'):
+                start, length = int(starts[row]), int(lengths[row])
+                if start in checked:
+                    continue
+                checked.add(start)
+
+                f.seek(start)
+                if not self._rle_row_is_empty(f.read(length), bpc):
+                    return False
+
+        return True
+
+    def _verbatim_is_empty(self, f, bpc: int, xsize: int, ysize: int, zsize: int) -> bool:
+        row_size = xsize * bpc
+
+        for z in self._alpha_channels(zsize):
+            f.seek(self.header_size + z * ysize * row_size)
+
+            for y in range(0, ysize, self.scanline_chunk):
+                rows = min(self.scanline_chunk, ysize - y)
+                data = f.read(rows * row_size)
+                if len(data) != rows * row_size:
+                    raise ImageDetectionError(f'Unexpected end of SGI file: {self.img_file.name}')
+                if np.frombuffer(data, dtype=np.uint8).any():
+                    return False
+
+        return True
+
+    def is_empty(self) -> bool:
+        with open(self.img_file.as_posix(), 'rb') as f:
+            rle, bpc, xsize, ysize, zsize = self._read_header(f)
+
+            if rle:
+                return self._rle_is_empty(f, bpc, ysize, zsize)
+            return self._verbatim_is_empty(f, bpc, xsize, ysize, zsize)
+
+
+class OiioAlphaDetector:
+    """
+        Reads the alpha channel of scanline or tiled images eg. OpenEXR through OpenImageIO
+        one scanline chunk or tile row at a time. Images with an empty data window are
+        detected from their header.
+    """
+    scanline_chunk = 64
+
+    def __init__(self, img_file: Path):
+        self.img_file = Path(img_file)
+
+    def _iter_regions(self, img_input, spec):
+        alpha = spec.alpha_channel
+        chbegin, chend = (alpha, alpha + 1) if alpha >= 0 else (0, spec.nchannels)
+        ybegin, yend = spec.y, spec.y + spec.height
+
+        if spec.tile_width and spec.tile_height:
+            xbegin, xend = spec.x, spec.x + spec.width
+            for y in range(ybegin, yend, spec.tile_height):
+                yield img_input.read_tiles(xbegin, xend, y, min(y + spec.tile_height, yend),
+                                           spec.z, spec.z + max(1, spec.depth), chbegin, chend)
+            return
+
+        for y in range(ybegin, yend, self.scanline_chunk):
+            yield img_input.read_scanlines(y, min(y + self.scanline_chunk, yend), spec.z, chbegin, chend)
+
+    def is_empty(self) -> bool:
+        img_input = oiio.ImageInput.open(self.img_file.as_posix())
+        if not img_input:
+            raise ImageDetectionError(f'Could not open image file: {self.img_file.name} {oiio.geterror()}')
+
+        try:
+            spec = img_input.spec()
+
+            # Data window without pixels
+            if spec.width <= 0 or spec.height <= 0:
+                return True
+
+            for pixels in self._iter_regions(img_input, spec):
+                if pixels is None:
+                    raise ImageDetectionError(f'Could not read image file: {self.img_file.name} '
+                                              f'{img_input.geterror()}')
+                if np.any(pixels):
+                    return False
+        finally:
+            img_input.close()
+
+        return True
+
+
+def detect_empty_image(img_file: Path) -> bool:
+    """
+        True if the image has no alpha coverage. Stops reading on the first scanline chunk
+        or tile containing alpha. Raises ImageDetectionError for unsupported or broken files.
+    """
+    img_file = Path(img_file)
+    suffix = img_file.suffix.lower()
+
+    try:
+        if suffix in ('.sgi', '.rgb', '.rgba', '.bw'):
+            return SgiAlphaDetector(img_file).is_empty()
+        if suffix == '.iff':
+            return detect_empty_iff(img_file)
+        if suffix == '.exr':
+            return OiioAlphaDetector(img_file).is_empty()
+    except (IffError, OSError, ValueError, struct.error) as e:
+        raise ImageDetectionError(f'Could not read {img_file.name}: {e}')
+
+    raise ImageDetectionError(f'No empty image detection for {img_file.suffix} images.')
@@ -0,0 +1,80 @@
+#! usr/bin/python_3
+"""
+    Detects when image files written by the renderer are complete
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import time
+from pathlib import Path
+from typing import List
+
+
+class FileStabilityTracker:
+    """
+        Tracks files that are being written. A file is stable once it's size and modification
+        time did not change across two observations at least stable_time seconds apart.
+        Files reported as closed after writing are stable right away.
+    """
+    stable_time = 1.0
+
+    def __init__(self, stable_time: float=None):
+        self.stable_time = stable_time or self.stable_time
+        # File path: ((size, mtime), time of the first observation of this size and mtime)
+        self.files = dict()
+
+    def __contains__(self, file: Path) -> bool:
+        return file in self.files
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def reset(self):
+        self.files = dict()
+
+    def observe(self, file: Path, stat_result: os.stat_result) -> bool:
+        """ Record an observation of file, returns True if the file is stable """
+        stat_key = (stat_result.st_size, stat_result.st_mtime_ns)
+        previous = self.files.get(file)
+
+        if previous is None or previous[0] != stat_key or not stat_result.st_size:
+            # New or still growing file, empty files are not yet written
+            self.files[file] = (stat_key, time.monotonic())
+            return False
+
+        if time.monotonic() - previous[1] < self.stable_time:
+            return False
+
+        del self.files[file]
+        return True
+
+    def closed(self, file: Path, stat_result: os.stat_result) -> bool:
+        """ File was closed after writing, returns True if the file is stable """
+        if not stat_result.st_size:
+            return self.observe(file, stat_result)
+
+        self.files.pop(file, None)
+        return True
+
+    def remove(self, file: Path):
+        self.files.pop(file, None)
+
+    def due_files(self) -> List[Path]:
+        """ Files that can be stable if observed again, empty files wait for the next directory event or scan """
+        now = time.monotonic()
+        return [f for f, (stat_key, t) in self.files.items() if stat_key[0] and now - t >= self.stable_time]
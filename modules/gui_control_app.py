@@ -27,21 +27,19 @@ import sys
 import threading
 from datetime import datetime
 from functools import partial
-from multiprocessing import Process
 
-from PyQt5 import QtCore, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 
 from modules.app_globals import AVAILABLE_RENDERER, SocketAddress, COMPATIBLE_VERSIONS
 from modules.detect_lang import get_translation
-from modules.gui_create_process import RunLayerCreationProcess
-from modules.gui_image_watcher_process import start_watcher
+from modules.gui_job_slot import JobSlot
 from modules.gui_service_manager import ServiceManager
 from modules.job import Job, JobStatus
-from modules.setup_log import setup_queued_logger, do_rollover, create_job_log_report
+from modules.psd_writer import find_psd_preview
+from modules.setup_log import setup_queued_logger, create_job_log_report
 from modules.setup_paths import get_user_directory, get_maya_version
 from modules.socket_broadcaster import ServiceAnnouncer
 from modules.socket_client_3 import SendMessage
-from modules.socket_server import run_message_server
 
 # translate strings
 de = get_translation()
@@ -107,6 +105,13 @@ def update_job_manager_widget(job, widget, btn_callback):
     btn.setText(job.button_txt)
     btn.pressed.connect(partial(btn_callback, job, combo_box))
 
+    # Show the preview thumbnail of the finished PSD
+    if job.status == JobStatus.finished and job.render_dir:
+        preview_file = find_psd_preview(job.render_dir)
+        if preview_file:
+            item.setIcon(1, QtGui.QIcon(preview_file.as_posix()))
+            item.setToolTip(1, f'<img src="{preview_file.as_posix()}">')
+
     widget.setItemWidget(item, 4, progress_bar)
     widget.setItemWidget(item, 6, combo_box)
     widget.setItemWidget(item, 7, btn)
@@ -172,28 +177,11 @@ class ControlApp(QtCore.QObject, LedControl):
     cancel_job_signal = QtCore.pyqtSignal(object)
     move_job_signal = QtCore.pyqtSignal(object, bool)
     update_job_widget_signal = QtCore.pyqtSignal()
-    current_job_failed_signal = QtCore.pyqtSignal()
-    current_job_canceled_signal = QtCore.pyqtSignal()
-    current_job_finished_signal = QtCore.pyqtSignal()
-    current_job_status_signal = QtCore.pyqtSignal(int)
-    current_job_status_name_signal = QtCore.pyqtSignal(str)
-    current_job_img_num_signal = QtCore.pyqtSignal(int, int)
-
-    # Job finished timeout
-    job_finished_timer = QtCore.QTimer()
-    job_finished_timer.setSingleShot(True)
-    job_finished_timer.setInterval(10000)
 
     # Red LED Job in progress timer, signal the user we have a Job running
     alive_job_timer = QtCore.QTimer()
     alive_job_timer.setInterval(1500)
 
-    # Render service
-    queue_next_job_signal = QtCore.pyqtSignal()
-    current_job = None
-
-    # Watcher process
-    watcher = None
     # Service manager
     manager = None
     # Service announcer
@@ -213,9 +201,7 @@ class ControlApp(QtCore.QObject, LedControl):
 
         self.scene_file = None
         self.render_path = None
-        self.job_aborted = False
         self.mod_dir = self.app.mod_dir
-        self.job_finished_timer.timeout.connect(self.job_finished)
 
         # Initialise Main Window
         self.ui.actionToggleWatcher.toggled.connect(self.toggle_watcher_window)
@@ -232,16 +218,15 @@ class ControlApp(QtCore.QObject, LedControl):
         self.update_status(_('Installierte Maya Versionen: {}').format(available_maya_versions))
         setup_combo_box(self.ui.comboBox_version, available_maya_versions)
 
-        # Setup socket server to receive status updates
-        self.server = run_message_server(
-            (self.update_status, self.led_socket_recv_start, self.led_socket_recv_end)
-            )
-        self.layer_creation_thread = None
-
         # Create default job
         self.empty_job = Job(_('Kein Job'), '', get_user_directory(), self.ui.comboBox_renderer.currentText())
-        self.current_job = self.empty_job
-        
+
+        # Job slots running jobs concurrently, each receives the status updates of it's processes
+        slot_count = ServiceManager.job_slot_count()
+        self.job_slots = [JobSlot(self, slot, slot_count, logging_queue) for slot in range(slot_count)]
+        if slot_count > 1:
+            self.update_status(_('{} Jobs werden gleichzeitig bearbeitet.').format(slot_count))
+
         # Setup socket send
         self.socket_send = SendMessage()
         self.socket_send.send_started.connect(self.led_socket_send_start)
@@ -280,189 +265,52 @@ class ControlApp(QtCore.QObject, LedControl):
                     self.update_status(_('Der Render Service muss neugestartet werden.'))
                     self.start_service_manager()
 
-    def start_image_watcher_process(self):
-        if self.watcher:
-            if self.watcher.is_alive():
-                self.update_watcher(self.current_job.file, self.current_job.render_dir)
-                return
-            else:
-                self.exit_image_watcher_process()
-
-        if self.current_job:
-            render_path = self.current_job.render_dir
-            scene_file = self.current_job.file
-        else:
-            render_path = self.render_path
-            scene_file = self.scene_file
-
-        # Start watcher process
-        # on Win 7 x64 starting mayapy in threads from mayapy thread crashes Maya 2016.5 Ex2 Up2
-        self.watcher = Process(target=start_watcher, args=(self.app.mod_dir,
-                                                           render_path,
-                                                           scene_file,
-                                                           self.ui.comboBox_version.currentText(),
-                                                           self.logging_queue,
-                                                           )
-                               )
-        self.watcher.start()
-
-    def exit_image_watcher_process(self):
-        if self.watcher:
-            if self.watcher.is_alive():
-                LOGGER.debug('Shutting down image processing server.')
-                self.socket_send.do('COMMAND CLOSE', SocketAddress.watcher)
-                self.watcher.join()
-                LOGGER.debug('Image processing server shut down.')
-                self.update_status(_('Bild Beobachter beendet.'))
-                del self.watcher
-                self.watcher = None
-
-    def update_watcher(self, scene_file=None, output_dir=None):
-        """ Update Image Watcher environment if it is running """
-        if self.watcher:
-            if scene_file:
-                self.socket_send.do('COMMAND SCENE_FILE ' + scene_file, SocketAddress.watcher)
-            if output_dir:
-                self.socket_send.do('COMMAND RENDER_PATH ' + output_dir, SocketAddress.watcher)
-
-    def add_render_job(self, job_object: Job):
+    @property
+    def current_job(self) -> Job:
+        """ Job of the first busy job slot """
+        for job_slot in self.job_slots:
+            if job_slot.busy:
+                return job_slot.current_job
+
+        return self.empty_job
+
+    def other_slots_busy(self, job_slot: JobSlot) -> bool:
+        return any(s.busy for s in self.job_slots if s is not job_slot)
+
+    def add_render_job(self, job_object: Job, slot: int=0):
         """ Service Manager requests new job, scene file and render dir existence already confirmed """
-        # This is a COPY of the actual service manager thread job class instance
-        # Therefore we update our local copy -AND- signal all changes to the service
-        # manager thread
-        self.current_job = job_object
+        job_slot = self.job_slots[slot]
 
         # Set renderer
         for idx in range(0, self.ui.comboBox_renderer.count()):
-            if self.ui.comboBox_renderer.itemText(idx) == self.current_job.renderer:
+            if self.ui.comboBox_renderer.itemText(idx) == job_object.renderer:
                 self.ui.comboBox_renderer.setCurrentIndex(idx)
 
-        msg = f'Starte {self.current_job.title} für <i>{self.current_job.file}</i> ' \
-              f'mit {self.current_job.renderer}. Ausgabe: {self.current_job.render_dir}'
-        self.update_status(msg)
+        msg = f'Starte {job_object.title} für <i>{job_object.file}</i> ' \
+              f'mit {job_object.renderer}. Ausgabe: {job_object.render_dir}'
+        job_slot.update_status(msg)
         self.enable_gui(False)
 
         # Yellow LED blink
         self.led(1, 2, 2)
 
-        self.start_queue()
+        # Jobs started while other jobs are running yield to them
+        job_slot.add_render_job(job_object, low_priority=self.other_slots_busy(job_slot))
 
     def start_queue(self):
         """ Start the queue of jobs if queue GUI switch is enabled """
         # Changing valid IP Subnet is no longer possible until restart
         self.ui.lineEditSubnet.setEnabled(False)
 
-        if self.ui.enableQueue.isChecked():
-            if self.current_job.status > 4:
-                # Skip job if finished, failed, aborted
-                self.job_finished()
-                return
-
-            # Set job status to scene loading/editing
-            self.job_status(JobStatus.scene_loading)
-            self.start_image_watcher_process()
-            self.start_render_process()
-
-    def job_failed(self):
-        """ Called from unsuccessful render process """
-        self.socket_send.do('COMMAND ABORT', SocketAddress.watcher)
-        msg = f'<b>{self.current_job.title} fehlgeschlagen.</b> Ausgabeordner Überwachung wird abgebrochen.'
-        self.update_status(msg)
-
-        if self.job_aborted:
-            LOGGER.debug('Setting Job %s as canceled %s.', self.current_job.title, self.job_aborted)
-            self.current_job_canceled_signal.emit()
-        else:
-            LOGGER.debug('Setting Job %s as failed %s.', self.current_job.title, self.job_aborted)
-            self.current_job_failed_signal.emit()
-
-        self.job_aborted = False
-        self.job_finished()
-
-    def job_finished(self):
-        """ Called from image watcher process if PSD Creation finished """
-        self.save_status_report()
-
-        # Reset job parameters
-        self.current_job_finished_signal.emit()
-        self.current_job = self.empty_job
-
-        self.update_progress(reset=False)
-        self.update_progress(reset=True)
-        self.exit_image_watcher_process()
-
-        self.queue_next_job_signal.emit()
-
-    def job_status(self, status):
-        """ Update job status from creation thread """
-        self.current_job_status_signal.emit(status)
-        self.current_job.status = status
-        self.update_progress()
-
-    def watcher_create_psd(self):
-        """ Finalize the job, continue detecting empty rendering results and create PSD """
-        # Set job status to image detection
-        self.job_status(JobStatus.image_detection)
-
-        if self.watcher:
-            if self.watcher.is_alive():
-                pass
-            else:
-                self.start_image_watcher_process()
-
-        self.socket_send.do('COMMAND REQUEST_PSD', SocketAddress.watcher)
-
-    def watcher_force_psd_creation(self):
-        """ Try to force job completion, continue detecting empty rendering results and immediately create PSD """
-
-        if self.watcher:
-            if self.watcher.is_alive():
-                pass
-            else:
-                return
-
-        self.socket_send.do('COMMAND FORCE_REQUEST_PSD', SocketAddress.watcher)
-
-    def abort_running_job(self):
-        """ Attempt to kill running processes for the current job """
-        msg = f'<span style="color:red;"><b>{self.current_job.title} wurde vom Benutzer abgebrochen.</b></span>'
-        self.update_status(msg)
-        self.job_aborted = True
-        self.job_status(JobStatus.aborted)
-
-        if self.layer_creation_thread:
-            if self.layer_creation_thread.is_alive():
-                LOGGER.debug('Current Job canceled, trying to kill batch process.')
-                self.layer_creation_thread.kill_process()
-            else:
-                LOGGER.debug('Current Job canceled, batch processed finished. Setting job as failed.')
-                self.job_failed()
-        else:
-            LOGGER.debug('Current Job canceled, batch processed not present. Setting job as failed.')
-            self.job_failed()
-
-    def start_render_process(self):
-        """ Start the layer creation process """
-        args = (LOGGER,             # Provide with the logging queue
-                self.current_job.file,          # Arg Scene file
-                self.current_job.render_dir,    # Arg Render path
-                self.mod_dir,                   # Arg Env / module directory
-                self.current_job.ignore_hidden_objects,   # Arg CSB Import option ignoreHiddenObject
-                self.current_job.maya_delete_hidden,      # Arg Maya Layer Creation option
-                self.current_job.use_scene_settings,      # Arg Use Maya Binary Scene Settings
-                self.ui.comboBox_version.currentText(),   # Arg Maya Version
-                self.ui.comboBox_renderer.currentText(),  # Arg Maya renderer
-                self.watcher_create_psd,        # Successfully finished Callback
-                self.job_failed,                # Un-successfully finished Callback
-                self.job_status,                # Update job status
-                )
-
-        # Start every Job with a new log file
-        do_rollover(self.app.log_listener)
-
-        self.layer_creation_thread = RunLayerCreationProcess(*args)
-        self.layer_creation_thread.start()
-        self.led(0, 0)
+        for job_slot in self.job_slots:
+            job_slot.start_queue()
+
+    def abort_running_job(self, slot: int=0):
+        """ Attempt to kill running processes of the job in slot """
+        self.job_slots[slot].abort_running_job()
+
+    def watcher_force_psd_creation(self, slot: int=0):
+        self.job_slots[slot].watcher_force_psd_creation()
 
     def toggle_render_service(self):
         if self.ui.startRenderService.isChecked():
@@ -503,18 +351,20 @@ class ControlApp(QtCore.QObject, LedControl):
         LOGGER.info('Starting Service manager.')
         # Setup service manager
         self.manager = ServiceManager(self, self.app, self.ui, self.logging_queue)
-        self.queue_next_job_signal.connect(self.manager.job_finished)
 
         self.add_job_signal.connect(self.manager.add_job)
         self.move_job_signal.connect(self.manager.move_job)
         self.cancel_job_signal.connect(self.manager.cancel_job)
         self.update_job_widget_signal.connect(self.manager.update_control_app_job_widget)
-        self.current_job_failed_signal.connect(self.manager.set_job_failed)
-        self.current_job_canceled_signal.connect(self.manager.set_job_canceled)
-        self.current_job_finished_signal.connect(self.manager.set_job_finished)
-        self.current_job_status_signal.connect(self.manager.set_job_status)
-        self.current_job_status_name_signal.connect(self.manager.set_job_status_name)
-        self.current_job_img_num_signal.connect(self.manager.set_job_img_num)
+
+        for job_slot in self.job_slots:
+            job_slot.queue_next_job_signal.connect(self.manager.job_finished)
+            job_slot.job_failed_signal.connect(self.manager.set_job_failed)
+            job_slot.job_canceled_signal.connect(self.manager.set_job_canceled)
+            job_slot.job_finished_signal.connect(self.manager.set_job_finished)
+            job_slot.job_status_signal.connect(self.manager.set_job_status)
+            job_slot.job_status_name_signal.connect(self.manager.set_job_status_name)
+            job_slot.job_img_num_signal.connect(self.manager.set_job_img_num)
 
         self.manager.start()
 
@@ -526,8 +376,8 @@ class ControlApp(QtCore.QObject, LedControl):
                 self.manager.exit()
                 self.manager.wait(msecs=15000)
 
-    def update_status(self, status_msg):
-        """ Receive socket messages """
+    def update_status(self, status_msg, slot_name: str=''):
+        """ Receive socket messages, job related commands are handled by the job slots """
         if status_msg.startswith('COMMAND'):
             self.led(1, 2)  # Blink yellow
             self.led(2, 2, timer=100)  # Blink green
@@ -536,57 +386,31 @@ class ControlApp(QtCore.QObject, LedControl):
             if socket_command == 'TOGGLE_WATCHER':
                 self.ui.actionToggleWatcher.toggle()
 
-            elif socket_command.startswith('LAYER_NUM'):
-                # Update number of images to render (+1 for masterLayer)
-                total_img_num = int(socket_command[len('LAYER_NUM '):]) + 1
-                self.current_job_img_num_signal.emit(0, total_img_num)
-                self.current_job.total_img_num = total_img_num
-            elif socket_command.startswith('IMG_NUM'):
-                # Update number of created images
-                img_num = int(socket_command[len('IMG_NUM '):])
-                self.current_job_img_num_signal.emit(img_num, 0)
-                self.current_job.img_num = img_num
-                self.update_progress()
-            elif socket_command.startswith('STATUS_NAME'):
-                # Update status description with custom status
-                status_name = socket_command[len('STATUS_NAME '):]
-                self.current_job_status_name_signal.emit(status_name)
-                self.current_job.status_name = status_name
-                self.update_progress()
-
-            elif socket_command == 'CREATE_PSD':
-                self.watcher_create_psd()
-
-            elif socket_command == 'IMG_JOB_FINISHED':
-                status_msg = _('<b>{} fertiggestellt. PSD Datei erstellt.</b>').format(self.current_job.title)
-                self.job_finished_timer.start()
-
-            elif socket_command == 'IMG_JOB_FAILED':
-                status_msg = _('<b>{} fehlgeschlagen. Keine Bilddaten vorhanden.</b>').format(self.current_job.title)
-                self.job_failed()
-
         current_time = datetime.now().strftime('(%H:%M:%S) ')
-        self.ui.statusBrowser.append(current_time + status_msg)
-
-    def update_progress(self, reset=False):
-        """ Update GUI with current job progress """
-        if reset or not self.current_job:
-            self.ui.progressBar.setFormat('')
-            self.ui.progressBar.setValue(0)
-            self.led(0,1)
-            return
+        self.ui.statusBrowser.append(current_time + slot_name + status_msg)
 
-        self.ui.progressBar.setFormat(f'{self.current_job.title} - '
-                                      f'{self.current_job.img_num:03d} / {self.current_job.total_img_num:03d} - '
-                                      f'{self.current_job.status_name}')
+    def update_progress(self, job: Job=None):
+        """ Update GUI with the progress of job or of the first running job """
+        if job is None:
+            job = self.current_job
 
         # Indicate Job activity on red LED
-        if self.current_job.in_progress:
+        if any(s.current_job.in_progress for s in self.job_slots):
             self.alive_job_timer.start()
         else:
             self.alive_job_timer.stop()
 
-        self.ui.progressBar.setValue(self.current_job.progress)
+        if job is self.empty_job:
+            self.ui.progressBar.setFormat('')
+            self.ui.progressBar.setValue(0)
+            self.led(0, 1)
+            return
+
+        self.ui.progressBar.setFormat(f'{job.title} - '
+                                      f'{job.img_num:03d} / {job.total_img_num:03d} - '
+                                      f'{job.status_name}')
+
+        self.ui.progressBar.setValue(job.progress)
         self.update_job_widget_signal.emit()
 
     def update_job_widget(self, job):
@@ -617,18 +441,33 @@ class ControlApp(QtCore.QObject, LedControl):
 
         LOGGER.debug('Job button request: %s - %s', job.title, job_request)
 
-    def save_status_report(self):
+    def save_status_report(self, job: Job=None):
         # Save current log file contents as job report
         report = create_job_log_report()
 
-        if not os.path.exists(self.current_job.render_dir):
+        if not isinstance(job, Job):
+            # Report menu action
+            job = self.current_job
+
+        if not os.path.exists(job.render_dir):
             return
 
         # Report file path
-        report_file = os.path.join(self.current_job.render_dir, 'report.html')
-        # Append job log to report
-        self.ui.statusBrowser.append(report)
-        html_data = str(self.ui.statusBrowser.toHtml())
+        report_file = os.path.join(job.render_dir, 'report.html')
+        job_slot = next((s for s in self.job_slots if s.current_job is job), None)
+
+        # Preview thumbnail of the PSD next to the report
+        preview_file = find_psd_preview(job.render_dir)
+        preview = f'<h4>Preview</h4><img src="{preview_file.name}">' if preview_file else ''
+
+        if job_slot is not None and len(self.job_slots) > 1:
+            # Only the messages of the slot running this job
+            html_data = '<br>'.join(job_slot.status_lines + [report, preview])
+            job_slot.status_lines = list()
+        else:
+            # Append job log to report
+            self.ui.statusBrowser.append(report)
+            html_data = str(self.ui.statusBrowser.toHtml()).replace('</body>', preview + '</body>')
 
         # Clear console
         try:
@@ -643,17 +482,13 @@ class ControlApp(QtCore.QObject, LedControl):
         except Exception as e:
             LOGGER.error(e)
         finally:
-            self.ui.statusBrowser.clear()
+            # Keep messages of jobs that are still running for their report
+            if not any(s.busy and s.current_job is not job for s in self.job_slots):
+                self.ui.statusBrowser.clear()
 
     def toggle_watcher_window(self, toggle_state):
-        if not self.watcher:
-            return
-
-        if self.watcher.is_alive():
-            if not toggle_state:
-                self.socket_send.do('COMMAND HIDE_WINDOW', SocketAddress.watcher)
-            else:
-                self.socket_send.do('COMMAND SHOW_WINDOW', SocketAddress.watcher)
+        for job_slot in self.job_slots:
+            job_slot.toggle_watcher_window(toggle_state)
 
     def enable_gui(self, enable: bool):
         for gui in [self.ui.sceneFileBtn, self.ui.renderPathBtn, self.ui.comboBox_renderer,
@@ -661,12 +496,11 @@ class ControlApp(QtCore.QObject, LedControl):
             gui.setEnabled(enable)
 
     def quit_app(self):
-        # Avoid starting further jobs in the queue
-        self.queue_next_job_signal.disconnect()
-
-        # Abort running job
-        if self.current_job != self.empty_job:
-            self.abort_running_job()
+        # Avoid starting further jobs in the queue, abort running jobs
+        # and end the socket servers and watcher processes of the job slots
+        for job_slot in self.job_slots:
+            job_slot.shutdown()
+        self.update_status(_('Socket Empfangs Server beendet.'))
 
         # End service announcer
         self.stop_render_service()
@@ -680,13 +514,3 @@ class ControlApp(QtCore.QObject, LedControl):
         LOGGER.debug('Shutting down socket send thread.')
         self.socket_send.end_thread()
         self.update_status(_('Socket Senden Server beendet.'))
-
-        # End socket server
-        if self.server:
-            LOGGER.debug('Shutting down socket message server.')
-            self.server.shutdown()
-            LOGGER.debug('Socket message server shut down.')
-            self.update_status(_('Socket Empfangs Server beendet.'))
-
-        # End watcher process
-        self.exit_image_watcher_process()
@@ -28,7 +28,7 @@ import threading
 
 from PyQt5 import QtCore
 
-from maya_mod.socket_client import send_message
+from maya_mod.socket_client import main_address, send_message
 from maya_mod.start_command_line_render import run_command_line_render
 from maya_mod.start_mayapy import run_module_in_standalone
 from modules.app_globals import ImgParams
@@ -71,7 +71,9 @@ class RunLayerCreationProcess(threading.Thread):
                  ignore_hidden='1', delete_hidden='1', use_scene_settings='0',
                  version=None, use_renderer='',
                  # Callbacks
-                 callback=None, failed_callback=None, status_callback=None):
+                 callback=None, failed_callback=None, status_callback=None,
+                 # Job slot environment and callback receiving every started process
+                 env=None, process_callback=None):
         super(RunLayerCreationProcess, self).__init__()
         global LOGGER
         LOGGER = main_logger
@@ -81,6 +83,8 @@ class RunLayerCreationProcess(threading.Thread):
         self.renderer, self.ignoreHidden = use_renderer, ignore_hidden
         self.delete_hidden, self.use_scene_settings = delete_hidden, use_scene_settings
         self.local_work_dir = None
+        self.env, self.process_callback = env, process_callback
+        self.message_address = main_address(env)
 
         # Prepare signals
         self.signals = RunLayerCreationSignals()
@@ -164,11 +168,14 @@ class RunLayerCreationProcess(threading.Thread):
                 self.scene_file, self.render_path, self.module_dir, self.version, self.renderer,
                 self.ignoreHidden, self.delete_hidden, self.use_scene_settings,
                 pipe_output=True,     # Return a process that has output set to PIPE
-                version=self.version  # mayapy version to use
+                version=self.version,  # mayapy version to use
+                env=self.env
                 )
         except Exception as e:
             LOGGER.error(e)
 
+        self.report_process(self.process)
+
         # Log STDOUT in own thread to keep parent thread ready for abort signals
         layer_log_thread = threading.Thread(target=self.process_log_loop)
         layer_log_thread.start()
@@ -205,11 +212,13 @@ class RunLayerCreationProcess(threading.Thread):
             self.render_process = run_command_line_render(
                 self.render_scene_file, self.render_path, res_x, res_y,
                 self.version, LOGGER,
-                image_format=img_ext)
+                image_format=img_ext, env=self.env)
             LOGGER.info('Maya batch rendering started.')
         except Exception as e:
             LOGGER.error(e)
 
+        self.report_process(self.render_process)
+
         # Log STDOUT in own thread to keep parent thread ready for abort signals
         render_log_thread = threading.Thread(target=self.render_process_log_loop)
         render_log_thread.start()
@@ -230,8 +239,14 @@ class RunLayerCreationProcess(threading.Thread):
         # Wake up parent thread
         self.event.set()
 
-    @staticmethod
-    def check_arnold_render_output(line: str):
+    def report_process(self, process):
+        if process and self.process_callback:
+            try:
+                self.process_callback(process)
+            except Exception as e:
+                LOGGER.error('Error in process callback: %s', e)
+
+    def check_arnold_render_output(self, line: str):
         """
             Receives batch render process output for rendering status
             Arnold prints "0% done" status
@@ -245,7 +260,7 @@ class RunLayerCreationProcess(threading.Thread):
                 p = int(percent)
                 if not p % 10:  # Update on every 10 percent progress
                     img_num = 1 + round(p * 0.1)
-                    send_message(f'COMMAND IMG_NUM {img_num}')
+                    send_message(f'COMMAND IMG_NUM {img_num}', self.message_address)
 
     def kill_process(self):
         if self.process:
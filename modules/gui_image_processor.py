@@ -21,17 +21,20 @@
 """
 import os
 import shutil
-import numpy as np
-from PIL import Image
-from time import sleep
+import time
 from pathlib import Path
 from PyQt5 import QtCore
 from subprocess import TimeoutExpired
 
 from modules.create_cryptomatte import CreateCryptomattes
 from modules.detect_lang import get_translation
+from modules.directory_events import create_directory_watcher
+from modules.directory_index import FileDirectoryWorker
 from modules.setup_log import setup_queued_logger
-from modules.check_file_access import CheckFileAccess
+from modules.detection_executor import DetectionExecutor
+from modules.mayapy_pool import MayapyPool, MayapyWorkerError
+from modules.psd_writer import IncrementalPsdWriter, create_layered_psd, expand_cropped_layers
+from modules.utils import OpenImageUtil
 from modules.app_globals import *
 from maya_mod.start_mayapy import run_module_in_standalone
 
@@ -41,83 +44,6 @@ de = get_translation()
 _ = de.gettext
 
 
-def file_is_locked(file_path):
-    """ Dirty method to check if a file is opened by another process on MS Windows """
-    file_object = None
-
-    try:
-        file_object = open(file_path, 'a', buffering=8)
-        file_lock = False
-    except OSError:
-        file_lock = True
-    finally:
-        if file_object:
-            file_object.close()
-
-    return file_lock
-
-
-def check_file_in_use(img_file: Path):
-    """ Check if file is accessed by another process """
-    try:
-        file_access = CheckFileAccess(img_file)
-
-        if file_access.check():
-            LOGGER.debug('File in use by another process: %s - %s', file_access.process_id, file_access.process_name)
-            return True
-    except Exception as e:
-        LOGGER.error('Error checking file usage. %s', e)
-
-    return False
-
-
-class FileDirectoryWorker:
-    # Look for files with the following extension
-    image_file_extension = ImgParams.extension
-
-    @classmethod
-    def index_img_files(cls, img_file_dir: Path):
-        img_file_dict = dict()
-
-        try:
-            if not img_file_dir.exists():
-                LOGGER.error('Can not find image output directory. Nothing to index.')
-                return img_file_dict
-        except OSError as e:
-            LOGGER.error('Can not find image output directory. Nothing to index.')
-            LOGGER.error(e)
-            return img_file_dict
-
-        for __img_file in img_file_dir.glob('*' + cls.image_file_extension):
-            # --------------------------------------------
-            # Check file size
-            try:
-                file_size = __img_file.stat().st_size
-                if file_size < 350000:
-                    # Skip small files that are have just been written by the renderer
-                    # 4K empty iff image file should be at least 539 kB
-                    continue
-            except FileNotFoundError or OSError as e:
-                LOGGER.error('Error indexing image: %s', e)
-                # File probably deleted while watching, skip
-                continue
-
-            # Image key
-            img_key = __img_file.stem
-
-            # Create image file dict entry
-            img_file_dict.update({img_key: dict(path=__img_file)})
-
-        return img_file_dict
-
-    @staticmethod
-    def difference(old_dict, new_dict):
-        current_files = set(old_dict)
-        new_files = set(new_dict)
-
-        return new_files.difference(current_files)
-
-
 class ImageFileWatcher(QtCore.QThread):
     file_created_signal = QtCore.pyqtSignal(set, int)
     file_removed_signal = QtCore.pyqtSignal(set)
@@ -130,11 +56,25 @@ class ImageFileWatcher(QtCore.QThread):
     # Scan interval in milliseconds
     interval = 15000
 
+    # Receive file events from inotify or ReadDirectoryChanges instead of indexing the directory
+    # every interval. The directory is still fully indexed every event_rescan_interval.
+    use_directory_events = True
+    event_interval = 500
+    event_rescan_interval = 60000
+
     # Thread Pool
     # increase thread timeout to 4 mins
     thread_timeout = 240000
     max_threads = 10
 
+    # Compress processed images into a PSD staging file while rendering is still running
+    incremental_psd = True
+    incremental_psd_workers = 2
+
+    # Detect empty images by reading only their alpha channel scanlines or tiles, stopping at
+    # the first alpha coverage. Maya IFF images no longer need a Maya standalone process.
+    native_detection = True
+
     # Scene file name
     scene_file_name = _('KeineSzenenDatei')
 
@@ -144,6 +84,7 @@ class ImageFileWatcher(QtCore.QThread):
         # Add queue handler to logger
         global LOGGER
         LOGGER = setup_queued_logger(__name__, logging_queue)
+        setup_queued_logger(FileDirectoryWorker.__module__, logging_queue)
 
         self.watch_active = False
         self.output_dir = Path(output_dir)
@@ -153,10 +94,13 @@ class ImageFileWatcher(QtCore.QThread):
 
         # File directory index worker
         self.directory = FileDirectoryWorker()
+        self.directory_watcher = None
+        self.last_index_time = 0.0
 
         # Timers
         self.unprocessed_imgs_timer = QtCore.QTimer()
         self.watch_timer = QtCore.QTimer()
+        self.event_timer = QtCore.QTimer()
 
         # Setup event loop specific timers inside thread event loop
         self.started.connect(self.initialize_event_loop)
@@ -173,12 +117,18 @@ class ImageFileWatcher(QtCore.QThread):
         self.force_psd_creation = False
         self.is_arnold = False
 
+        # Stages processed images for PSD creation
+        self.psd_writer = None
+
         # Prepare thread pool
         self.thread_pool = QtCore.QThreadPool(parent=self)
         thread_count = max(1, min(self.max_threads, round(self.idealThreadCount() * 0.3)))
         self.thread_pool.setMaxThreadCount(thread_count)
         self.thread_pool.setExpiryTimeout(self.thread_timeout)
 
+        # Image detection processes, Maya detection still runs in the thread pool
+        self.detection = DetectionExecutor(thread_count, self.native_detection)
+
         self.status_signal.connect(self.parent.signal_receiver)
         self.file_created_signal.connect(self.parent.file_created)
         self.file_removed_signal.connect(self.parent.file_removed)
@@ -194,7 +144,6 @@ class ImageFileWatcher(QtCore.QThread):
 
         # Properties
         self.__img_count = 0
-        self.__previous_imgs = set()
 
     @property
     def img_count(self):
@@ -208,18 +157,6 @@ class ImageFileWatcher(QtCore.QThread):
     def img_count(self):
         self.__img_count = 0
 
-    @property
-    def previous_imgs(self):
-        return self.__previous_imgs
-
-    @previous_imgs.setter
-    def previous_imgs(self, val: set):
-        self.__previous_imgs = val
-
-    @previous_imgs.deleter
-    def previous_imgs(self):
-        self.__previous_imgs = set()
-
     def run(self):
         self.exec()
         LOGGER.error('Image File Watcher thread ended.')
@@ -235,6 +172,13 @@ class ImageFileWatcher(QtCore.QThread):
         self.watch_timer.start()
         LOGGER.debug('Watch Timer: %s', self.watch_timer.remainingTime())
 
+        # Timer collecting directory events, events received within one interval are processed together
+        self.event_timer = QtCore.QTimer()
+        self.event_timer.setSingleShot(False)
+        self.event_timer.setInterval(self.event_interval)
+        self.event_timer.timeout.connect(self.watch_events)
+        self.event_timer.start()
+
         # Unprocessed images timeout
         self.unprocessed_imgs_timer = QtCore.QTimer()
         self.unprocessed_imgs_timer.setSingleShot(True)
@@ -253,29 +197,56 @@ class ImageFileWatcher(QtCore.QThread):
         # Clear queue of QRunnables thar are not started yet
         self.thread_pool.clear()
 
+        # Discard queued image detections
+        self.detection.cancel()
+
         # Resets directory file index
         self.watcher_img_dict = dict()
+        self.directory.reset()
 
         # Reset image count
         del self.img_count
 
-        # Reset previous image
-        del self.previous_imgs
+        # Discard staged PSD layers
+        if self.psd_writer:
+            self.psd_writer.close()
+            self.psd_writer = None
+
+        self.stop_directory_watcher()
+
+    def start_directory_watcher(self):
+        self.stop_directory_watcher()
+
+        if self.use_directory_events:
+            self.directory_watcher = create_directory_watcher(self.output_dir)
+
+        if self.directory_watcher is None:
+            LOGGER.info('No directory events available, indexing directory every %ss.', self.interval // 1000)
+
+    def stop_directory_watcher(self):
+        if self.directory_watcher:
+            self.directory_watcher.stop()
+            self.directory_watcher = None
 
     def deactivate_watch(self):
         self.watch_active = False
+        self.stop_directory_watcher()
         self.status_signal.emit(_('Ordnerüberwachung eingestellt.'))
 
     def watch(self):
         # Red LED on while image detection threads active
-        if self.thread_pool.activeThreadCount() > 0:
+        if self.thread_pool.activeThreadCount() > 0 or self.detection.busy():
             self.led_signal.emit(0, 1)
 
         # Make sure we only call this loop if thread is not busy with eg. detecting images
         self.watch_timer.stop()
 
-        # Process output folder
-        if self.watch_active:
+        self.process_detection_results()
+
+        # Process output folder, wait for the detection queue to drain before indexing more images
+        if self.watch_active and self.detection.full():
+            LOGGER.debug('Image detection queue full, postponing directory index.')
+        elif self.watch_active:
             self.led_signal.emit(2, 1)
             self.watch_folder()
             self.led_signal.emit(2, 2)
@@ -291,25 +262,60 @@ class ImageFileWatcher(QtCore.QThread):
         # Watcher is ready again, re-schedule a run in next interval
         self.watch_timer.start()
 
+    def watch_events(self):
+        """ Run the watch loop early if directory events arrived or images being written can be stable """
+        self.process_detection_results()
+
+        if not self.watch_active:
+            return
+
+        if self.directory_watcher and not self.directory_watcher.events.empty():
+            self.watch()
+        elif self.directory.stability.due_files():
+            self.watch()
+
+    def directory_index_due(self) -> bool:
+        rescan_interval = self.event_rescan_interval
+        if self.directory_watcher is None or not self.directory_watcher.is_alive():
+            rescan_interval = self.interval
+
+        # Tolerate watch timer jitter
+        return (time.monotonic() - self.last_index_time) * 1000 >= rescan_interval - self.event_interval
+
     def watch_folder(self):
         if self.is_arnold:
             return
 
-        img_dict = self.directory.index_img_files(self.output_dir)
-        self.report_changes(img_dict)
+        changes = None
+        events = self.directory_watcher.get_events() if self.directory_watcher else list()
+
+        if not self.directory_index_due():
+            changes = self.directory.apply_events(events)
+
+        if changes is None:
+            # Polling fallback and periodic full index
+            changes = self.directory.index_img_files(self.output_dir)
+            self.last_index_time = time.monotonic()
+
+        self.report_changes(*changes)
 
         # Watch for arnold render results
         if (self.output_dir / ImgParams.cryptomatte_dir_name).exists() or (self.output_dir / 'beauty').exists():
             self.is_arnold = True
 
-        self.watcher_img_dict = img_dict
+        self.watcher_img_dict = dict(self.directory.img_file_dict)
 
     def initial_directory_index(self):
         # Resets property
         self.reset()
 
+        # Watch for events before indexing so no file created in between is missed
+        self.start_directory_watcher()
+
         # Index existing files on initial watch
-        self.watcher_img_dict = self.directory.index_img_files(self.output_dir)
+        self.directory.index_img_files(self.output_dir)
+        self.watcher_img_dict = dict(self.directory.img_file_dict)
+        self.last_index_time = time.monotonic()
 
         LOGGER.info('Image File Watcher directory changed. Found %s already existing files.',
                     len(self.watcher_img_dict))
@@ -339,7 +345,7 @@ class ImageFileWatcher(QtCore.QThread):
 
     def create_psd(self):
         """ Check that all images in the directory are processed and create layered PSD file """
-        if self.thread_pool.activeThreadCount():
+        if self.thread_pool.activeThreadCount() or self.detection.busy():
             # Threads detecting empty images are running, abort
             LOGGER.debug('Can not create PSD yet. Image detection threads active. Retrying on next directory index.')
             return
@@ -405,8 +411,10 @@ class ImageFileWatcher(QtCore.QThread):
 
             create_psd_runner = CreatePSDFile(
                 psd_file, self.output_dir, self.mod_dir, self.thread_status, self.psd_created,
-                file_ext_override=file_ext, img_resolution=img_resolution
+                file_ext_override=file_ext, img_resolution=img_resolution, psd_writer=self.psd_writer
                 )
+            # The PSD thread owns the staged layers from now on
+            self.psd_writer = None
 
             self.thread_pool.start(create_psd_runner)
 
@@ -423,6 +431,11 @@ class ImageFileWatcher(QtCore.QThread):
             try:
                 shutil.rmtree(Path(self.output_dir / 'beauty').as_posix(), ignore_errors=True)
                 shutil.rmtree(Path(self.output_dir / ImgParams.cryptomatte_dir_name).as_posix(), ignore_errors=True)
+                shutil.rmtree(Path(self.output_dir / OpenImageUtil.layer_buffer_dir_name).as_posix(),
+                              ignore_errors=True)
+                layer_offsets_file = self.output_dir / OpenImageUtil.layer_offsets_file_name
+                if layer_offsets_file.exists():
+                    os.remove(layer_offsets_file.as_posix())
             except Exception as e:
                 LOGGER.error('Error removing arnold render results: %s', e)
 
@@ -454,43 +467,25 @@ class ImageFileWatcher(QtCore.QThread):
         self.scene_file = file
         self.status_signal.emit(_('Szenendatei geändert zu: {}').format(self.scene_file_name))
 
-    def report_changes(self, current_img_dict):
-        self.check_for_created_files(current_img_dict)
-        self.check_for_removed_files(current_img_dict)
-
-    def check_for_created_files(self, img_dict):
-        new_file_set = self.directory.difference(old_dict=self.watcher_img_dict, new_dict=img_dict)
+    def report_changes(self, new_file_set: set, rem_file_set: set):
+        self.check_for_created_files(new_file_set)
+        self.check_for_removed_files(rem_file_set)
 
+    def check_for_created_files(self, new_file_set: set):
         if not new_file_set:
-            if not self.create_psd_requested:
-                # No new files, rendering not finished
-                return
-
-            if self.previous_imgs:
-                # Rendering finished, process previous files
-                new_file_set = self.previous_imgs
-                del self.previous_imgs
-            else:
-                # Rendering finished but no previous unprocessed files
-                return
-        else:
-            # Add new files to created image count
-            self.img_count = len(new_file_set)
+            return
 
-            LOGGER.debug('Watcher found new files: %s', new_file_set)
+        # Add new files to created image count
+        self.img_count = len(new_file_set)
 
-            # Inform the parent thread
-            self.file_created_signal.emit(new_file_set, self.img_count)
+        LOGGER.debug('Watcher found new files: %s', new_file_set)
 
-        if self.create_psd_requested:
-            # PSD requested, save to access all files because the rendering thread is finished.
-            # Start image detection process for last added file-s
-            self.add_new_file_set_as_threads(img_dict, new_file_set)
-        else:
-            # Not save to access last created file-s as rendering thread is active.
-            # Process the previous created image-s
-            self.add_new_file_set_as_threads(img_dict, self.previous_imgs)
-            self.previous_imgs = new_file_set
+        # Inform the parent thread
+        self.file_created_signal.emit(new_file_set, self.img_count)
+
+        # Images are only indexed once the renderer finished writing them,
+        # start image detection right away
+        self.add_new_file_set_as_threads(self.directory.img_file_dict, new_file_set)
 
     def add_new_file_set_as_threads(self, img_dict, new_file_set):
         """ check_for_created_files helper """
@@ -500,22 +495,39 @@ class ImageFileWatcher(QtCore.QThread):
             if img_entry:
                 img_file = img_entry.get('path')
             else:
-                # This happens when new_file_set=self.previous_imgs and the image detection process
-                # already deleted the file and therefore it is not indexed in the freshly acquired img_dict
-                # So skip this entry as it is already processed
+                # File was removed from the index before it could be processed, skip
                 continue
 
             if img_file:
                 self.add_image_processing_thread(img_file)
 
     def add_image_processing_thread(self, img_file):
-        # -----
-        # Use pillow detection if format is not Maya IFF files
-        if img_file.suffix[-3:] != ImgParams.maya_detection_format:
-            self.status_signal.emit(_('<i>{0}</i> wird in Pillow Bilderkennung untersucht.').format(img_file.name))
-            self.detect_empty_image_pil(img_file)
+        """ Queue native and Pillow detection of img_file in the detection processes, oldest images first """
+        self.led_signal.emit(0, 1)
+        stat_key = self.directory.stat_index.get(img_file.name, (0, 0))
+        self.detection.submit(img_file, priority=stat_key[1])
+
+    def process_detection_results(self):
+        """ Collect finished image detections, images that could not be decoded are detected by Maya """
+        results = self.detection.poll()
+        if not results:
             return
 
+        for img_file, image_is_empty, error in results:
+            if error:
+                LOGGER.error(error)
+
+            if image_is_empty is None:
+                self.add_maya_detection_thread(img_file)
+            else:
+                self.empty_image_result(img_file, image_is_empty)
+
+        self.status_signal.emit(_('Bilderkennung: {0:02d} Bilder in Warteschlange, {1:02d} aktiv, '
+                                  '{2:.1f} Bilder/s.')
+                                .format(self.detection.queue_depth, self.detection.active,
+                                        self.detection.throughput))
+
+    def add_maya_detection_thread(self, img_file):
         # -----
         # Maya image detection process
         # Create runnable and append to thread pool
@@ -529,22 +541,8 @@ class ImageFileWatcher(QtCore.QThread):
                                         self.thread_pool.maxThreadCount())
                                 )
 
-    def detect_empty_image_pil(self, img_file: Path):
-        self.led_signal.emit(0, 1)
-        image_is_empty = True
-
-        # --- Detect image contents ---
-        try:
-            with Image.open(img_file.as_posix()) as img:
-                img_array = np.asarray(img)
-
-                if img_array.max() > 0:
-                    image_is_empty = False
-
-            del img
-        except Exception as e:
-            LOGGER.error('Error reading file for image detection: %s', e)
-
+    def empty_image_result(self, img_file: Path, image_is_empty: bool):
+        """ Report image detection result and remove empty image files """
         # --- Result ---
         # Image is -not- empty
         if not image_is_empty:
@@ -571,27 +569,37 @@ class ImageFileWatcher(QtCore.QThread):
             # Set un-removable files as processed
             self.image_processing_result(img_file)
 
-    def check_for_removed_files(self, img_dict):
-        rem_file_set = self.directory.difference(old_dict=img_dict, new_dict=self.watcher_img_dict)
-
+    def check_for_removed_files(self, rem_file_set: set):
         if not rem_file_set:
             return
 
         LOGGER.debug('Watcher found removed files: %s', rem_file_set)
 
-        # Reset watcher img dict
-        self.watcher_img_dict = dict()
-        self.watcher_img_dict = img_dict
-
         self.file_removed_signal.emit(rem_file_set)
 
     def image_processing_result(self, img_file: Path):
         """ Called from image processing thread """
         self.processed_img_dict[img_file.stem] = dict(path=img_file, processed=True)
+        self.stage_psd_layer(img_file)
 
         # Switch Red LED off
         self.led_signal.emit(0, 2)
 
+    def stage_psd_layer(self, img_file: Path):
+        """ Compress the processed image into the PSD staging file ahead of PSD creation """
+        if not self.incremental_psd or self.is_arnold or not CreatePSDFile.use_native_writer:
+            return
+
+        if self.psd_writer is None:
+            psd_file = self.output_dir / (self.scene_file_name + _('_Pfade.psd'))
+            self.psd_writer = IncrementalPsdWriter(psd_file, ImgParams.res_x, ImgParams.res_y,
+                                                   workers=self.incremental_psd_workers)
+
+        try:
+            self.psd_writer.add_layer_file(img_file)
+        except Exception as e:
+            LOGGER.error('Could not stage PSD layer %s: %s', img_file.name, e)
+
     def thread_status(self, msg):
         """ Status signals emitted from image processing or psd threads """
         self.status_signal.emit(msg)
@@ -604,6 +612,8 @@ class ProcessImageSignals(QtCore.QObject):
 
 class ProcessImage(QtCore.QRunnable):
     image_process_timeout = 360  # 6 minutes
+    # Run the detection in a warm mayapy worker instead of starting a Maya standalone per image
+    use_mayapy_pool = True
 
     def __init__(self, img_file, mod_dir, result_callback, status_callback):
         super(ProcessImage, self).__init__()
@@ -618,12 +628,23 @@ class ProcessImage(QtCore.QRunnable):
         self.signals.status.connect(status_callback)
 
     def run(self):
-        # Hopefully avoid race conditions while accessing files
-        sleep(3)
-
-        self.run_process()
+        if not self.use_mayapy_pool or not self.run_pooled():
+            self.run_process()
         self.detect_result()
 
+    def run_pooled(self) -> bool:
+        """ Run the detection module in a mayapy pool worker, returns False if no worker could run it """
+        try:
+            LOGGER.debug('Running pooled image detection for %s', self.img_file.as_posix())
+            result = MayapyPool.instance().run_module(
+                self.img_check_module, self.img_file.as_posix(), self.mod_dir, timeout=self.image_process_timeout
+                )
+        except MayapyWorkerError as e:
+            LOGGER.error('Pooled image detection failed, falling back to Maya standalone. %s', e)
+            return False
+
+        return result.get('ok', False)
+
     def run_process(self):
         """ Run Maya standalone to detect and delete empty image file """
         try:
@@ -682,23 +703,69 @@ class CreatePSDFileSignals(QtCore.QObject):
 
 
 class CreatePSDFile(QtCore.QRunnable):
+    # Write the PSD with the native PSD writer instead of a Maya standalone process
+    use_native_writer = True
+    # Run the Maya PSD creation in a warm mayapy worker
+    use_mayapy_pool = True
 
     def __init__(self, psd_file, img_dir, mod_dir, status_callback, result_callback,
-                 file_ext_override='', img_resolution=(0, 0)):
+                 file_ext_override='', img_resolution=(0, 0), psd_writer: IncrementalPsdWriter=None):
         super(CreatePSDFile, self).__init__()
         self.psd_file, self.img_dir, self.mod_dir = psd_file, img_dir, mod_dir
         self.psd_creation_module = Path(self.mod_dir) / 'maya_mod/run_create_psd.py'
 
         self.file_extension = file_ext_override or ImgParams.extension
+        self.img_resolution = img_resolution
         self.img_res = (str(img_resolution[0]), str(img_resolution[1]))
+        self.psd_writer = psd_writer
 
         self.signals = CreatePSDFileSignals()
         self.signals.result.connect(result_callback)
         self.signals.status.connect(status_callback)
 
     def run(self):
+        self.signals.status.emit(_('Erstelle PSD Datei {}').format(self.psd_file.name))
+
+        if not self.use_native_writer or not self.run_native_writer():
+            self.run_mayapy()
+
+        if self.psd_writer:
+            self.psd_writer.close()
+
+        # Mark PSD creation as finished even if unsuccessful to get the job finished
+        self.signals.result.emit(self.psd_file.name)
+
+    def run_native_writer(self) -> bool:
+        """ Create the PSD file in this process, returns False if the PSD could not be created """
+        try:
+            return create_layered_psd(
+                self.psd_file, self.img_dir, self.file_extension, *self.img_resolution, rem_single_imgs=True,
+                writer=self.psd_writer
+                )
+        except Exception as e:
+            LOGGER.error('Native PSD creation failed, falling back to Maya standalone. %s', e)
+
+        return False
+
+    def run_mayapy(self):
+        # The Maya PSD creation does not read the offsets of cropped layer images
+        try:
+            expand_cropped_layers(self.img_dir, self.file_extension, *self.img_resolution)
+        except Exception as e:
+            LOGGER.error('Could not expand cropped layer images: %s', e)
+
+        if self.use_mayapy_pool:
+            try:
+                result = MayapyPool.instance().run_module(
+                    self.psd_creation_module, self.psd_file.as_posix(), self.img_dir.as_posix(), self.file_extension,
+                    *self.img_res, Path(self.mod_dir).as_posix()
+                    )
+                if result.get('ok'):
+                    return
+            except MayapyWorkerError as e:
+                LOGGER.error('Pooled PSD creation failed, falling back to Maya standalone. %s', e)
+
         try:
-            self.signals.status.emit(_('Erstelle PSD Datei {}').format(self.psd_file.name))
             process = run_module_in_standalone(
                 self.psd_creation_module.as_posix(),  # Path to module to run
                 self.psd_file.as_posix(), self.img_dir.as_posix(), self.file_extension, *self.img_res,  # Args
@@ -707,6 +774,3 @@ class CreatePSDFile(QtCore.QRunnable):
             process.wait()
         except Exception as e:
             LOGGER.error(e)
-
-        # Mark PSD creation as finished even if unsuccessful to get the job finished
-        self.signals.result.emit(self.psd_file.name)
@@ -36,6 +36,7 @@ from modules.setup_log import setup_queued_logger
 from modules.socket_server import run_watcher_server
 from maya_mod.socket_client import send_message
 from modules.gui_image_processor import ImageFileWatcher
+from modules.mayapy_pool import MayapyPool
 from modules.app_globals import *
 
 # translate strings
@@ -83,15 +84,17 @@ class WatcherApp(QtWidgets.QApplication):
     deactivate_watch = QtCore.pyqtSignal()
 
     """ Main GUI Application """
-    def __init__(self, mod_dir, render_path, scene_file, version, logging_queue):
+    def __init__(self, mod_dir, render_path, scene_file, version, logging_queue, slot=0):
         super(WatcherApp, self).__init__(sys.argv)
 
         self.app_ui = WatcherWindow(self, mod_dir)
+        if slot:
+            self.app_ui.setWindowTitle(f'{self.app_ui.windowTitle()} #{slot:02d}')
         self.app_closing = False
         self.mod_dir, self.watch_dir, self.scene_file, self.version = mod_dir, render_path, scene_file, version
         self.logging_queue = logging_queue
 
-        self.server = run_watcher_server(self.signal_receiver)
+        self.server = run_watcher_server(self.signal_receiver, SocketAddress.slot_address(SocketAddress.watcher, slot))
 
         # Force Psd Button
         self.app_ui.forcePsdBtn.pressed.connect(self.request_psd_forced)
@@ -148,6 +151,9 @@ class WatcherApp(QtWidgets.QApplication):
         LOGGER.info('Watcher is shutting down Watcher Image File Watcher.')
         self.stop_image_watcher()
 
+        LOGGER.debug('Watcher is shutting down mayapy worker pool.')
+        MayapyPool.instance().shutdown()
+
         self.app_ui.close()
 
     def start_image_watcher(self):
@@ -177,6 +183,8 @@ class WatcherApp(QtWidgets.QApplication):
                 self.image_watcher.wait(msecs=15000)
                 # self.image_watcher.quit()
 
+            self.image_watcher.detection.shutdown()
+
     def signal_receiver(self, msg):
         if msg.startswith('COMMAND'):
             socket_command = msg.replace('COMMAND ', '')
@@ -218,11 +226,15 @@ class WatcherApp(QtWidgets.QApplication):
             self.watcher_dir_changed.emit(self.watch_dir)
 
 
-def start_watcher(mod_dir, render_path, scene_file, version, logging_queue):
+def start_watcher(mod_dir, render_path, scene_file, version, logging_queue, slot=0):
     global LOGGER
     LOGGER = setup_queued_logger('watcher_logger', logging_queue)
 
-    app = WatcherApp(mod_dir, render_path, scene_file, version, logging_queue)
+    # Messages of this process and it's mayapy processes go to the main app job slot
+    main_port = SocketAddress.slot_address(SocketAddress.main, slot)[1]
+    os.environ[SocketAddress.main_port_env] = str(main_port)
+
+    app = WatcherApp(mod_dir, render_path, scene_file, version, logging_queue, slot)
     app.exec_()
 
     sys.exit()
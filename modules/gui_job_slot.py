@@ -0,0 +1,411 @@
+#! usr/bin/python_3
+"""
+    -------------
+    Pfad Aeffchen
+    -------------
+    Job slot runs one job of the control app with it's own watcher process and socket ports
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+from datetime import datetime
+from multiprocessing import Process
+
+import psutil
+from PyQt5 import QtCore
+
+from modules.app_globals import AVAILABLE_RENDERER, SocketAddress
+from modules.detect_lang import get_translation
+from modules.gui_create_process import RunLayerCreationProcess
+from modules.gui_image_watcher_process import start_watcher
+from modules.job import Job, JobStatus
+from modules.setup_log import setup_queued_logger, do_rollover
+from modules.socket_server import run_message_server
+
+# translate strings
+de = get_translation()
+_ = de.gettext
+
+
+class JobSlot(QtCore.QObject):
+    """
+        Runs one job at a time with it's own image watcher process, layer creation thread and
+        message server. Slot 0 uses the default socket ports, further slots use ports offset by
+        SocketAddress.slot_port_step and share the cpu cores with the other slots.
+    """
+    # Service Manager signals, first argument is the slot number
+    job_failed_signal = QtCore.pyqtSignal(int)
+    job_canceled_signal = QtCore.pyqtSignal(int)
+    job_finished_signal = QtCore.pyqtSignal(int)
+    job_status_signal = QtCore.pyqtSignal(int, int)
+    job_status_name_signal = QtCore.pyqtSignal(int, str)
+    job_img_num_signal = QtCore.pyqtSignal(int, int, int)
+    queue_next_job_signal = QtCore.pyqtSignal(int)
+
+    # Job finished timeout
+    job_finished_interval = 10000
+
+    # Commands handled by the slot, other commands are forwarded to the control app
+    job_commands = ('LAYER_NUM', 'IMG_NUM', 'STATUS_NAME', 'CREATE_PSD', 'IMG_JOB_FINISHED', 'IMG_JOB_FAILED')
+
+    def __init__(self, control_app, slot: int, slot_count: int, logging_queue):
+        """
+
+        :param modules.gui_control_app.ControlApp control_app:
+        :param int slot: number of this slot
+        :param int slot_count: number of concurrently running slots
+        :param logging_queue:
+        """
+        super(JobSlot, self).__init__()
+        global LOGGER
+        LOGGER = setup_queued_logger(__name__, logging_queue)
+        self.control_app, self.ui, self.logging_queue = control_app, control_app.ui, logging_queue
+        self.slot, self.slot_count = slot, slot_count
+
+        self.main_address = SocketAddress.slot_address(SocketAddress.main, slot)
+        self.watcher_address = SocketAddress.slot_address(SocketAddress.watcher, slot)
+
+        self.empty_job = control_app.empty_job
+        self.current_job = self.empty_job
+        self.job_aborted = False
+        # Status messages of the current job for the job report
+        self.status_lines = list()
+        # Jobs started while other slots are busy run with lower priority
+        self.low_priority = False
+
+        # Watcher process
+        self.watcher = None
+        self.layer_creation_thread = None
+
+        self.job_finished_timer = QtCore.QTimer()
+        self.job_finished_timer.setSingleShot(True)
+        self.job_finished_timer.setInterval(self.job_finished_interval)
+        self.job_finished_timer.timeout.connect(self.job_finished)
+
+        # Setup socket server to receive status updates of this slot's processes
+        self.server = run_message_server(
+            (self.receive_message, control_app.led_socket_recv_start, control_app.led_socket_recv_end),
+            self.main_address
+            )
+
+    @property
+    def busy(self) -> bool:
+        return self.current_job is not self.empty_job
+
+    @property
+    def name(self) -> str:
+        """ Prefix for status messages if jobs run concurrently """
+        if self.slot_count < 2:
+            return ''
+        return f'#{self.slot:02d} '
+
+    @property
+    def cpu_cores(self) -> list:
+        """ Share of the available cpu cores for this slot, all cores if only one slot is configured """
+        try:
+            cores = psutil.Process().cpu_affinity()
+        except (AttributeError, psutil.Error, OSError):
+            # cpu_affinity is not available on every platform
+            cores = list(range(os.cpu_count() or 1))
+
+        if self.slot_count < 2 or len(cores) < self.slot_count:
+            return cores
+
+        size = len(cores) // self.slot_count
+        start = self.slot * size
+        if self.slot == self.slot_count - 1:
+            return cores[start:]
+
+        return cores[start:start + size]
+
+    @property
+    def environment(self) -> dict:
+        """ Environment of the job processes, directs their messages to this slot """
+        env = os.environ.copy()
+        env[SocketAddress.main_port_env] = str(self.main_address[1])
+        return env
+
+    def setup_process(self, process):
+        """ Pin process and it's child processes to the cpu cores of this slot and lower their priority if requested """
+        if self.slot_count < 2:
+            return
+
+        if os.name == 'nt':
+            normal_priority, lower_priority = psutil.NORMAL_PRIORITY_CLASS, psutil.BELOW_NORMAL_PRIORITY_CLASS
+        else:
+            normal_priority, lower_priority = 0, 5
+
+        cores = self.cpu_cores
+
+        try:
+            parent = psutil.Process(process.pid)
+            for p in [parent] + parent.children(recursive=True):
+                if hasattr(p, 'cpu_affinity'):
+                    p.cpu_affinity(cores)
+
+                # Never raise the priority of processes already started with a lower priority eg. Render.exe
+                if self.low_priority and p.nice() == normal_priority:
+                    p.nice(lower_priority)
+        except (psutil.Error, OSError) as e:
+            LOGGER.error('Could not set cpu affinity and priority of job slot %s process: %s', self.slot, e)
+            return
+
+        LOGGER.debug('Job slot %s process %s using cpu cores %s', self.slot, process.pid, cores)
+
+    def update_status(self, status_msg):
+        current_time = datetime.now().strftime('(%H:%M:%S) ')
+        self.status_lines.append(current_time + status_msg)
+        self.control_app.update_status(status_msg, self.name)
+
+    def receive_message(self, status_msg):
+        """ Receive socket messages of this slot's processes """
+        if not status_msg.startswith('COMMAND'):
+            self.update_status(status_msg)
+            return
+
+        socket_command = status_msg.replace('COMMAND ', '')
+
+        if socket_command.startswith('LAYER_NUM'):
+            # Update number of images to render (+1 for masterLayer)
+            total_img_num = int(socket_command[len('LAYER_NUM '):]) + 1
+            self.job_img_num_signal.emit(self.slot, 0, total_img_num)
+            self.current_job.total_img_num = total_img_num
+        elif socket_command.startswith('IMG_NUM'):
+            # Update number of created images
+            img_num = int(socket_command[len('IMG_NUM '):])
+            self.job_img_num_signal.emit(self.slot, img_num, 0)
+            self.current_job.img_num = img_num
+            self.control_app.update_progress(self.current_job)
+        elif socket_command.startswith('STATUS_NAME'):
+            # Update status description with custom status
+            status_name = socket_command[len('STATUS_NAME '):]
+            self.job_status_name_signal.emit(self.slot, status_name)
+            self.current_job.status_name = status_name
+            self.control_app.update_progress(self.current_job)
+
+        elif socket_command == 'CREATE_PSD':
+            self.watcher_create_psd()
+
+        elif socket_command == 'IMG_JOB_FINISHED':
+            status_msg = _('<b>{} fertiggestellt. PSD Datei erstellt.</b>').format(self.current_job.title)
+            self.job_finished_timer.start()
+
+        elif socket_command == 'IMG_JOB_FAILED':
+            status_msg = _('<b>{} fehlgeschlagen. Keine Bilddaten vorhanden.</b>').format(self.current_job.title)
+            self.job_failed()
+
+        self.update_status(status_msg)
+
+    def start_image_watcher_process(self):
+        if self.watcher:
+            if self.watcher.is_alive():
+                self.update_watcher(self.current_job.file, self.current_job.render_dir)
+                return
+            else:
+                self.exit_image_watcher_process()
+
+        # Start watcher process
+        # on Win 7 x64 starting mayapy in threads from mayapy thread crashes Maya 2016.5 Ex2 Up2
+        self.watcher = Process(target=start_watcher, args=(self.control_app.mod_dir,
+                                                           self.current_job.render_dir,
+                                                           self.current_job.file,
+                                                           self.ui.comboBox_version.currentText(),
+                                                           self.logging_queue,
+                                                           self.slot,
+                                                           )
+                               )
+        self.watcher.start()
+        self.setup_process(self.watcher)
+
+    def exit_image_watcher_process(self):
+        if self.watcher:
+            if self.watcher.is_alive():
+                LOGGER.debug('Shutting down image processing server of job slot %s.', self.slot)
+                self.control_app.socket_send.do('COMMAND CLOSE', self.watcher_address)
+                self.watcher.join()
+                LOGGER.debug('Image processing server shut down.')
+                self.update_status(_('Bild Beobachter beendet.'))
+                del self.watcher
+                self.watcher = None
+
+    def update_watcher(self, scene_file=None, output_dir=None):
+        """ Update Image Watcher environment if it is running """
+        if self.watcher:
+            if scene_file:
+                self.control_app.socket_send.do('COMMAND SCENE_FILE ' + scene_file, self.watcher_address)
+            if output_dir:
+                self.control_app.socket_send.do('COMMAND RENDER_PATH ' + output_dir, self.watcher_address)
+
+    def toggle_watcher_window(self, toggle_state):
+        if not self.watcher:
+            return
+
+        if self.watcher.is_alive():
+            if not toggle_state:
+                self.control_app.socket_send.do('COMMAND HIDE_WINDOW', self.watcher_address)
+            else:
+                self.control_app.socket_send.do('COMMAND SHOW_WINDOW', self.watcher_address)
+
+    def add_render_job(self, job_object: Job, low_priority: bool=False):
+        """ Service Manager requests new job for this slot """
+        # This is a COPY of the actual service manager thread job class instance
+        # Therefore we update our local copy -AND- signal all changes to the service
+        # manager thread
+        self.current_job = job_object
+        self.status_lines = list()
+        self.low_priority = low_priority
+
+        self.start_queue()
+
+    def start_queue(self):
+        """ Start the job of this slot if queue GUI switch is enabled and the job is not yet running """
+        if not self.busy or self.layer_creation_thread:
+            return
+
+        if self.ui.enableQueue.isChecked():
+            if self.current_job.status > 4:
+                # Skip job if finished, failed, aborted
+                self.job_finished()
+                return
+
+            # Set job status to scene loading/editing
+            self.job_status(JobStatus.scene_loading)
+            self.start_image_watcher_process()
+            self.start_render_process()
+
+    def job_failed(self):
+        """ Called from unsuccessful render process """
+        self.control_app.socket_send.do('COMMAND ABORT', self.watcher_address)
+        msg = f'<b>{self.current_job.title} fehlgeschlagen.</b> Ausgabeordner Überwachung wird abgebrochen.'
+        self.update_status(msg)
+
+        if self.job_aborted:
+            LOGGER.debug('Setting Job %s as canceled %s.', self.current_job.title, self.job_aborted)
+            self.job_canceled_signal.emit(self.slot)
+        else:
+            LOGGER.debug('Setting Job %s as failed %s.', self.current_job.title, self.job_aborted)
+            self.job_failed_signal.emit(self.slot)
+
+        self.job_aborted = False
+        self.job_finished()
+
+    def job_finished(self):
+        """ Called from image watcher process if PSD Creation finished """
+        self.control_app.save_status_report(self.current_job)
+
+        # Reset job parameters
+        self.job_finished_signal.emit(self.slot)
+        self.current_job = self.empty_job
+        self.status_lines = list()
+        self.layer_creation_thread = None
+
+        self.control_app.update_progress()
+        self.exit_image_watcher_process()
+
+        self.queue_next_job_signal.emit(self.slot)
+
+    def job_status(self, status):
+        """ Update job status from creation thread """
+        self.job_status_signal.emit(self.slot, status)
+        self.current_job.status = status
+        self.control_app.update_progress(self.current_job)
+
+    def watcher_create_psd(self):
+        """ Finalize the job, continue detecting empty rendering results and create PSD """
+        # Set job status to image detection
+        self.job_status(JobStatus.image_detection)
+
+        if self.watcher:
+            if self.watcher.is_alive():
+                pass
+            else:
+                self.start_image_watcher_process()
+
+        self.control_app.socket_send.do('COMMAND REQUEST_PSD', self.watcher_address)
+
+    def watcher_force_psd_creation(self):
+        """ Try to force job completion, continue detecting empty rendering results and immediately create PSD """
+
+        if self.watcher:
+            if self.watcher.is_alive():
+                pass
+            else:
+                return
+
+        self.control_app.socket_send.do('COMMAND FORCE_REQUEST_PSD', self.watcher_address)
+
+    def abort_running_job(self):
+        """ Attempt to kill running processes for the job of this slot """
+        msg = f'<span style="color:red;"><b>{self.current_job.title} wurde vom Benutzer abgebrochen.</b></span>'
+        self.update_status(msg)
+        self.job_aborted = True
+        self.job_status(JobStatus.aborted)
+
+        if self.layer_creation_thread:
+            if self.layer_creation_thread.is_alive():
+                LOGGER.debug('Current Job canceled, trying to kill batch process.')
+                self.layer_creation_thread.kill_process()
+            else:
+                LOGGER.debug('Current Job canceled, batch processed finished. Setting job as failed.')
+                self.job_failed()
+        else:
+            LOGGER.debug('Current Job canceled, batch processed not present. Setting job as failed.')
+            self.job_failed()
+
+    def start_render_process(self):
+        """ Start the layer creation process """
+        renderer = self.current_job.renderer
+        if renderer not in AVAILABLE_RENDERER:
+            renderer = self.ui.comboBox_renderer.currentText()
+
+        args = (LOGGER,             # Provide with the logging queue
+                self.current_job.file,          # Arg Scene file
+                self.current_job.render_dir,    # Arg Render path
+                self.control_app.mod_dir,       # Arg Env / module directory
+                self.current_job.ignore_hidden_objects,   # Arg CSB Import option ignoreHiddenObject
+                self.current_job.maya_delete_hidden,      # Arg Maya Layer Creation option
+                self.current_job.use_scene_settings,      # Arg Use Maya Binary Scene Settings
+                self.ui.comboBox_version.currentText(),   # Arg Maya Version
+                renderer,                       # Arg Maya renderer
+                self.watcher_create_psd,        # Successfully finished Callback
+                self.job_failed,                # Un-successfully finished Callback
+                self.job_status,                # Update job status
+                self.environment,               # Direct process messages to this slot
+                self.setup_process,             # Pin processes to this slot's cpu cores
+                )
+
+        # Start every Job with a new log file unless other jobs are still writing to it
+        if not self.control_app.other_slots_busy(self):
+            do_rollover(self.control_app.app.log_listener)
+
+        self.layer_creation_thread = RunLayerCreationProcess(*args)
+        self.layer_creation_thread.start()
+        self.control_app.led(0, 0)
+
+    def shutdown(self):
+        """ Abort the running job and end the message server and watcher process of this slot """
+        self.queue_next_job_signal.disconnect()
+
+        if self.busy:
+            self.abort_running_job()
+
+        if self.server:
+            LOGGER.debug('Shutting down socket message server of job slot %s.', self.slot)
+            self.server.shutdown()
+
+        self.exit_image_watcher_process()
@@ -72,9 +72,9 @@ def copy_job(job):
 
 
 class ServiceManager(QThread):
-    start_job_signal = pyqtSignal(object)
-    abort_running_job_signal = pyqtSignal()
-    force_psd_creation_signal = pyqtSignal()
+    start_job_signal = pyqtSignal(object, int)
+    abort_running_job_signal = pyqtSignal(int)
+    force_psd_creation_signal = pyqtSignal(int)
     job_widget_signal = pyqtSignal(object)
     tcp_respond_signal = pyqtSignal(object)
 
@@ -86,10 +86,28 @@ class ServiceManager(QThread):
     # Green LED alive timer, signal the user we are alive
     alive_led_signal = pyqtSignal()
 
-    job_active = False
+    # Number of jobs running concurrently. Override with the environment variable job_slots_env
+    # eg. PFAD_AEFFCHEN_JOB_SLOTS=2 on machines with many cpu cores, the slots share the cpu cores.
+    job_slots = 1
+    max_job_slots = 4
+    job_slots_env = 'PFAD_AEFFCHEN_JOB_SLOTS'
+
     pickle_cache = b''
     transfer_cache = b''
 
+    @classmethod
+    def job_slot_count(cls) -> int:
+        """ Configured number of job slots """
+        value = os.environ.get(cls.job_slots_env, '')
+
+        try:
+            slots = int(value) if value else cls.job_slots
+        except ValueError:
+            LOGGER.error('Invalid number of job slots in %s: %s', cls.job_slots_env, value)
+            slots = cls.job_slots
+
+        return max(1, min(cls.max_job_slots, slots))
+
     def __init__(self, control_app, app, ui, logging_queue):
         super(ServiceManager, self).__init__()
         # global LOGGER
@@ -100,7 +118,8 @@ class ServiceManager(QThread):
         self.job_working_queue = list()
         self.job_queue = list()
         self.empty_job = Job(_('Kein Job'), '', get_user_directory(), 'mayaSoftware')
-        self.current_job = self.empty_job
+        # Running jobs by job slot
+        self.active_jobs = dict()
 
         # Control app signals
         self.start_job_signal.connect(self.control_app.add_render_job)
@@ -250,23 +269,53 @@ class ServiceManager(QThread):
         LOGGER.debug('Finished Job File Transfer for %s', job.title)
         self.start_job()
 
-    def job_finished(self):
-        """ Called from app if last job finished """
-        self.job_active = False
+    @property
+    def current_job(self) -> Job:
+        """ Job of the first busy job slot """
+        if not self.active_jobs:
+            return self.empty_job
+
+        return self.active_jobs[min(self.active_jobs)]
+
+    def job_slot(self, job):
+        """ Return the slot running job or None """
+        for slot, active_job in self.active_jobs.items():
+            if active_job is job:
+                return slot
+
+        return None
+
+    def job_finished(self, slot: int=0):
+        """ Called from app if the job of slot finished """
+        self.active_jobs.pop(slot, None)
         self.start_job()
 
+    def next_job(self):
+        """ Remove and return the first queued job whose scene file is not used by a running job """
+        active_files = {job.file for job in self.active_jobs.values()}
+
+        for job in self.job_working_queue:
+            # Jobs of the same scene file would write the same render scene file
+            if job.file not in active_files:
+                self.job_working_queue.remove(job)
+                return job
+
+        return None
+
     def start_job(self):
-        """ Start the next job in the queue if no job is running """
-        if not self.job_working_queue:
-            return
+        """ Start the next jobs in the queue while job slots are free """
+        for slot in range(self.job_slot_count()):
+            if slot in self.active_jobs:
+                continue
 
-        if not self.job_active:
-            self.current_job = self.job_working_queue.pop(0)
+            job = self.next_job()
+            if not job:
+                return
 
-            self.current_job.render_dir = create_unique_render_path(self.current_job.file, self.current_job.render_dir)
+            job.render_dir = create_unique_render_path(job.file, job.render_dir)
 
-            self.start_job_signal.emit(copy_job(self.current_job))
-            self.job_active = True
+            self.active_jobs[slot] = job
+            self.start_job_signal.emit(copy_job(job), slot)
 
     def add_job(self, job_data, client: str=None):
         if type(job_data) is str:
@@ -306,9 +355,11 @@ class ServiceManager(QThread):
         return True
 
     def cancel_job(self, job):
-        if job.in_progress:
+        slot = self.job_slot(job)
+
+        if job.in_progress and slot is not None:
             LOGGER.info('Aborting currently running Job.')
-            self.abort_running_job_signal.emit()
+            self.abort_running_job_signal.emit(slot)
 
         job.set_canceled()
 
@@ -347,34 +398,38 @@ class ServiceManager(QThread):
         for __j in self.job_queue:
             self.job_widget_signal.emit(__j)
 
-    def set_job_failed(self):
-        self.current_job.set_failed()
-        self._clear_local_job_file(self.current_job)
+    def set_job_failed(self, slot: int=0):
+        job = self.active_jobs.get(slot, self.empty_job)
+        job.set_failed()
+        self._clear_local_job_file(job)
         self.invalidate_transfer_cache()
 
-    def set_job_canceled(self):
-        self.current_job.set_canceled()
-        self._clear_local_job_file(self.current_job)
+    def set_job_canceled(self, slot: int=0):
+        job = self.active_jobs.get(slot, self.empty_job)
+        job.set_canceled()
+        self._clear_local_job_file(job)
         self.invalidate_transfer_cache()
 
-    def set_job_finished(self):
-        self.current_job.set_finished()
-        self._clear_local_job_file(self.current_job)
+    def set_job_finished(self, slot: int=0):
+        job = self.active_jobs.get(slot, self.empty_job)
+        job.set_finished()
+        self._clear_local_job_file(job)
         self.invalidate_transfer_cache()
 
-    def set_job_status(self, status: int):
-        self.current_job.status = status
+    def set_job_status(self, slot: int=0, status: int=0):
+        self.active_jobs.get(slot, self.empty_job).status = status
         self.invalidate_transfer_cache()
 
-    def set_job_status_name(self, status_name):
-        self.current_job.status_name = status_name
+    def set_job_status_name(self, slot: int=0, status_name: str=''):
+        self.active_jobs.get(slot, self.empty_job).status_name = status_name
         self.invalidate_transfer_cache()
 
-    def set_job_img_num(self, img_num: int=0, total_img_num: int=0):
+    def set_job_img_num(self, slot: int=0, img_num: int=0, total_img_num: int=0):
+        job = self.active_jobs.get(slot, self.empty_job)
         if total_img_num:
-            self.current_job.total_img_num = total_img_num
+            job.total_img_num = total_img_num
         if img_num:
-            self.current_job.img_num = img_num
+            job.img_num = img_num
         self.invalidate_transfer_cache()
 
     @staticmethod
@@ -490,13 +545,20 @@ class ServiceManager(QThread):
 
         # ----------- SEND JOB STATUS MESSAGE ------------
         elif msg == 'GET_STATUS':
+            job = self.current_job
             response = _('Momentan im Rendervorgang: '
                          '{0} - {1:03d} / {2:03d} Layer erzeugt.<br/>'
                          '{3:02d} Jobs in der Warteschlange.').format(
-                self.control_app.current_job.title, self.control_app.current_job.img_num,
-                self.control_app.current_job.total_img_num, len(self.job_working_queue)
+                job.title, job.img_num, job.total_img_num, len(self.job_working_queue)
                 )
 
+            # Further jobs running concurrently
+            for slot in sorted(self.active_jobs)[1:]:
+                job = self.active_jobs[slot]
+                response += _('<br/>Parallel im Rendervorgang: {0} - {1:03d} / {2:03d} Layer erzeugt.').format(
+                    job.title, job.img_num, job.total_img_num
+                    )
+
         # ----------- TRANSFER JOB QUEUE ------------
         elif msg == 'GET_JOB_DATA':
             # Send the queue as serialized JSON
@@ -543,9 +605,11 @@ class ServiceManager(QThread):
             job = self.get_job_from_index(int(job_index))
 
             if job:
-                if job is self.current_job:
+                slot = self.job_slot(job)
+
+                if slot is not None:
                     response = _('PSD Erstellung fuer Job {} wird erzwungen.').format(job.title)
-                    self.force_psd_creation_signal.emit()
+                    self.force_psd_creation_signal.emit(slot)
                 else:
                     response = _('Kann PSD Erstellung fuer Job {} nicht erzwingen.').format(job.title)
 
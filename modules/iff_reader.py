@@ -0,0 +1,254 @@
+#! usr/bin/python_3
+"""
+    Native reader for Maya IFF (FOR4 CIMG) image files, no Maya session required
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import struct
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+
+
+class IffError(Exception):
+    pass
+
+
+class IffTile:
+    """ A RGBA tile chunk, coordinates are inclusive and measured from the bottom left image corner """
+    def __init__(self, xmin: int, ymin: int, xmax: int, ymax: int, data: bytes):
+        self.xmin, self.ymin, self.xmax, self.ymax = xmin, ymin, xmax, ymax
+        self.data = data
+
+    @property
+    def width(self) -> int:
+        return self.xmax - self.xmin + 1
+
+    @property
+    def height(self) -> int:
+        return self.ymax - self.ymin + 1
+
+
+def decompress_rle(data: bytes, offset: int, size: int) -> Tuple[bytes, int]:
+    """
+        Decompress size bytes of IFF RLE data starting at offset. Every packet starts with a
+        header byte, the lower 7 bits + 1 are the byte count. If the high bit is set the
+        following byte is repeated count times otherwise count literal bytes follow.
+
+        Returns the decompressed bytes and the offset behind the compressed data.
+    """
+    out = bytearray()
+
+    while len(out) < size:
+        if offset >= len(data):
+            raise IffError('Unexpected end of RLE data.')
+
+        header = data[offset]
+        count = (header & 0x7f) + 1
+        offset += 1
+
+        if header & 0x80:
+            out += data[offset:offset + 1] * count
+            offset += 1
+        else:
+            out += data[offset:offset + count]
+            offset += count
+
+    if len(out) != size:
+        raise IffError('RLE data exceeds tile size.')
+
+    return bytes(out), offset
+
+
+class IffReader:
+    """
+        Reads 8 and 16 bit RGB(A) Maya IFF images consisting of a TBHD header chunk and
+        RGBA tile chunks inside a TBMP form. Z buffer chunks are skipped.
+
+        Compressed tiles store one RLE compressed plane per channel byte in reversed
+        channel order, uncompressed tiles store interleaved pixels in reversed channel order.
+
+        Chunks are read from the file as they are needed, close the reader or use it
+        as context manager.
+    """
+    # TBHD flags
+    flag_rgb = 0x01
+    flag_alpha = 0x02
+
+    def __init__(self, img_file: Path):
+        self.img_file = Path(img_file)
+        self.width, self.height = 0, 0
+        self.channels, self.bytes = 0, 1
+        self.compressed = False
+        self.tile_count = 0
+
+        self.file = open(self.img_file.as_posix(), 'rb')
+        self.file_size = self.img_file.stat().st_size
+
+        self._tbmp_range = None
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def _read(self, offset: int, size: int) -> bytes:
+        self.file.seek(offset)
+        data = self.file.read(size)
+        if len(data) != size:
+            raise IffError(f'Unexpected end of file: {self.img_file.name}')
+        return data
+
+    @staticmethod
+    def _align(size: int) -> int:
+        return size + (-size % 4)
+
+    def _chunk(self, offset: int) -> Tuple[bytes, int, int]:
+        """ Chunk tag, data size and data offset of the chunk at offset """
+        tag, size = struct.unpack('>4sI', self._read(offset, 8))
+        return tag, size, offset + 8
+
+    def _read_header(self):
+        tag, size, offset = self._chunk(0)
+        if tag != b'FOR4' or self._read(offset, 4) != b'CIMG':
+            raise IffError(f'Not a Maya IFF image file: {self.img_file.name}')
+
+        end = min(offset + size, self.file_size)
+        offset += 4
+
+        while offset < end:
+            tag, size, data_offset = self._chunk(offset)
+
+            if tag == b'TBHD':
+                width, height, _, _, flags, bytes_flag, tiles, compression = struct.unpack(
+                    '>IIHHIHHI', self._read(data_offset, 24))
+
+                self.width, self.height = width, height
+                self.channels = (3 if flags & self.flag_rgb else 0) + (1 if flags & self.flag_alpha else 0)
+                self.bytes = 2 if bytes_flag else 1
+                self.tile_count = tiles
+                self.compressed = compression == 1
+            elif tag == b'FOR4' and self._read(data_offset, 4) == b'TBMP':
+                self._tbmp_range = data_offset + 4, min(data_offset + size, self.file_size)
+
+            offset = data_offset + self._align(size)
+
+        if not self.width or not self.height or not self.channels:
+            raise IffError(f'IFF image without RGB(A) header: {self.img_file.name}')
+        if self._tbmp_range is None:
+            raise IffError(f'IFF image without image data: {self.img_file.name}')
+
+    @property
+    def pixel_bytes(self) -> int:
+        return self.channels * self.bytes
+
+    @property
+    def has_alpha(self) -> bool:
+        return self.channels in (1, 4)
+
+    def iter_tiles(self) -> Iterator[IffTile]:
+        offset, end = self._tbmp_range
+
+        while offset < end:
+            tag, size, data_offset = self._chunk(offset)
+
+            if tag == b'RGBA':
+                data = self._read(data_offset, size)
+                xmin, ymin, xmax, ymax = struct.unpack_from('>HHHH', data)
+                yield IffTile(xmin, ymin, xmax, ymax, data[8:])
+
+            offset = data_offset + self._align(size)
+
+    def _tile_is_compressed(self, tile: IffTile) -> bool:
+        # Tiles that would not get smaller are stored uncompressed
+        return self.compressed and len(tile.data) < tile.width * tile.height * self.pixel_bytes
+
+    def iter_tile_planes(self, tile: IffTile) -> Iterator[Tuple[int, np.ndarray]]:
+        """ Yield channel byte index and it's (tile height, tile width) uint8 plane in file order,
+            beginning with the last channel byte eg. the alpha channel of 8 bit RGBA images.
+        """
+        size = tile.width * tile.height
+
+        if not self._tile_is_compressed(tile):
+            pixels = np.frombuffer(tile.data, dtype=np.uint8, count=size * self.pixel_bytes)
+            pixels = pixels.reshape(tile.height, tile.width, self.pixel_bytes)
+            for c in reversed(range(self.pixel_bytes)):
+                yield c, pixels[:, :, self.pixel_bytes - 1 - c]
+            return
+
+        offset = 0
+        for c in reversed(range(self.pixel_bytes)):
+            plane, offset = decompress_rle(tile.data, offset, size)
+            yield c, np.frombuffer(plane, dtype=np.uint8).reshape(tile.height, tile.width)
+
+    def alpha_is_empty(self) -> bool:
+        """
+            True if the alpha channel of every tile is zero, returns on the first tile with alpha.
+            Images without alpha or with 16 bit channels are only empty if all channels are zero.
+        """
+        alpha_planes = set(range(self.pixel_bytes))
+        if self.has_alpha and self.bytes == 1:
+            alpha_planes = {self.pixel_bytes - 1}
+
+        for tile in self.iter_tiles():
+            for c, plane in self.iter_tile_planes(tile):
+                if c in alpha_planes and plane.any():
+                    return False
+                if c == min(alpha_planes):
+                    # Remaining planes do not contain alpha
+                    break
+
+        return True
+
+    def read(self) -> np.ndarray:
+        """ Read the 8 bit image as (height, width, channels) uint8 array, first row is the top row """
+        if self.bytes != 1:
+            raise IffError(f'Reading 16 bit IFF images is not supported: {self.img_file.name}')
+
+        pixels = np.zeros((self.height, self.width, self.channels), dtype=np.uint8)
+
+        for tile in self.iter_tiles():
+            if tile.xmax >= self.width or tile.ymax >= self.height:
+                raise IffError(f'IFF tile outside of image bounds: {self.img_file.name}')
+
+            for c, plane in self.iter_tile_planes(tile):
+                pixels[tile.ymin:tile.ymax + 1, tile.xmin:tile.xmax + 1, c] = plane
+
+        # IFF rows are stored bottom to top
+        return pixels[::-1]
+
+
+def read_iff(img_file: Path) -> np.ndarray:
+    with IffReader(img_file) as reader:
+        return reader.read()
+
+
+def detect_empty_iff(img_file: Path) -> bool:
+    """ True if the Maya IFF image has no alpha coverage """
+    with IffReader(img_file) as reader:
+        return reader.alpha_is_empty()
@@ -0,0 +1,141 @@
+#! usr/bin/python_3
+"""
+    Progressive alpha over compositing of PSD layers, merged composite and preview thumbnails
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from modules.setup_log import setup_logging
+
+LOGGER = setup_logging(__name__)
+
+
+def alpha_bbox_crop(rgba: np.ndarray) -> Union[Tuple[int, int, np.ndarray], None]:
+    """ Crop an RGBA image to the bounding box of it's non zero alpha pixels.
+        Returns left, top and the cropped pixels or None if the image is fully transparent.
+    """
+    alpha = rgba[:, :, 3]
+    rows, cols = np.nonzero(alpha.any(axis=1))[0], np.nonzero(alpha.any(axis=0))[0]
+
+    if not rows.size:
+        return None
+
+    y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    return int(x0), int(y0), np.ascontiguousarray(rgba[y0:y1, x0:x1])
+
+
+class LayerCompositor:
+    """
+        Accumulates straight alpha 8 bit RGBA layers bottom to top with a vectorized alpha over.
+
+        Only the bounding box of every layer's visible pixels is composited, so the merged
+        composite and it's downsampled mip levels are available without reading the layer
+        images a second time.
+    """
+    # Mip levels are created down to this size
+    min_mip_size = 16
+
+    def __init__(self, width: int, height: int):
+        # Premultiplied RGBA accumulation buffer
+        self.pixels = np.zeros((height, width, 4), dtype=np.float32)
+        self.layer_count = 0
+
+    def add(self, rgba: np.ndarray, left: int=0, top: int=0):
+        """ Composite a straight alpha 8 bit RGBA layer at offset left, top over the current result """
+        height, width = self.pixels.shape[:2]
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(left + rgba.shape[1], width), min(top + rgba.shape[0], height)
+        self.layer_count += 1
+
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        src = rgba[y0 - top:y1 - top, x0 - left:x1 - left].astype(np.float32)
+        src *= 1.0 / 255.0
+        src_alpha = src[:, :, 3:4]
+        src[:, :, :3] *= src_alpha
+
+        # Premultiplied alpha over: result = src + dst * (1 - src_alpha)
+        # for the alpha channel this equals 1 - (1 - src_alpha) * (1 - dst_alpha)
+        dst = self.pixels[y0:y1, x0:x1]
+        dst *= 1.0 - src_alpha
+        dst += src
+
+    @staticmethod
+    def _to_uint8(premultiplied: np.ndarray) -> np.ndarray:
+        """ Premultiplied float RGBA to straight alpha 8 bit RGBA """
+        rgba = premultiplied.copy()
+        alpha = rgba[:, :, 3:4]
+        np.divide(rgba[:, :, :3], alpha, out=rgba[:, :, :3], where=alpha > 0.0)
+        np.clip(rgba, 0.0, 1.0, out=rgba)
+        return (rgba * 255.0 + 0.5).astype(np.uint8)
+
+    def composite(self) -> np.ndarray:
+        """ The merged result of all added layers as straight alpha 8 bit RGBA """
+        return self._to_uint8(self.pixels)
+
+    def matted_composite(self, matte: float=1.0) -> np.ndarray:
+        """ The merged result with color channels matted against the matte color, as
+            Photoshop stores the merged image of documents with transparency.
+        """
+        rgba = self.pixels.copy()
+        rgba[:, :, :3] += matte * (1.0 - rgba[:, :, 3:4])
+        np.clip(rgba, 0.0, 1.0, out=rgba)
+        return (rgba * 255.0 + 0.5).astype(np.uint8)
+
+    def mip_levels(self) -> List[np.ndarray]:
+        """ Premultiplied mip levels of the composite, each half the size of the previous level """
+        levels = [self.pixels]
+
+        while max(levels[-1].shape[:2]) > self.min_mip_size:
+            level = levels[-1]
+            h, w = level.shape[0] // 2 * 2, level.shape[1] // 2 * 2
+            if not h or not w:
+                break
+
+            # 2x2 box filter of the premultiplied pixels
+            level = level[:h, :w]
+            levels.append((level[0::2, 0::2] + level[1::2, 0::2] + level[0::2, 1::2] + level[1::2, 1::2]) * 0.25)
+
+        return levels
+
+    def thumbnail(self, max_size: int=256) -> np.ndarray:
+        """ Straight alpha 8 bit RGBA thumbnail fitting into max_size """
+        level = self.pixels
+        for level in reversed(self.mip_levels()):
+            if max(level.shape[:2]) >= max_size:
+                break
+
+        img = Image.fromarray(self._to_uint8(level), mode='RGBA')
+        img.thumbnail((max_size, max_size), Image.BILINEAR)
+        return np.asarray(img)
+
+    def save_thumbnail(self, thumbnail_file: Path, max_size: int=256) -> bool:
+        try:
+            Image.fromarray(self.thumbnail(max_size), mode='RGBA').save(Path(thumbnail_file).as_posix())
+        except (OSError, ValueError) as e:
+            LOGGER.error('Could not write thumbnail %s: %s', thumbnail_file, e)
+            return False
+
+        LOGGER.debug('Written composite thumbnail %s', Path(thumbnail_file).name)
+        return True
@@ -0,0 +1,164 @@
+"""
+    Persistent on disk cache of decoded cryptomatte id mattes
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from modules.compact_matte import CompactMatte
+from modules.setup_log import setup_logging
+from modules.setup_paths import get_user_directory
+
+LOGGER = setup_logging(__name__)
+
+
+class MatteCache:
+    """
+        Stores every decoded id matte of a cryptomatte image as compressed npz file.
+
+        Entries are keyed by the image file size, modification time, a hash of sampled file
+        chunks, the cryptomatte manifest and the decoding options. Every id is stored in it's own file
+        so lookups can be incremental: only ids missing from the cache need to be decoded.
+        Least recently used entries are removed once the cache exceeds max_disk_bytes.
+    """
+    cache_dir_name = '_matte_cache'
+    max_disk_bytes = 10 * 1024 ** 3
+    hash_chunk_size = 4 * 1024 ** 2
+
+    def __init__(self, img_file: Path, manifest: dict, alpha_over_compositing: bool=False, cache_dir: Path=None):
+        self.img_file = Path(img_file)
+        self.manifest = manifest
+        self.cache_dir = Path(cache_dir or Path(get_user_directory()) / self.cache_dir_name)
+        self.entry_dir = self.cache_dir / self._create_key(alpha_over_compositing)
+
+    def _create_key(self, alpha_over_compositing: bool) -> str:
+        stat = self.img_file.stat()
+        key = hashlib.sha1()
+        key.update(f'{stat.st_size}:{stat.st_mtime_ns}:{alpha_over_compositing:d}'.encode())
+        key.update(json.dumps(self.manifest, sort_keys=True).encode())
+
+        with open(self.img_file.as_posix(), 'rb') as f:
+            for offset in self._sample_offsets(stat.st_size):
+                f.seek(offset)
+                key.update(f.read(self.hash_chunk_size))
+
+        return key.hexdigest()
+
+    def _sample_offsets(self, file_size: int) -> List[int]:
+        """
+            Offsets of the first, middle and last chunk of the file. Size, modification time
+            and manifest already identify the image, hashing the header including the
+            cryptomatte metadata and a few chunks avoids reading multi GB files on every run.
+        """
+        if file_size <= 3 * self.hash_chunk_size:
+            return list(range(0, file_size, self.hash_chunk_size)) or [0]
+
+        return [0, (file_size - self.hash_chunk_size) // 2, file_size - self.hash_chunk_size]
+
+    def _matte_file(self, layer_name: str) -> Path:
+        return self.entry_dir / f'{self.manifest.get(layer_name, "")}.npz'
+
+    def load(self, layer_names: List[str]) -> Tuple[dict, List[str]]:
+        """
+            Returns cached mattes as {layer_name: CompactMatte} and a list of layer names
+            that are not cached yet. Empty mattes are cached but not returned.
+        """
+        mattes, missing = dict(), list()
+
+        if not self.entry_dir.exists():
+            return mattes, list(layer_names)
+
+        for layer_name in layer_names:
+            matte_file = self._matte_file(layer_name)
+
+            try:
+                with np.load(matte_file.as_posix()) as npz:
+                    shape, bbox, data = tuple(npz['shape']), npz['bbox'], npz['data']
+            except (OSError, KeyError, ValueError):
+                missing.append(layer_name)
+                continue
+
+            if data.size:
+                mattes[layer_name] = CompactMatte(shape, int(bbox[0]), int(bbox[1]), data)
+
+        # Mark entry as recently used
+        try:
+            os.utime(self.entry_dir.as_posix())
+        except OSError as e:
+            LOGGER.debug('Could not mark matte cache entry as used: %s', e)
+
+        LOGGER.debug('Matte cache found %s of %s ids.', len(layer_names) - len(missing), len(layer_names))
+        return mattes, missing
+
+    def store(self, mattes: dict, layer_names: List[str], shape: Tuple[int, int]):
+        """ Store decoded mattes. Layer names without a matte are stored as empty mattes. """
+        try:
+            self.entry_dir.mkdir(parents=True, exist_ok=True)
+
+            for layer_name in layer_names:
+                matte = mattes.get(layer_name) or CompactMatte(shape)
+                data = matte.data if matte.data is not None else np.zeros((0, 0), dtype=CompactMatte.dtype)
+
+                np.savez_compressed(self._matte_file(layer_name).as_posix(),
+                                    shape=np.array(matte.shape), bbox=np.array(matte.bbox), data=data)
+        except OSError as e:
+            LOGGER.error('Could not write to matte cache: %s', e)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """
+            Remove least recently used entries until the cache fits into max_disk_bytes.
+            Other processes may remove entries at the same time, vanished entries are skipped.
+        """
+        entries = list()
+        try:
+            entry_dirs = list(self.cache_dir.iterdir())
+        except OSError as e:
+            LOGGER.error('Could not read matte cache directory: %s', e)
+            return
+
+        for entry_dir in entry_dirs:
+            try:
+                if not entry_dir.is_dir():
+                    continue
+                size = sum(f.stat().st_size for f in entry_dir.iterdir())
+                entries.append((entry_dir.stat().st_mtime, size, entry_dir))
+            except OSError:
+                # Entry or one of it's files removed while scanning
+                continue
+
+        cache_size = sum(size for _, size, _ in entries)
+
+        for _, size, entry_dir in sorted(entries):
+            if cache_size <= self.max_disk_bytes:
+                break
+            if entry_dir == self.entry_dir:
+                continue
+
+            LOGGER.info('Removing least recently used matte cache entry: %s', entry_dir.name)
+            shutil.rmtree(entry_dir.as_posix(), ignore_errors=True)
+            cache_size -= size
@@ -0,0 +1,279 @@
+#! usr/bin/python_3
+"""
+    Pool of warm, pre-initialized mayapy worker processes
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import json
+import os
+import queue
+import subprocess as sp
+import sys
+import threading
+import time
+from itertools import count
+from pathlib import Path
+from typing import Union
+
+from modules.setup_log import setup_logging
+from modules.setup_paths import get_mayapy_path
+
+LOGGER = setup_logging(__name__)
+
+
+class MayapyWorkerError(Exception):
+    pass
+
+
+class MayapyWorker:
+    """ A mayapy process running maya_mod/mayapy_worker.py, requests are sent as JSON lines """
+    worker_module = Path(__file__).parent.parent / 'maya_mod/mayapy_worker.py'
+
+    def __init__(self, version: str=None, stub: bool=False):
+        self.version, self.stub = version, stub
+        self.process = None
+        self.tasks = 0
+        self._request_ids = count(1)
+        self._responses = queue.Queue()
+
+    def start(self):
+        if self.stub:
+            interpreter = sys.executable
+        else:
+            interpreter = get_mayapy_path(self.version)
+            if not os.path.exists(interpreter):
+                raise MayapyWorkerError(f'Could not find mayapy: {interpreter}')
+
+        args = [interpreter, self.worker_module.as_posix()] + (['--stub'] if self.stub else [])
+        self.process = sp.Popen(args, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.PIPE)
+
+        threading.Thread(target=self._read_responses, args=(self.process.stdout, self._responses),
+                         daemon=True).start()
+        threading.Thread(target=self._log_output, args=(self.process.stderr,), daemon=True).start()
+        LOGGER.info('Started mayapy worker process %s', self.process.pid)
+
+    @staticmethod
+    def _read_responses(pipe, responses: queue.Queue):
+        for line in iter(pipe.readline, b''):
+            try:
+                responses.put(json.loads(line.decode(encoding='utf-8')))
+            except ValueError:
+                LOGGER.error('Invalid mayapy worker response: %s', line)
+        # Process ended
+        responses.put(None)
+
+    @staticmethod
+    def _log_output(pipe):
+        """ Redirect worker output to logging """
+        for line in iter(pipe.readline, b''):
+            line = line.decode(encoding='utf-8', errors='replace').rstrip()
+            if line:
+                LOGGER.info('%s', line)
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def request(self, cmd: str, timeout: float=None, **kwargs) -> dict:
+        """ Send a request and wait for it's response, raises MayapyWorkerError on timeout or if the process died """
+        if not self.is_alive():
+            raise MayapyWorkerError('Mayapy worker process is not running.')
+
+        request_id = next(self._request_ids)
+        message = dict(id=request_id, cmd=cmd, **kwargs)
+
+        try:
+            self.process.stdin.write((json.dumps(message) + '\n').encode(encoding='utf-8'))
+            self.process.stdin.flush()
+        except OSError as e:
+            raise MayapyWorkerError(f'Could not send request to mayapy worker: {e}')
+
+        while True:
+            try:
+                response = self._responses.get(timeout=timeout)
+            except queue.Empty:
+                raise MayapyWorkerError(f'Mayapy worker did not respond to {cmd} within {timeout}s.')
+
+            if response is None:
+                raise MayapyWorkerError('Mayapy worker process ended unexpectedly.')
+            # Skip responses of previously timed out requests
+            if response.get('id') == request_id:
+                return response
+
+    def ping(self, timeout: float) -> bool:
+        try:
+            return self.request('ping', timeout).get('ok', False)
+        except MayapyWorkerError as e:
+            LOGGER.error('Mayapy worker health check failed: %s', e)
+        return False
+
+    def run_module(self, module_file: str, args: list, timeout: float=None) -> dict:
+        self.tasks += 1
+        return self.request('run', timeout, module=module_file, args=[str(a) for a in args])
+
+    def stop(self, timeout: float=10.0):
+        if not self.is_alive():
+            return
+
+        try:
+            self.request('exit', timeout)
+            self.process.wait(timeout)
+        except (MayapyWorkerError, sp.TimeoutExpired):
+            self.kill()
+
+    def kill(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+            LOGGER.info('Mayapy worker process %s killed.', self.process.pid)
+        except OSError as e:
+            LOGGER.error('Killing mayapy worker process failed: %s', e)
+
+
+class MayapyPool:
+    """
+        Runs modules in pre-initialized mayapy worker processes instead of starting a
+        Maya standalone per task. At most max_workers processes are started. Workers are
+        health checked before they get a task and recycled after max_tasks_per_worker tasks
+        or if a task timed out. Idle workers are health checked every health_check_interval
+        seconds when a task is run.
+    """
+    max_workers = 2
+    max_tasks_per_worker = 25
+    ping_timeout = 30.0
+    task_timeout = 3600.0
+    health_check_interval = 300.0
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, version: str=None, max_workers: int=None, stub: bool=False):
+        self.version, self.stub = version, stub
+        self.max_workers = max_workers or self.max_workers
+
+        self._idle = list()
+        self._worker_count = 0
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._last_health_check = time.monotonic()
+
+    @classmethod
+    def instance(cls, version: str=None) -> 'MayapyPool':
+        """ Pool shared by all tasks of this process """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(version)
+            return cls._instance
+
+    def _acquire(self) -> MayapyWorker:
+        with self._condition:
+            while True:
+                if self._shutdown:
+                    raise MayapyWorkerError('Mayapy pool is shut down.')
+                if self._idle:
+                    worker = self._idle.pop()
+                    break
+                if self._worker_count < self.max_workers:
+                    self._worker_count += 1
+                    worker = None
+                    break
+                self._condition.wait()
+
+        if worker is not None and worker.ping(self.ping_timeout):
+            return worker
+
+        # Replace unhealthy worker or start a new one
+        if worker is not None:
+            worker.kill()
+        worker = MayapyWorker(self.version, self.stub)
+        try:
+            worker.start()
+        except (MayapyWorkerError, OSError):
+            self._discard()
+            raise
+
+        return worker
+
+    def _release(self, worker: MayapyWorker):
+        if not worker.is_alive() or worker.tasks >= self.max_tasks_per_worker:
+            LOGGER.debug('Recycling mayapy worker after %s tasks.', worker.tasks)
+            worker.stop()
+            self._discard()
+            return
+
+        with self._condition:
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def _discard(self):
+        with self._condition:
+            self._worker_count -= 1
+            self._condition.notify()
+
+    def run_module(self, module_file: Union[str, Path], *args, timeout: float=None) -> dict:
+        """
+            Run module_file with args in a warm mayapy worker and return the worker response
+            eg. {'ok': True, 'exit_code': 0, 'error': ''}. Blocks until a worker is available.
+            Raises MayapyWorkerError if no worker could be started or the worker failed.
+        """
+        self._health_check_if_due()
+        worker = self._acquire()
+
+        try:
+            result = worker.run_module(Path(module_file).as_posix(), args, timeout or self.task_timeout)
+        except MayapyWorkerError:
+            # Timed out or died, do not re-use this worker
+            worker.kill()
+            self._discard()
+            raise
+
+        self._release(worker)
+
+        if not result.get('ok'):
+            LOGGER.error('Mayapy worker task %s failed: %s', Path(module_file).name, result.get('error'))
+        return result
+
+    def _health_check_if_due(self):
+        with self._condition:
+            if time.monotonic() - self._last_health_check < self.health_check_interval:
+                return
+            self._last_health_check = time.monotonic()
+
+        self.health_check()
+
+    def health_check(self):
+        """ Ping idle workers and remove dead or unresponsive ones """
+        with self._condition:
+            idle, self._idle = self._idle, list()
+
+        for worker in idle:
+            if worker.ping(self.ping_timeout):
+                self._release(worker)
+            else:
+                worker.kill()
+                self._discard()
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            idle, self._idle = self._idle, list()
+            self._condition.notify_all()
+
+        for worker in idle:
+            worker.stop()
+            self._discard()
@@ -0,0 +1,700 @@
+#! usr/bin/python_3
+"""
+    Native layered PSD/PSB file writer, replaces the mayapy createLayeredPsdFile step
+
+    Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+        This file is part of Pfad Aeffchen.
+
+        Pfad Aeffchen is free software: you can redistribute it and/or modify
+        it under the terms of the GNU General Public License as published by
+        the Free Software Foundation, either version 3 of the License, or
+        (at your option) any later version.
+
+        Pfad Aeffchen is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with Pfad Aeffchen.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from maya_mod.layer_names import mladenka_renamer
+from modules.layer_composite import LayerCompositor, alpha_bbox_crop
+from modules.setup_log import setup_logging
+from modules.utils import OpenImageUtil
+
+LOGGER = setup_logging(__name__)
+
+
+def packbits_rows(channel: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        PackBits/RLE compress every row of a 2D uint8 array with array operations.
+
+        Returns the compressed bytes of all rows and the compressed byte count per row.
+    """
+    h, w = channel.shape
+    flat = np.ascontiguousarray(channel).ravel()
+    n = flat.size
+
+    if not n:
+        return np.zeros(0, dtype=np.uint8), np.zeros(h, dtype=np.int64)
+
+    # Runs of equal values, runs never cross a row
+    change = np.empty(n, dtype=np.bool_)
+    change[0] = True
+    np.not_equal(flat[1:], flat[:-1], out=change[1:])
+    change[::w] = True
+    run_starts = np.flatnonzero(change)
+    run_lens = np.diff(np.append(run_starts, n))
+
+    # Runs of 3 and more bytes become repeat packets, shorter runs are merged
+    # with their neighbours into literal spans
+    is_repeat = run_lens >= 3
+    literal = ~is_repeat
+    new_span = literal.copy()
+    new_span[1:] &= is_repeat[:-1] | (run_starts[1:] % w == 0)
+    span_id = np.cumsum(new_span) - 1
+
+    span_starts = run_starts[new_span]
+    span_lens = np.bincount(span_id[literal], weights=run_lens[literal], minlength=span_starts.size).astype(np.int64)
+
+    seg_starts = np.concatenate((run_starts[is_repeat], span_starts))
+    seg_lens = np.concatenate((run_lens[is_repeat], span_lens))
+    seg_repeat = np.concatenate((np.ones(is_repeat.sum(), dtype=np.bool_), np.zeros(span_starts.size, dtype=np.bool_)))
+    order = np.argsort(seg_starts, kind='mergesort')
+    seg_starts, seg_lens, seg_repeat = seg_starts[order], seg_lens[order], seg_repeat[order]
+
+    # Split segments into packets of at most 128 bytes
+    chunks = (seg_lens + 127) // 128
+    chunk_num = np.arange(chunks.sum()) - np.repeat(np.cumsum(chunks) - chunks, chunks)
+    pkt_starts = np.repeat(seg_starts, chunks) + 128 * chunk_num
+    pkt_lens = np.minimum(128, np.repeat(seg_lens, chunks) - 128 * chunk_num)
+    pkt_repeat = np.repeat(seg_repeat, chunks) & (pkt_lens >= 2)
+
+    headers = np.where(pkt_repeat, 257 - pkt_lens, pkt_lens - 1).astype(np.uint8)
+    payload_lens = np.where(pkt_repeat, 1, pkt_lens)
+    pkt_sizes = payload_lens + 1
+    pkt_offsets = np.cumsum(pkt_sizes) - pkt_sizes
+
+    # Assemble packet headers and payloads
+    packed = np.empty(int(pkt_sizes.sum()), dtype=np.uint8)
+    packed[pkt_offsets] = headers
+    payload_rel = np.arange(payload_lens.sum()) - np.repeat(np.cumsum(payload_lens) - payload_lens, payload_lens)
+    packed[np.repeat(pkt_offsets + 1, payload_lens) + payload_rel] = flat[np.repeat(pkt_starts, payload_lens)
+                                                                         + payload_rel]
+
+    row_counts = np.bincount(pkt_starts // w, weights=pkt_sizes, minlength=h).astype(np.int64)
+    return packed, row_counts
+
+
+def to_uint8_rgba(pixels: np.ndarray, unpremultiply: bool=True) -> np.ndarray:
+    """ Convert a float or 8 bit RGB(A) image to straight alpha 8 bit RGBA """
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, np.newaxis]
+
+    h, w, c = pixels.shape
+    if pixels.dtype == np.uint8 and c == 4 and not unpremultiply:
+        return pixels
+
+    rgba = np.empty((h, w, 4), dtype=np.float32)
+    scale = 1.0 if pixels.dtype.kind == 'f' else 1.0 / np.iinfo(pixels.dtype).max
+
+    rgba[:, :, :3] = pixels[:, :, :3] * scale if c >= 3 else pixels[:, :, :1] * scale
+    rgba[:, :, 3] = pixels[:, :, 3] * scale if c >= 4 else 1.0
+
+    if unpremultiply and c >= 4:
+        alpha = rgba[:, :, 3:4]
+        np.divide(rgba[:, :, :3], alpha, out=rgba[:, :, :3], where=alpha > 0.0)
+
+    np.clip(rgba, 0.0, 1.0, out=rgba)
+    return (rgba * 255.0 + 0.5).astype(np.uint8)
+
+
+class PsdLayer:
+    """
+        A single PSD layer with 8 bit straight alpha RGBA pixels at offset left, top.
+
+        Layers created with an img_file instead of rgba pixels are only read when
+        their channels get compressed, eg. inside a compression worker process.
+    """
+    # PSD channel ids in channel data order
+    channel_ids = (0, 1, 2, -1)
+    # Store the layer cropped to the bounding box of it's visible pixels
+    crop_to_alpha = True
+
+    def __init__(self, name: str, rgba: np.ndarray=None, left: int=0, top: int=0, img_file: Path=None):
+        self.name = name
+        self.rgba = rgba
+        self.img_file = img_file
+        self.left, self.top = left, top
+        self._size = None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """ Layer height, width """
+        if self.rgba is not None:
+            return self.rgba.shape[:2]
+        if self._size is None:
+            self._size = read_layer_image_size(self.img_file)
+        return self._size
+
+    @property
+    def rect(self) -> Tuple[int, int, int, int]:
+        """ Uncropped layer rectangle as top, left, bottom, right """
+        h, w = self.size
+        return self.top, self.left, self.top + h, self.left + w
+
+    def load(self) -> np.ndarray:
+        """ Layer pixels as 8 bit RGBA, a transparent layer if the image file could not be read """
+        if self.rgba is not None:
+            return self.rgba
+
+        pixels = read_layer_image(self.img_file)
+        if pixels is None or pixels.shape[:2] != tuple(self.size):
+            LOGGER.error('Could not read layer image %s', self.img_file)
+            return np.zeros((*self.size, 4), dtype=np.uint8)
+
+        return to_uint8_rgba(pixels)
+
+    def compress_channels(self, psb: bool=False) -> List[bytes]:
+        """ Return the RLE compressed image data of every channel including it's compression header """
+        return self.compress(psb)[0]
+
+    def compress(self, psb: bool=False, visible_crop: bool=False) -> Tuple[List[bytes], Tuple[int, int, int, int],
+                                                                         Union[tuple, None]]:
+        """
+            Return the compressed channels, the layer rectangle of the compressed pixels and, if
+            requested, the layer pixels cropped to their visible bounding box as document
+            left, top, pixels. The crop is None for empty layers.
+        """
+        rgba = self.load()
+        rect = self.rect
+
+        crop = alpha_bbox_crop(rgba) if visible_crop or self.crop_to_alpha else None
+        if crop is not None:
+            left, top, pixels = crop
+            crop = self.left + left, self.top + top, pixels
+
+        if self.crop_to_alpha:
+            if crop is None:
+                # Empty layers have an empty rectangle and no channel data
+                rgba, rect = rgba[:0, :0], (0, 0, 0, 0)
+            else:
+                left, top, rgba = crop
+                rect = top, left, top + rgba.shape[0], left + rgba.shape[1]
+
+        channels = [compress_channel(rgba[:, :, c], psb) for c in (0, 1, 2, 3)]
+        return channels, rect, crop if visible_crop else None
+
+
+def compress_channel(channel: np.ndarray, psb: bool=False) -> bytes:
+    """ RLE compressed channel image data: compression type, byte counts per row and packed rows """
+    if not channel.size:
+        return struct.pack('>H', 0)
+
+    packed, row_counts = packbits_rows(channel)
+    count_type = '>u4' if psb else '>u2'
+    return struct.pack('>H', 1) + row_counts.astype(count_type).tobytes() + packed.tobytes()
+
+
+def _compress_layer(layer: PsdLayer, psb: bool, visible_crop: bool) -> Tuple[List[bytes], tuple, Union[tuple, None]]:
+    """ Process pool worker compressing the channels of a single layer """
+    return layer.compress(psb, visible_crop)
+
+
+class PsdWriter:
+    """
+        Writes a layered 8 bit RGB PSD file. PSB(large document format) is used
+        if the document exceeds the PSD limits of 30000 pixels per side or if
+        the uncompressed layer data exceeds psb_size_threshold bytes.
+
+        Layer channels are RLE compressed in a process pool and streamed to the file in
+        layer order. Layer records are written with placeholder channel lengths that are
+        patched once the channel data is written, so only the layers currently being
+        compressed need to be held in memory.
+
+        If no composite is provided the merged image is composited from the visible pixels
+        the workers return alongside the compressed channels, the preview thumbnail is
+        created from the same result.
+    """
+    max_psd_size = 30000
+    psb_size_threshold = 2 ** 31
+    # Compressed layers waiting to be written per worker process
+    max_pending_per_worker = 2
+
+    # Composite the merged image from the layers and save a preview thumbnail next to the PSD
+    create_composite = True
+    thumbnail_size = 256
+    thumbnail_suffix = '_preview.png'
+
+    def __init__(self, psd_file: Path, width: int, height: int, psb: bool=None, workers: int=0):
+        """
+        :param workers: number of compression processes, 0 = cpu count, 1 = compress serially
+        """
+        self.psd_file = Path(psd_file)
+        self.width, self.height = width, height
+        self.psb = psb
+        self.workers = workers or os.cpu_count() or 1
+
+    @property
+    def thumbnail_file(self) -> Path:
+        return self.psd_file.with_name(self.psd_file.stem + self.thumbnail_suffix)
+
+    def _use_psb(self, layers: List[PsdLayer]) -> bool:
+        if self.psb is not None:
+            return self.psb
+        if self.width > self.max_psd_size or self.height > self.max_psd_size:
+            return True
+        return sum(l.size[0] * l.size[1] * 4 for l in layers) > self.psb_size_threshold
+
+    def _length(self, value: int, psb: bool) -> bytes:
+        """ Section and channel data lengths are 8 bytes long in PSB files """
+        return struct.pack('>Q' if psb else '>I', value)
+
+    def _header(self, psb: bool) -> bytes:
+        return (b'8BPS' + struct.pack('>H', 2 if psb else 1) + b'\x00' * 6
+                + struct.pack('>HIIHH', 4, self.height, self.width, 8, 3))
+
+    @staticmethod
+    def _layer_name_data(name: str) -> bytes:
+        """ Pascal string layer name padded to 4 bytes followed by the unicode layer name block """
+        name_bytes = name.encode('latin-1', errors='replace')[:255]
+        pascal = struct.pack('>B', len(name_bytes)) + name_bytes
+        pascal += b'\x00' * (-len(pascal) % 4)
+
+        unicode_name = struct.pack('>I', len(name)) + name.encode('utf-16-be')
+        unicode_name += b'\x00' * (-len(unicode_name) % 4)
+        luni = b'8BIMluni' + struct.pack('>I', len(unicode_name)) + unicode_name
+
+        return pascal + luni
+
+    def _layer_record(self, layer: PsdLayer, channel_lengths: List[int], psb: bool, rect: tuple=None) -> bytes:
+        """ Layer record of the layer or of it's cropped rect """
+        record = struct.pack('>iiii', *(rect or layer.rect))
+        record += struct.pack('>H', len(layer.channel_ids))
+
+        for channel_id, channel_length in zip(layer.channel_ids, channel_lengths):
+            record += struct.pack('>h', channel_id) + self._length(channel_length, psb)
+
+        # Blend mode normal, opacity 255, clipping base, visible
+        record += b'8BIMnorm' + struct.pack('>BBBB', 255, 0, 0, 0)
+
+        # Empty layer mask and blending ranges data
+        extra_data = struct.pack('>II', 0, 0) + self._layer_name_data(layer.name)
+        record += struct.pack('>I', len(extra_data)) + extra_data
+
+        return record
+
+    def _merged_image_data(self, composite: np.ndarray, psb: bool) -> bytes:
+        """ RLE compressed merged composite, all row byte counts of all channels precede the data.
+            Color channels of the composite are expected to be matted with white.
+        """
+        row_counts, channel_data = list(), list()
+        count_type = '>u4' if psb else '>u2'
+
+        for c in range(4):
+            packed, counts = packbits_rows(composite[:, :, c])
+            row_counts.append(counts.astype(count_type).tobytes())
+            channel_data.append(packed.tobytes())
+
+        return struct.pack('>H', 1) + b''.join(row_counts) + b''.join(channel_data)
+
+    def _iter_compressed_layers(self, layers: List[PsdLayer], psb: bool, visible_crop: bool=False):
+        """ Yield the compressed channels, layer rect and visible crop of every layer in the order of layers """
+        if self.workers < 2 or len(layers) < 2:
+            for layer in layers:
+                yield layer.compress(psb, visible_crop)
+            return
+
+        workers = min(self.workers, len(layers))
+        max_pending = workers * self.max_pending_per_worker
+        LOGGER.debug('Compressing %s layers with %s processes.', len(layers), workers)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+
+            for layer in layers:
+                pending.append(pool.submit(_compress_layer, layer, psb, visible_crop))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def write(self, layers: List[PsdLayer], composite: np.ndarray=None) -> bool:
+        """
+            Write the PSD file. The first layer in the list will be the top most layer.
+            If no composite is provided the merged composite is created from the layers or left
+            transparent if create_composite is disabled.
+        """
+        psb = self._use_psb(layers)
+        length_size = 8 if psb else 4
+
+        compositor = None
+        if composite is None and self.create_composite:
+            compositor = LayerCompositor(self.width, self.height)
+
+        # PSD layer records are ordered bottom to top
+        layers = list(reversed(layers))
+
+        try:
+            with open(self.psd_file.as_posix(), 'w+b') as f:
+                f.write(self._header(psb))
+                # Empty color mode data and image resources sections
+                f.write(struct.pack('>II', 0, 0))
+
+                # Layer and mask section and layer info lengths are patched at the end
+                section_pos = f.tell()
+                f.write(self._length(0, psb) * 2)
+                # Negative layer count: the merged result contains transparency data
+                f.write(struct.pack('>h', -len(layers)))
+
+                record_positions = list()
+                for layer in layers:
+                    record_positions.append(f.tell())
+                    f.write(self._layer_record(layer, [0] * len(layer.channel_ids), psb))
+
+                # Channel lengths and cropped rects are patched into the records
+                channel_lengths, layer_rects = list(), list()
+                for compressed, rect, crop in self._iter_compressed_layers(layers, psb, compositor is not None):
+                    channel_lengths.append([len(c) for c in compressed])
+                    layer_rects.append(rect)
+                    for channel_data in compressed:
+                        f.write(channel_data)
+
+                    if crop is not None:
+                        left, top, pixels = crop
+                        compositor.add(pixels, left, top)
+
+                layer_info_length = f.tell() - section_pos - 2 * length_size
+                f.write(b'\x00' * (-layer_info_length % 4))
+                layer_info_length += -layer_info_length % 4
+                # Empty global layer mask info
+                f.write(struct.pack('>I', 0))
+                merged_pos = f.tell()
+
+                for record_pos, layer, lengths, rect in zip(record_positions, layers, channel_lengths, layer_rects):
+                    f.seek(record_pos)
+                    f.write(self._layer_record(layer, lengths, psb, rect))
+
+                f.seek(section_pos)
+                f.write(self._length(merged_pos - section_pos - length_size, psb))
+                f.write(self._length(layer_info_length, psb))
+
+                if compositor is not None:
+                    composite = compositor.matted_composite()
+                elif composite is None:
+                    composite = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+
+                f.seek(merged_pos)
+                f.write(self._merged_image_data(composite, psb))
+        except OSError as e:
+            LOGGER.error('Could not write PSD file %s: %s', self.psd_file.name, e)
+            return False
+
+        LOGGER.info('Written %s file with %s layers: %s', 'PSB' if psb else 'PSD', len(layers), self.psd_file.name)
+
+        if compositor is not None and self.thumbnail_size:
+            compositor.save_thumbnail(self.thumbnail_file, self.thumbnail_size)
+
+        return True
+
+
+class IncrementalPsdWriter(PsdWriter):
+    """
+        PsdWriter that compresses layers while the render job is still running.
+
+        Layer image files added with add_layer_file are RLE compressed in the background
+        and appended to a staging file next to the PSD file. When the PSD is written only
+        layers that were not staged, or whose image file changed since, need to be
+        compressed. Everything else is copied from the staging file.
+    """
+    staging_file_name = '_psd_staging.bin'
+
+    def __init__(self, psd_file: Path, width: int, height: int, psb: bool=None, workers: int=0):
+        super(IncrementalPsdWriter, self).__init__(psd_file, width, height, psb, workers)
+        self.staging_file = self.psd_file.parent / self.staging_file_name
+        self._staging = None
+        self._pool = None
+
+        # {img_file: (file stat key, layer size and offset, staging offset, channel block lengths,
+        #             layer rect, visible crop)}
+        self._staged = dict()
+        # {img_file: (file stat key, layer size and offset, future)}
+        self._pending = dict()
+
+    @staticmethod
+    def _stat_key(img_file: Path) -> Union[Tuple[int, int], None]:
+        try:
+            stat = img_file.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def add_layer_file(self, img_file: Path, left: int=0, top: int=0):
+        """ Compress the layer image file in the background and stage it's channel data """
+        img_file = Path(img_file).absolute()
+        stat_key = self._stat_key(img_file)
+        if stat_key is None:
+            return
+
+        layer = PsdLayer(img_file.stem, left=left, top=top, img_file=img_file)
+        if not all(layer.size):
+            LOGGER.error('Could not read layer image %s', img_file.name)
+            return
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        # Stage in PSB format, row byte counts are converted on write if a PSD is created
+        self._pending[img_file] = stat_key, layer.rect, self._pool.submit(_compress_layer, layer, True, True)
+        self._stage_finished()
+
+    def _stage_finished(self, wait: bool=False):
+        """ Append the channel data of finished compression tasks to the staging file """
+        for img_file, (stat_key, layer_rect, future) in list(self._pending.items()):
+            if not wait and not future.done():
+                continue
+            del self._pending[img_file]
+
+            try:
+                compressed, rect, crop = future.result()
+                if self._staging is None:
+                    self._staging = open(self.staging_file.as_posix(), 'w+b')
+
+                self._staging.seek(0, os.SEEK_END)
+                offset = self._staging.tell()
+                for channel_data in compressed:
+                    self._staging.write(channel_data)
+
+                # Visible pixels are staged behind the channel data for the merged composite
+                if crop is not None:
+                    left, top, pixels = crop
+                    self._staging.write(pixels.tobytes())
+                    crop = left, top, pixels.shape
+            except Exception as e:
+                LOGGER.error('Could not stage PSD layer %s: %s', img_file.name, e)
+                continue
+
+            self._staged[img_file] = stat_key, layer_rect, offset, [len(c) for c in compressed], rect, crop
+
+    @staticmethod
+    def _psb_channel_to_psd(channel_data: bytes, height: int) -> bytes:
+        """ Convert the 4 byte row byte counts of a PSB channel to 2 byte PSD row byte counts """
+        if struct.unpack('>H', channel_data[:2])[0] != 1:
+            return channel_data
+
+        row_counts = np.frombuffer(channel_data, dtype='>u4', count=height, offset=2)
+        return channel_data[:2] + row_counts.astype('>u2').tobytes() + channel_data[2 + 4 * height:]
+
+    def _is_staged(self, layer: PsdLayer) -> bool:
+        """ Layer is staged and it's image file did not change since """
+        entry = self._staged.get(Path(layer.img_file).absolute()) if layer.img_file else None
+        if entry is None:
+            return False
+
+        stat_key, layer_rect = entry[:2]
+        if stat_key != self._stat_key(layer.img_file) or layer_rect != layer.rect:
+            LOGGER.debug('Staged PSD layer changed on disk: %s', layer.img_file.name)
+            return False
+
+        return True
+
+    def _read_staged(self, layer: PsdLayer, psb: bool, visible_crop: bool) -> Tuple[List[bytes], tuple,
+                                                                                   Union[tuple, None]]:
+        _, _, offset, lengths, rect, crop = self._staged[Path(layer.img_file).absolute()]
+
+        self._staging.seek(offset)
+        compressed = [self._staging.read(length) for length in lengths]
+
+        if not psb:
+            compressed = [self._psb_channel_to_psd(c, rect[2] - rect[0]) for c in compressed]
+
+        if crop is not None and visible_crop:
+            left, top, shape = crop
+            pixels = np.frombuffer(self._staging.read(int(np.prod(shape))), dtype=np.uint8).reshape(shape)
+            crop = left, top, pixels
+        else:
+            crop = None
+
+        return compressed, rect, crop
+
+    def _iter_compressed_layers(self, layers: List[PsdLayer], psb: bool, visible_crop: bool=False):
+        """ Yield staged layer channels, layers that are not staged are compressed now """
+        self._stage_finished(wait=True)
+        staged = [self._is_staged(layer) for layer in layers]
+
+        missing = [layer for layer, is_staged in zip(layers, staged) if not is_staged]
+        LOGGER.debug('Writing %s staged and %s not staged PSD layers.', len(layers) - len(missing), len(missing))
+        compressed_missing = super(IncrementalPsdWriter, self)._iter_compressed_layers(missing, psb, visible_crop)
+
+        for layer, is_staged in zip(layers, staged):
+            yield self._read_staged(layer, psb, visible_crop) if is_staged else next(compressed_missing)
+
+    def close(self):
+        """ Stop background compression and remove the staging file """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._staging is not None:
+            self._staging.close()
+            self._staging = None
+
+        self._staged, self._pending = dict(), dict()
+
+        try:
+            if self.staging_file.exists():
+                os.remove(self.staging_file.as_posix())
+        except OSError as e:
+            LOGGER.error('Could not remove PSD staging file: %s', e)
+
+
+def find_psd_preview(img_dir: Path) -> Union[Path, None]:
+    """ The most recent PSD preview thumbnail written to img_dir or None """
+    try:
+        previews = [(f.stat().st_mtime, f) for f in Path(img_dir).glob(f'*{PsdWriter.thumbnail_suffix}')]
+    except OSError as e:
+        LOGGER.debug('Could not search PSD preview: %s', e)
+        return None
+
+    if previews:
+        return max(previews)[1]
+
+
+def iter_layer_images(img_path: Path, img_ext: str):
+    """ Image files in img_path with extension img_ext sorted like the mayapy PSD creation """
+    img_files = [(mladenka_renamer(f.stem), f) for f in Path(img_path).glob(f'*.{img_ext}')]
+    return sorted(img_files, key=lambda i: (i[0], i[1].name), reverse=True)
+
+
+def _layer_buffer_file(img_file: Path) -> Path:
+    return img_file.parent / OpenImageUtil.layer_buffer_dir_name / f'{img_file.stem}.npy'
+
+
+def read_layer_image(img_file: Path) -> Union[np.ndarray, None]:
+    """ Read a layer from it's memory mapped layer buffer if available otherwise from the image file """
+    buffer_file = _layer_buffer_file(img_file)
+    if buffer_file.exists():
+        return OpenImageUtil.open_layer_buffer(buffer_file)
+
+    return OpenImageUtil.read_image(img_file)
+
+
+def read_layer_image_size(img_file: Path) -> Tuple[int, int]:
+    """ Layer height, width read from the layer buffer or image header without reading any pixels """
+    buffer_file = _layer_buffer_file(img_file)
+    if buffer_file.exists():
+        return OpenImageUtil.open_layer_buffer(buffer_file).shape[:2]
+
+    res_x, res_y = OpenImageUtil.get_image_resolution(img_file)
+    return res_y, res_x
+
+
+def expand_cropped_layers(img_path: Path, img_ext: str, res_x: int, res_y: int) -> int:
+    """
+        Write layer images stored cropped back as full frame images at their stored offsets and
+        remove the layer offsets file. The mayapy PSD creation places every layer image at the
+        document origin and does not read the offsets.
+        Returns the number of expanded layer images.
+    """
+    img_path = Path(img_path)
+    layer_offsets = OpenImageUtil.read_layer_offsets(img_path)
+    if not layer_offsets:
+        return 0
+    if not res_x or not res_y:
+        LOGGER.error('Can not expand cropped layer images without document resolution.')
+        return 0
+
+    expanded = 0
+    for _, img_file in iter_layer_images(img_path, img_ext):
+        if img_file.stem not in layer_offsets:
+            continue
+
+        pixels = OpenImageUtil.read_image(img_file)
+        if pixels is None:
+            LOGGER.error('Could not read cropped layer image %s', img_file.name)
+            continue
+
+        left, top = layer_offsets[img_file.stem]
+        h, w = min(pixels.shape[0], res_y - top), min(pixels.shape[1], res_x - left)
+        frame = np.zeros((res_y, res_x, pixels.shape[2]), dtype=pixels.dtype)
+        frame[top:top + h, left:left + w] = pixels[:h, :w]
+        OpenImageUtil.write_image(img_file, frame)
+        expanded += 1
+
+        # The cropped layer buffer no longer matches the image file
+        buffer_file = _layer_buffer_file(img_file)
+        try:
+            if buffer_file.exists():
+                os.remove(buffer_file.as_posix())
+        except OSError as e:
+            LOGGER.error('Could not remove layer buffer %s: %s', buffer_file.name, e)
+
+    try:
+        os.remove((img_path / OpenImageUtil.layer_offsets_file_name).as_posix())
+    except OSError as e:
+        LOGGER.error('Could not remove layer offsets: %s', e)
+
+    LOGGER.debug('Expanded %s cropped layer images to %sx%s', expanded, res_x, res_y)
+    return expanded
+
+
+def create_layered_psd(psd_file: Path, img_path: Path, img_ext: str, res_x: int, res_y: int,
+                       rem_single_imgs: bool=False, writer: PsdWriter=None) -> bool:
+    """
+        Create a layered psd file from image files in img_path with extension img_ext.
+        Same behaviour as MayaImgUtils.create_layered_psd without the need of a Maya session.
+        An IncrementalPsdWriter with already staged layers can be provided as writer,
+        the document is written with res_x, res_y regardless of the size it was created with.
+        Returns True on success
+    """
+    img_path = Path(img_path)
+    if not img_path.exists():
+        return False
+
+    layers = list()
+    img_files = iter_layer_images(img_path, img_ext)
+    # Offsets of layer images stored cropped
+    layer_offsets = OpenImageUtil.read_layer_offsets(img_path)
+
+    for layer_name, img_file in img_files:
+        left, top = layer_offsets.get(img_file.stem, (0, 0))
+        layer = PsdLayer(layer_name, left=left, top=top, img_file=img_file)
+        if not all(layer.size):
+            LOGGER.error('Could not read layer image %s', img_file.name)
+            continue
+
+        layers.append(layer)
+
+    if not layers:
+        return False
+
+    if writer is None:
+        writer = PsdWriter(psd_file, res_x, res_y)
+    elif (writer.width, writer.height) != (res_x, res_y):
+        # Staged writers are created before the job resolution is known, staged layers
+        # do not depend on the document size
+        LOGGER.debug('Resizing PSD writer from %sx%s to %sx%s', writer.width, writer.height, res_x, res_y)
+        writer.width, writer.height = res_x, res_y
+    writer.psd_file = Path(psd_file)
+
+    result = writer.write(layers)
+
+    if result and rem_single_imgs:
+        for _, img_file in img_files:
+            try:
+                os.remove(img_file.as_posix())
+            except Exception as e:
+                LOGGER.error(e)
+
+    return result
@@ -28,8 +28,12 @@ try:
     # Running from Python 3.x
     import winreg
 except ImportError:
-    # Running from Python 2.x
-    import _winreg as winreg
+    try:
+        # Running from Python 2.x
+        import _winreg as winreg
+    except ImportError:
+        # Not running on Windows, there is no registry to look up Maya
+        winreg = None
 
 
 def get_user_directory():
@@ -64,16 +68,25 @@ def create_unique_render_path(scene_file, dir_path):
 
     render_sub_dir = '{0}_{1:.4f}'.format(name_prefix, time()).replace('.', '_')
     render_sub_dir = os.path.join(OUTPUT_DIR_NAME, render_sub_dir)
-    dir_path = os.path.join(dir_path, render_sub_dir)
+    base_path = os.path.join(dir_path, render_sub_dir)
+    dir_path, count = base_path, 0
 
-    if not os.path.exists(dir_path):
-        os.makedirs(dir_path)
+    # Jobs rendering concurrently must never share a render path
+    while os.path.exists(dir_path):
+        count += 1
+        dir_path = '{0}_{1:02d}'.format(base_path, count)
+
+    os.makedirs(dir_path)
 
     return dir_path
 
 
 def get_maya_version(version=DEFAULT_VERSION, __return_path=False):
     key = None
+
+    if winreg is None:
+        return None
+
     try_versions = copy.copy(COMPATIBLE_VERSIONS)
 
     if version:
@@ -67,7 +67,7 @@ class MessageTcpHandler(socketserver.BaseRequestHandler):
     """
     BEWARE! This class will be instanced on every server request
     therefore you can not have multiple signal destinations.
-    Use this handler class for exactly one server!
+    run_message_server and run_watcher_server create a subclass for every server.
     """
     signals = None
     signal_destination = (None, None, None)
@@ -197,9 +197,9 @@ def run_message_server(signal_destination, address=SocketAddress.main):
         Socket server that receives messages from external running processes
         and emits them to the GUI status browser
     """
-    MessageTcpHandler.signal_destination = signal_destination
+    handler = type('MessageTcpHandler', (MessageTcpHandler, ), {'signal_destination': signal_destination})
     print('Creating Main App socket server.')
-    server = create_server_thread(address, MessageTcpHandler)
+    server = create_server_thread(address, handler)
     return server
 
 
@@ -208,9 +208,9 @@ def run_watcher_server(signal_destination, address=SocketAddress.watcher):
         Socket server that receives messages from external running processes
         and emits them to the Watcher GUI status browser
     """
-    WatcherTcpHandler.signal_destination = signal_destination
+    handler = type('WatcherTcpHandler', (WatcherTcpHandler, ), {'signal_destination': signal_destination})
     print('Creating Image Watcher socket server.')
-    server = create_server_thread(address, WatcherTcpHandler)
+    server = create_server_thread(address, handler)
     return server
 
 
@@ -1,4 +1,5 @@
 #! usr/bin/python_3
+import json
 import os
 import re
 import shutil
@@ -23,6 +24,11 @@ def create_file_safe_name(filename: str) -> str:
 
 
 class OpenImageUtil:
+    # Directory inside the render output directory holding memory mapped layer buffers
+    layer_buffer_dir_name = '_layer_buffers'
+    # File inside the render output directory holding the offsets of cropped layer images
+    layer_offsets_file_name = '_layer_offsets.json'
+
     @classmethod
     def get_image_resolution(cls, img_file: Path) -> (int, int):
         img_input = cls._image_input(img_file)
@@ -34,9 +40,82 @@ class OpenImageUtil:
             return res_x, res_y
         return 0, 0
 
+    @staticmethod
+    def create_layer_buffer(shape: tuple, dtype=np.float32, buffer_file: Path=None) -> np.ndarray:
+        """ Allocate a layer array. If a buffer_file is provided the array is backed by a
+            memory mapped .npy file that other stages can open zero-copy with open_layer_buffer.
+        """
+        if buffer_file is None:
+            return np.empty(shape, dtype=dtype)
+
+        buffer_file.parent.mkdir(parents=True, exist_ok=True)
+        return np.lib.format.open_memmap(buffer_file.as_posix(), mode='w+', dtype=dtype, shape=shape)
+
+    @staticmethod
+    def open_layer_buffer(buffer_file: Path) -> np.ndarray:
+        """ Open a layer buffer created by create_layer_buffer read only and without copying it into memory """
+        return np.load(buffer_file.as_posix(), mmap_mode='r')
+
     @classmethod
-    def premultiply_image(cls, img_pixels: np.array) -> np.array:
-        """ Premultiply a numpy image with itself """
+    def write_layer_offsets(cls, img_dir: Path, layer_offsets: dict):
+        """ Store {image file stem: (left, top)} of layer images stored cropped """
+        try:
+            with open((Path(img_dir) / cls.layer_offsets_file_name).as_posix(), 'w') as f:
+                json.dump(layer_offsets, f)
+        except OSError as e:
+            LOGGER.error('Could not write layer offsets: %s', e)
+
+    @classmethod
+    def read_layer_offsets(cls, img_dir: Path) -> dict:
+        """ Returns {image file stem: (left, top)} of layer images stored cropped """
+        offsets_file = Path(img_dir) / cls.layer_offsets_file_name
+        if not offsets_file.exists():
+            return dict()
+
+        try:
+            with open(offsets_file.as_posix(), 'r') as f:
+                return {k: tuple(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            LOGGER.error('Could not read layer offsets: %s', e)
+
+        return dict()
+
+    @staticmethod
+    def premultiplied_rgba(matte: np.ndarray, rgb_img: np.ndarray=None, out: np.ndarray=None,
+                           rgb_planes: np.ndarray=None) -> np.ndarray:
+        """
+            Build a premultiplied RGBA layer from a coverage matte and an optional rgb(a) beauty image
+            in one pass, without intermediate copies. Same result as merge_matte_and_rgb followed by
+            premultiply_image. Pass a preallocated out array to re-use it for every layer, the matte
+            may be a view of the alpha channel of out.
+
+            The beauty may also be provided as planar array(shape: 3, height, width) in rgb_planes.
+        """
+        h, w = matte.shape
+        if out is None:
+            out = np.empty((h, w, 4), dtype=matte.dtype)
+
+        if rgb_planes is not None:
+            for c in range(3):
+                np.multiply(rgb_planes[c], matte, out=out[:, :, c])
+        elif rgb_img is None:
+            np.multiply(matte, matte, out=out[:, :, 0])
+            out[:, :, 1] = out[:, :, 2] = out[:, :, 0]
+        else:
+            np.multiply(rgb_img[:, :, :3], matte[:, :, np.newaxis], out=out[:, :, :3])
+
+        if not np.may_share_memory(matte, out):
+            out[:, :, 3] = matte
+
+        return out
+
+    @classmethod
+    def premultiply_image(cls, img_pixels: np.array, in_place: bool=False) -> np.array:
+        """ Premultiply a numpy image with itself, in_place modifies and returns the provided RGBA array """
+        if in_place:
+            np.multiply(img_pixels[:, :, :3], img_pixels[:, :, 3:4], out=img_pixels[:, :, :3])
+            return img_pixels
+
         a = cls.np_to_imagebuf(img_pixels)
         ImageBufAlgo.premult(a, a)
 
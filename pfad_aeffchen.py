@@ -33,6 +33,7 @@ import logging
 from multiprocessing import Queue
 
 from modules.detect_lang import get_ms_windows_language, get_translation
+from modules.directory_events import directory_events_available
 from modules.main_app import PfadAeffchenApp
 from modules.setup_log import setup_logging, setup_log_file, setup_log_queue_listener
 from modules.setup_paths import get_current_modules_dir
@@ -119,6 +120,9 @@ def main():
     version = read_version(mod_dir)
     LOGGER.debug('Running version: %s', version)
 
+    # Warn early if the image watcher has to fall back to indexing
+    directory_events_available()
+
     app = PfadAeffchenApp(mod_dir, version, LOGGER, logging_queue, log_listener)
     result = app.exec_()
     LOGGER.debug('---------------------------------------')
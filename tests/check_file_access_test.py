@@ -0,0 +1,106 @@
+import os
+import subprocess as sp
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from modules.check_file_access import CheckFileAccess, OpenFilesCache
+
+# Child process keeping the file in argv[1] open until it is killed
+HOLD_FILE = 'import sys, time; f = open(sys.argv[1], "rb"); print("ready", flush=True); time.sleep(60)'
+PROCESS_NAMES = ('python',)
+
+
+class OpenFileProcess:
+    """ Context manager running a child process that has img_file opened """
+    def __init__(self, img_file: Path):
+        self.img_file = img_file
+        self.process = None
+
+    def __enter__(self):
+        self.process = sp.Popen([sys.executable, '-c', HOLD_FILE, self.img_file.as_posix()], stdout=sp.PIPE)
+        assert self.process.stdout.readline().strip() == b'ready'
+        return self.process
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+def create_image(directory: str) -> Path:
+    img_file = Path(directory) / 'a.sgi'
+    img_file.write_bytes(b'image')
+    return img_file
+
+
+def test_lookup_child_process():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_file = create_image(tmp)
+        cache = OpenFilesCache(PROCESS_NAMES)
+
+        with OpenFileProcess(img_file) as process:
+            pid, name = cache.lookup(img_file)
+            assert pid == process.pid
+            assert name.lower().startswith('python')
+
+            access = CheckFileAccess(img_file, open_files=cache)
+            assert access.check()
+            assert access.process_id == process.pid
+
+
+def test_path_normalization():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_file = create_image(tmp)
+        (Path(tmp) / 'sub').mkdir()
+        cache = OpenFilesCache(PROCESS_NAMES)
+
+        with OpenFileProcess(img_file) as process:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                variants = (img_file, img_file.as_posix(), Path(tmp) / 'sub' / '..' / 'a.sgi', Path('a.sgi'),
+                            'sub/../a.sgi')
+                for variant in variants:
+                    assert cache.lookup(variant)[0] == process.pid, variant
+            finally:
+                os.chdir(cwd)
+
+
+def test_max_age():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_file = create_image(tmp)
+        cache = OpenFilesCache(PROCESS_NAMES, max_age=60.0)
+        assert cache.lookup(img_file) is None
+
+        with OpenFileProcess(img_file) as process:
+            # Processes are enumerated at most once every max_age seconds
+            assert cache.lookup(img_file) is None
+            cache.invalidate()
+            assert cache.lookup(img_file)[0] == process.pid
+
+        # Cached result outlives the process until it expires
+        assert cache.lookup(img_file)[0] == process.pid
+        cache.max_age = 0.05
+        time.sleep(0.1)
+        assert cache.lookup(img_file) is None
+
+
+def test_process_names():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_file = create_image(tmp)
+
+        with OpenFileProcess(img_file):
+            # Only renderer processes are examined
+            assert OpenFilesCache(('render', 'mayabatch')).lookup(img_file) is None
+
+        # Files opened by this process are ignored
+        with open(img_file.as_posix(), 'rb'):
+            assert OpenFilesCache(PROCESS_NAMES).lookup(img_file) is None
+
+
+if __name__ == '__main__':
+    for test in (test_lookup_child_process, test_path_normalization, test_max_age, test_process_names):
+        test()
+    print('OpenFilesCache tests passed.')
@@ -0,0 +1,74 @@
+import numpy as np
+
+from modules.compact_matte import CompactMatte
+
+
+def random_matte(height: int=96, width: int=64, seed: int=0) -> np.ndarray:
+    """ Full frame matte with coverage inside a box and a few rows without any coverage """
+    rng = np.random.RandomState(seed)
+    matte = np.zeros((height, width), dtype=np.float32)
+    matte[20:70, 10:50] = rng.rand(50, 40).astype(np.float32)
+    matte[40:45] = 0.0
+    return matte
+
+
+def test_dense_round_trip():
+    matte = random_matte()
+    compact = CompactMatte.from_dense(matte)
+
+    assert compact.bbox == (10, 20, 50, 70)
+    assert compact.row_count() == int(matte.any(axis=-1).sum())
+    assert np.array_equal(compact.to_dense(), matte)
+
+
+def test_empty_matte():
+    compact = CompactMatte.from_dense(np.zeros((8, 8), dtype=np.float32))
+
+    assert compact.is_empty()
+    assert compact.nbytes == 0
+    assert compact.max() == 0.0
+    assert not compact.to_dense().any()
+
+
+def test_from_coordinates_sums_duplicates():
+    shape = (4, 5)
+    flat_idx = np.array([6, 6, 13], dtype=np.int64)
+    compact = CompactMatte.from_coordinates(shape, flat_idx, np.array([0.25, 0.5, 1.0], dtype=np.float32))
+
+    expected = np.zeros(shape, dtype=np.float32)
+    expected[1, 1], expected[2, 3] = 0.75, 1.0
+    assert compact.bbox == (1, 1, 4, 3)
+    assert np.allclose(compact.to_dense(), expected)
+
+
+def test_band_merge():
+    """ Band mattes of the tiled decoder merged per id equal the matte cropped from the full frame """
+    matte, band_height = random_matte(), 16
+    height, width = matte.shape
+    merged = CompactMatte((height, width))
+
+    for start_y in range(0, height, band_height):
+        band_matte = CompactMatte.from_dense(matte[start_y:start_y + band_height])
+        merged += band_matte.translated((height, width), start_y)
+
+    expected = CompactMatte.from_dense(matte)
+    assert merged.bbox == expected.bbox
+    assert np.array_equal(merged.data, expected.data)
+    assert np.array_equal(merged.to_dense(), matte)
+
+
+def test_merge_overlapping():
+    a = CompactMatte((10, 10), 1, 1, np.full((2, 2), 0.25, dtype=np.float32))
+    b = CompactMatte((10, 10), 2, 2, np.full((3, 3), 0.5, dtype=np.float32))
+    a += b
+
+    assert a.bbox == (1, 1, 5, 5)
+    assert np.isclose(a.to_dense()[2, 2], 0.75)
+    assert np.isclose(a.to_dense()[4, 4], 0.5)
+
+
+if __name__ == '__main__':
+    for test in (test_dense_round_trip, test_empty_matte, test_from_coordinates_sums_duplicates,
+                 test_band_merge, test_merge_overlapping):
+        test()
+    print('CompactMatte tests passed.')
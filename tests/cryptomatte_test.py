@@ -1,9 +1,15 @@
+import json
 import logging
+import tempfile
 import time
 from pathlib import Path
 
+import OpenImageIO as oiio
+import numpy as np
+
 from maya_mod.start_mayapy import run_module_in_standalone
-from modules.decryptomatte import DecyrptoMatte
+from modules.app_globals import ImgParams
+from modules.decryptomatte import DecyrptoMatte, IdIndex
 from modules.create_cryptomatte import CreateCryptomattes
 from modules.setup_paths import get_current_modules_dir
 from modules.utils import OpenImageUtil, create_file_safe_name
@@ -12,6 +18,249 @@ logging.basicConfig(level=logging.DEBUG)
 LOGGER = logging.getLogger(__name__)
 
 
+CRYPTO_NAME = 'crypto_material'
+LAYER_NAMES = ['leather', 'chrome', 'glass', 'paint', 'rubber']
+
+
+class SyntheticCryptomatte:
+    """
+        Cryptomatte exr with random but distinct ids per pixel in every rank. The id and coverage
+        planes of every rank are kept to compute the expected mattes.
+    """
+    def __init__(self, img_file: Path, layer_names: list=None, width: int=16, height: int=12, ranks: int=4,
+                 origin: tuple=(0, 0), beauty_channels: bool=False, seed: int=7):
+        self.img_file = img_file
+        self.layer_names = layer_names or LAYER_NAMES
+        self.manifest = {n: DecyrptoMatte.id_to_hex_str(DecyrptoMatte.mm3hash_float(n)) for n in self.layer_names}
+        rng = np.random.default_rng(seed)
+
+        # An id that is not part of the manifest
+        id_values = np.array([DecyrptoMatte.mm3hash_float(n) for n in self.layer_names + ['unknown']],
+                             dtype=np.float32)
+        order = rng.permuted(np.tile(np.arange(id_values.size), (height * width, 1)), axis=1)[:, :ranks]
+        self.ids = id_values[order].T.reshape(ranks, height, width)
+
+        # Coverage sorted descending per pixel, the lowest ranks are partly unused
+        self.coverage = -np.sort(-rng.random((ranks, height, width), dtype=np.float32), axis=0)
+        unused = rng.random((height, width)) < 0.3
+        self.ids[-1][unused], self.coverage[-1][unused] = 0.0, 0.0
+        self.ids[:, 0, :3], self.coverage[:, 0, :3] = 0.0, 0.0
+
+        self.write(width, height, origin, beauty_channels)
+
+    def write(self, width: int, height: int, origin: tuple, beauty_channels: bool):
+        channel_names, planes = list(), list()
+        if beauty_channels:
+            channel_names += ['R', 'G', 'B', 'A']
+            planes += [np.full((height, width), 0.5, dtype=np.float32)] * 4
+
+        for rank in range(0, self.ids.shape[0], 2):
+            prefix = f'{CRYPTO_NAME}{rank // 2:02d}'
+            channel_names += [f'{prefix}.R', f'{prefix}.G', f'{prefix}.B', f'{prefix}.A']
+            planes += [self.ids[rank], self.coverage[rank], self.ids[rank + 1], self.coverage[rank + 1]]
+
+        spec = oiio.ImageSpec(width, height, len(channel_names), 'float')
+        spec.x, spec.y = origin
+        spec.full_x, spec.full_y = origin
+        spec.channelnames = tuple(channel_names)
+        spec.attribute('cryptomatte/f834d0a/name', CRYPTO_NAME)
+        spec.attribute('cryptomatte/f834d0a/manifest', json.dumps(self.manifest))
+
+        output = oiio.ImageOutput.create(self.img_file.as_posix())
+        assert output.open(self.img_file.as_posix(), spec), output.geterror()
+        output.write_image(np.ascontiguousarray(np.stack(planes, axis=-1)))
+        output.close()
+
+    def expected_matte(self, layer_name: str) -> np.ndarray:
+        """ Summed coverage of all ranks holding the id of layer_name """
+        id_val = np.float32(DecyrptoMatte.hex_str_to_id(self.manifest[layer_name]))
+        return np.where(self.ids == id_val, self.coverage, 0.0).sum(axis=0, dtype=np.float32)
+
+
+def test_id_index_resolve():
+    manifest = {n: DecyrptoMatte.id_to_hex_str(DecyrptoMatte.mm3hash_float(n)) for n in LAYER_NAMES}
+    id_values = {n: DecyrptoMatte.hex_str_to_id(h) for n, h in manifest.items()}
+
+    # Manifest order is not sorted by id
+    assert list(manifest.values()) != sorted(manifest.values())
+    index = IdIndex.from_manifest(manifest)
+    assert len(index) == len(LAYER_NAMES)
+    assert (np.diff(index.id_bits.astype(np.int64)) > 0).all()
+
+    names = list(reversed(LAYER_NAMES))
+    slots = index.resolve(np.array([id_values[n] for n in names], dtype=np.float32))
+    assert [index.names[s] for s in slots] == names
+    assert np.allclose(index.ids[slots], [id_values[n] for n in names])
+
+    # Ids missing from the manifest, zero and ids beyond the largest indexed id
+    missing = np.array([DecyrptoMatte.mm3hash_float('unknown'), 0.0, index.ids[-1] * 2.0, np.nan],
+                       dtype=np.float32)
+    assert (index.resolve(missing) == -1).all()
+
+    # Resolves arrays of any shape
+    pixels = np.array([[id_values['glass'], 0.0], [id_values['leather'], id_values['glass']]], dtype=np.float32)
+    slots = index.resolve(pixels)
+    assert slots.shape == (2, 2) and slots[0, 1] == -1
+    assert slots[0, 0] == slots[1, 1] == index.names.index('glass')
+
+    # Only the given layer names, names missing from the manifest are ignored
+    subset = IdIndex.from_manifest(manifest, ['paint', 'chrome', 'not_in_manifest'])
+    assert sorted(subset.names) == ['chrome', 'paint']
+    assert subset.resolve(np.array([id_values['leather']], dtype=np.float32))[0] == -1
+
+    # An empty index resolves nothing
+    assert (IdIndex.from_ids([]).resolve(pixels) == -1).all()
+
+
+def test_id_index_duplicate_ids():
+    """ Layer names sharing a float id resolve to a single slot named after the first name """
+    manifest = {'door_a': '3f8a0c21', 'roof': '1b2e44d0', 'door_b': '3f8a0c21'}
+    index = IdIndex.from_manifest(manifest)
+
+    assert len(index) == 2 and index.names == ['roof', 'door_a']
+    door_id = DecyrptoMatte.hex_str_to_id('3f8a0c21')
+    assert index.resolve(np.array([door_id], dtype=np.float32))[0] == 1
+
+    index = IdIndex.from_ids([door_id, 0.5, door_id])
+    assert len(index) == 2 and index.names == list()
+    assert index.resolve(np.array([0.5, door_id], dtype=np.float32)).tolist() == [0, 1]
+
+
+def decode_all(img_file: Path, alpha_over_compositing: bool) -> dict:
+    """ Mattes of every manifest id as {id_value: (reference, vectorized, banded)} full frame arrays """
+    d = DecyrptoMatte(LOGGER, img_file, alpha_over_compositing, workers=2)
+    d.tile_band_height = 5
+    try:
+        w, h = d.spec.width, d.spec.height
+        img_nested_md = d.sorted_crypto_metadata()
+        target_ids = d.id_index().ids.tolist()
+
+        reference = d._iterate_image(0, 0, w, h, img_nested_md, target_ids)
+        vectorized = d._iterate_image_vectorized(0, 0, w, h, img_nested_md, target_ids)
+        banded = d._iterate_image_tiled(w, h, img_nested_md, target_ids)
+    finally:
+        d.shutdown()
+
+    return {id_val: (reference[id_val], vectorized[id_val].to_dense(), banded[id_val].to_dense())
+            for id_val in target_ids}
+
+
+def test_vectorized_and_banded_match_reference():
+    with tempfile.TemporaryDirectory() as tmp:
+        crypto = SyntheticCryptomatte(Path(tmp) / 'crypto.exr', height=13)
+        summed = dict()
+
+        for alpha_over_compositing in (False, True):
+            mattes = decode_all(crypto.img_file, alpha_over_compositing)
+            assert len(mattes) == len(LAYER_NAMES)
+
+            for id_val, (reference, vectorized, banded) in mattes.items():
+                assert reference.any()
+                assert np.allclose(vectorized, reference, atol=1e-6)
+                assert np.allclose(banded, reference, atol=1e-6)
+
+                if not alpha_over_compositing:
+                    summed[id_val] = reference
+                else:
+                    # The highest ranked id of a pixel covers the coverage of all ids
+                    assert (reference >= summed[id_val] - 1e-6).all()
+                    assert not np.allclose(reference, summed[id_val])
+
+        # Without alpha over compositing the mattes are the summed coverage of every rank
+        for layer_name in LAYER_NAMES:
+            id_val = DecyrptoMatte.hex_str_to_id(crypto.manifest[layer_name])
+            assert np.allclose(summed[id_val], crypto.expected_matte(layer_name), atol=1e-6)
+
+
+def test_read_channels_subset():
+    """ Channel subsets of regions inside an image with an offset data window """
+    with tempfile.TemporaryDirectory() as tmp:
+        crypto = SyntheticCryptomatte(Path(tmp) / 'crypto.exr', origin=(5, 3), beauty_channels=True)
+        d = DecyrptoMatte(LOGGER, crypto.img_file, workers=1)
+        d.scanline_chunk = 5
+        try:
+            assert (d.spec.x, d.spec.y) == (5, 3)
+            assert d._crypto_channel_idxs(d.sorted_crypto_metadata()) == list(range(4, 12))
+            assert d._channel_runs([4, 5, 9, 10]) == [(4, 6), (9, 11)]
+
+            # Beauty RGBA, then id and coverage of rank 0 and 1, rank 2 and 3
+            channels = d._read_channels(2, 4, 9, 7, [4, 5, 9])
+            assert sorted(channels) == [4, 5, 9]
+            assert np.array_equal(channels[4], crypto.ids[0, 4:11, 2:11])
+            assert np.array_equal(channels[5], crypto.coverage[0, 4:11, 2:11])
+            assert np.array_equal(channels[9], crypto.coverage[2, 4:11, 2:11])
+
+            full = d._read_channels(0, 0, d.spec.width, d.spec.height, [6, 7])
+            assert np.array_equal(full[6], crypto.ids[1]) and np.array_equal(full[7], crypto.coverage[1])
+        finally:
+            d.shutdown()
+
+        # Reference loop, vectorized and banded decoding of the offset data window
+        mattes = decode_all(crypto.img_file, False)
+        for layer_name in LAYER_NAMES:
+            expected = crypto.expected_matte(layer_name)
+            for matte in mattes[DecyrptoMatte.hex_str_to_id(crypto.manifest[layer_name])]:
+                assert np.allclose(matte, expected, atol=1e-6)
+
+
+def test_create_cryptomattes_single_pass():
+    """ All ids are decoded in one read of the image, every layer is written cropped to its matte """
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = Path(tmp)
+        (output_dir / ImgParams.cryptomatte_dir_name).mkdir()
+        layer_names = [f'layer_{idx:02d}' for idx in range(40)]
+        crypto = SyntheticCryptomatte(output_dir / ImgParams.cryptomatte_dir_name / 'crypto.exr', layer_names,
+                                      width=32, height=24)
+
+        reads = list()
+        read_channels = DecyrptoMatte._read_channels
+
+        def counted_read_channels(d, *args):
+            reads.append(args)
+            return read_channels(d, *args)
+
+        DecyrptoMatte._read_channels = counted_read_channels
+        try:
+            c = CreateCryptomattes(output_dir, output_dir / 'scene.csb', logger=LOGGER)
+            c.use_matte_cache = False
+            c.writer_threads, c.max_pending_layers = 2, 2
+            c.cryptomatte_out_file_ext = 'exr'
+            img_file_dict, _ = c.create_cryptomattes()
+        finally:
+            DecyrptoMatte._read_channels = read_channels
+
+        assert len(reads) == 1
+        assert img_file_dict and set(img_file_dict) <= set(layer_names)
+        layer_offsets = OpenImageUtil.read_layer_offsets(output_dir)
+
+        for layer_name, img_entry in img_file_dict.items():
+            x0, y0, x1, y1 = img_entry['bbox']
+            assert layer_offsets[layer_name] == (x0, y0)
+
+            # Without beauty every channel is the matte pre-multiplied by itself
+            matte = crypto.expected_matte(layer_name)[y0:y1, x0:x1]
+            rgba = OpenImageUtil.read_image(img_entry['path'])
+            assert rgba.shape == (y1 - y0, x1 - x0, 4)
+            assert np.allclose(rgba[:, :, 3], matte, atol=1e-6)
+            assert np.allclose(rgba[:, :, 0], matte * matte, atol=1e-6)
+
+
+def test_writer_buffer_reuse():
+    """ Cropped layers of any shape are written from views of one full frame buffer per writer thread """
+    with tempfile.TemporaryDirectory() as tmp:
+        c = CreateCryptomattes(Path(tmp), Path(tmp) / 'scene.csb', logger=LOGGER)
+        c.res_x, c.res_y = 8, 6
+
+        buffers = [c._writer_buffer(shape) for shape in ((2, 3), (5, 4), (6, 8), (1, 1))]
+        assert [b.shape for b in buffers] == [(2, 3, 4), (5, 4, 4), (6, 8, 4), (1, 1, 4)]
+        assert all(b.flags.c_contiguous and np.shares_memory(b, buffers[0]) for b in buffers)
+
+        # Memory mapped layers get their own buffer
+        buffer_file = Path(tmp) / 'layer.npy'
+        mapped = c._writer_buffer((2, 3), buffer_file)
+        assert buffer_file.exists() and not np.shares_memory(mapped, buffers[0])
+
+
 def alpha_over(a: float, b: float):
     """
         https://www.w3.org/TR/SVGTiny12/painting.html#CompositingSimpleAlpha
@@ -53,10 +302,10 @@ def main_old():
     layers = d.list_layers()
 
     for layer_name, id_matte in d.get_mattes_by_names(layers).items():
-        LOGGER.debug('Layer %s - %s', layer_name, id_matte.any(axis=-1).sum())
+        LOGGER.debug('Layer %s - %s', layer_name, id_matte.row_count())
 
         # Create premultiplied
-        rgba_matte = d.merge_matte_and_rgb(id_matte, beauty_img)
+        rgba_matte = d.merge_matte_and_rgb(id_matte.to_dense(), beauty_img)
         repre_matte = OpenImageUtil.premultiply_image(rgba_matte)
 
         # Write result
@@ -69,5 +318,25 @@ def main_old():
     LOGGER.debug('Example matte extraction finished.')
 
 
+def benchmark_premultiply(runs: int=5, width: int=3840, height: int=2160):
+    """ Compare merge_matte_and_rgb + OIIO premultiply against the fused NumPy kernel """
+    matte = np.random.rand(height, width).astype(np.float32)
+    beauty_img = np.random.rand(height, width, 4).astype(np.float32)
+    rgba_buffer = np.empty((height, width, 4), dtype=np.float32)
+
+    start_time = time.time()
+    for _ in range(runs):
+        expected = OpenImageUtil.premultiply_image(DecyrptoMatte.merge_matte_and_rgb(matte, beauty_img))
+    oiio_duration = (time.time() - start_time) / runs
+
+    start_time = time.time()
+    for _ in range(runs):
+        result = OpenImageUtil.premultiplied_rgba(matte, beauty_img, out=rgba_buffer)
+    numpy_duration = (time.time() - start_time) / runs
+
+    LOGGER.info(f'Premultiply {width}x{height}: OIIO {oiio_duration:.4f}s - NumPy fused {numpy_duration:.4f}s '
+                f'- results equal: {np.allclose(expected, result)}')
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,131 @@
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from modules.detection_executor import DetectionExecutor
+from tests.iff_reader_test import rgba_image, write_iff
+
+
+def create_png(img_dir: Path, name: str, empty: bool) -> Path:
+    """ Pillow detected image, empty images have no alpha coverage """
+    img_file = img_dir / f'{name}.png'
+    Image.fromarray(np.full((4, 4, 4), 0 if empty else 255, dtype=np.uint8)).save(img_file.as_posix())
+    return img_file
+
+
+def poll_all(executor: DetectionExecutor, timeout: float=30.0) -> list:
+    """ Poll until the executor finished all images, results in the order they were collected """
+    results, start = list(), time.monotonic()
+
+    while executor.busy():
+        assert time.monotonic() - start < timeout, 'Image detection did not finish'
+        results += executor.poll()
+        time.sleep(0.01)
+
+    return results
+
+
+def create_executor(workers: int=1) -> DetectionExecutor:
+    executor = DetectionExecutor(workers)
+    # Submit a single image at a time so the queue order decides
+    executor.max_pending_per_worker = 1
+    return executor
+
+
+def test_results():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        empty_iff, alpha_iff, broken_iff = tmp / 'empty.iff', tmp / 'alpha.iff', tmp / 'broken.iff'
+        write_iff(empty_iff, rgba_image())
+        write_iff(alpha_iff, rgba_image((1, 1)))
+        broken_iff.write_bytes(b'FOR4')
+
+        executor = create_executor(2)
+        try:
+            img_files = [create_png(tmp, 'empty', True), create_png(tmp, 'alpha', False),
+                         empty_iff, alpha_iff, broken_iff]
+            for img_file in img_files:
+                executor.submit(img_file)
+
+            results = {img_file: (is_empty, error) for img_file, is_empty, error in poll_all(executor)}
+        finally:
+            executor.shutdown()
+
+        assert set(results) == set(img_files)
+        assert results[tmp / 'empty.png'][0] is True
+        assert results[tmp / 'alpha.png'][0] is False
+        assert results[empty_iff] == (True, '')
+        assert results[alpha_iff] == (False, '')
+
+        # IFF files the native reader can not decode are detected by Maya
+        is_empty, error = results[broken_iff]
+        assert is_empty is None and error
+
+
+def test_priority_order():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        executor = create_executor()
+        try:
+            # The first image is submitted to the pool right away, the others wait in the queue
+            for name, priority in (('first', 5.0), ('c', 3.0), ('a', 1.0), ('b', 2.0), ('a2', 1.0)):
+                executor.submit(create_png(tmp, name, True), priority)
+
+            assert executor.active == 1 and executor.queue_depth == 4
+            order = [img_file.stem for img_file, _, _ in poll_all(executor)]
+        finally:
+            executor.shutdown()
+
+        # Lower priority values first, equal priorities in submission order
+        assert order == ['first', 'a', 'a2', 'b', 'c']
+
+
+def test_max_queued():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        executor = create_executor()
+        executor.max_queued = 3
+        try:
+            for idx in range(3):
+                executor.submit(create_png(tmp, f'img_{idx}', True))
+                assert not executor.full()
+
+            executor.submit(create_png(tmp, 'img_3', True))
+            assert executor.full() and executor.queue_depth == 3
+
+            assert len(poll_all(executor)) == 4
+            assert not executor.full() and not executor.busy()
+            assert executor.throughput > 0.0
+        finally:
+            executor.shutdown()
+
+
+def test_cancel():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        executor = create_executor()
+        try:
+            for idx in range(4):
+                executor.submit(create_png(tmp, f'img_{idx}', True))
+            assert executor.busy()
+
+            executor.cancel()
+            assert not executor.busy()
+            assert executor.queue_depth == 0 and executor.active == 0
+            assert executor.poll() == list()
+
+            # The executor is usable after cancelling
+            executor.submit(create_png(tmp, 'after_cancel', False))
+            results = poll_all(executor)
+            assert [(f.stem, is_empty) for f, is_empty, _ in results] == [('after_cancel', False)]
+        finally:
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    for test in (test_results, test_priority_order, test_max_queued, test_cancel):
+        test()
+    print('DetectionExecutor tests passed.')
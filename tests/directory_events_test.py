@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from modules.directory_events import DirectoryEvent, InotifyWatcher, create_directory_watcher
+from modules.directory_index import FileDirectoryWorker
+
+STABLE_TIME = 0.05
+
+pytestmark = pytest.mark.skipif(not InotifyWatcher.available(), reason='inotify is only available on Linux')
+
+
+def wait_events(watcher, expected: list, timeout: float=5.0) -> list:
+    """ Collect events until all expected events were received """
+    events, start = list(), time.monotonic()
+
+    while not all(e in events for e in expected):
+        assert time.monotonic() - start < timeout, f'Missing directory events, received: {events}'
+        events += watcher.get_events()
+        time.sleep(0.01)
+
+    return events
+
+
+def stop_watcher(watcher):
+    watcher.stop()
+    watcher.join(timeout=5.0)
+    assert not watcher.is_alive()
+
+
+def test_inotify_events():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir = Path(tmp) / 'images'
+        img_dir.mkdir()
+        watcher = create_directory_watcher(img_dir)
+        assert isinstance(watcher, InotifyWatcher)
+
+        try:
+            img_file = img_dir / 'a.sgi'
+            with open(img_file.as_posix(), 'wb') as f:
+                f.write(b'image')
+            events = wait_events(watcher, [(DirectoryEvent.created, img_file), (DirectoryEvent.closed, img_file)])
+            assert events.index((DirectoryEvent.created, img_file)) < events.index((DirectoryEvent.closed, img_file))
+
+            img_file.unlink()
+            assert wait_events(watcher, [(DirectoryEvent.removed, img_file)]) == [(DirectoryEvent.removed, img_file)]
+
+            # Files moved into and out of the directory, sub directories are ignored
+            outside_file = Path(tmp) / 'b.sgi'
+            outside_file.write_bytes(b'image')
+            (img_dir / 'sub').mkdir()
+            os.rename(outside_file.as_posix(), (img_dir / 'b.sgi').as_posix())
+            events = wait_events(watcher, [(DirectoryEvent.created, img_dir / 'b.sgi')])
+
+            os.rename((img_dir / 'b.sgi').as_posix(), outside_file.as_posix())
+            events += wait_events(watcher, [(DirectoryEvent.removed, img_dir / 'b.sgi')])
+            assert not [e for e in events if e[1].name == 'sub']
+        finally:
+            stop_watcher(watcher)
+
+
+def test_inotify_directory_removed():
+    """ Removing the watched directory requires a new index """
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir = Path(tmp) / 'images'
+        img_dir.mkdir()
+        watcher = create_directory_watcher(img_dir)
+
+        try:
+            shutil.rmtree(img_dir.as_posix())
+            wait_events(watcher, [(DirectoryEvent.overflow, img_dir)])
+        finally:
+            stop_watcher(watcher)
+
+
+def test_events_update_directory_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir = Path(tmp)
+        worker = FileDirectoryWorker()
+        worker.check_file_access = False
+        worker.stability.stable_time = STABLE_TIME
+        watcher = create_directory_watcher(img_dir)
+
+        try:
+            a = img_dir / f'a.{worker.image_file_extension}'
+            a.write_bytes(b'image')
+            events = wait_events(watcher, [(DirectoryEvent.closed, a)])
+            assert worker.apply_events(events) == ({'a'}, set())
+
+            # Events were lost, the index is left untouched and the directory is scanned again
+            b = img_dir / f'b.{worker.image_file_extension}'
+            b.write_bytes(b'image')
+            events = wait_events(watcher, [(DirectoryEvent.closed, b)])
+            watcher.put(DirectoryEvent.overflow)
+            assert worker.apply_events(events + watcher.get_events()) is None
+            assert set(worker.img_file_dict) == {'a'}
+
+            assert worker.index_img_files(img_dir) == (set(), set())
+            time.sleep(STABLE_TIME)
+            assert worker.index_img_files(img_dir) == ({'b'}, set())
+
+            a.unlink()
+            events = wait_events(watcher, [(DirectoryEvent.removed, a)])
+            assert worker.apply_events(events) == (set(), {'a'})
+            assert set(worker.img_file_dict) == {'b'}
+        finally:
+            stop_watcher(watcher)
+
+
+if __name__ == '__main__':
+    for test in (test_inotify_events, test_inotify_directory_removed, test_events_update_directory_index):
+        test()
+    print('Directory event tests passed.')
@@ -0,0 +1,116 @@
+import tempfile
+import time
+from pathlib import Path
+
+from modules.directory_events import DirectoryEvent
+from modules.directory_index import FileDirectoryWorker
+
+STABLE_TIME = 0.05
+
+
+def create_worker() -> FileDirectoryWorker:
+    worker = FileDirectoryWorker()
+    worker.check_file_access = False
+    worker.stability.stable_time = STABLE_TIME
+    return worker
+
+
+def write_image(img_dir: Path, stem: str, content: bytes=b'image') -> Path:
+    img_file = img_dir / f'{stem}.{FileDirectoryWorker.image_file_extension}'
+    img_file.write_bytes(content)
+    return img_file
+
+
+def test_index_img_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir = Path(tmp)
+        worker = create_worker()
+        a, b = write_image(img_dir, 'a'), write_image(img_dir, 'b')
+        (img_dir / 'notes.txt').write_text('not an image')
+
+        # Files are indexed once they did not change across two scans
+        assert worker.index_img_files(img_dir) == (set(), set())
+        assert a in worker.stability and b in worker.stability
+
+        time.sleep(STABLE_TIME)
+        assert worker.index_img_files(img_dir) == ({'a', 'b'}, set())
+        assert set(worker.img_file_dict) == {'a', 'b'}
+        assert not len(worker.stability)
+
+        # Only changes are reported
+        assert worker.index_img_files(img_dir) == (set(), set())
+
+        a.unlink()
+        assert worker.index_img_files(img_dir) == (set(), {'a'})
+        assert set(worker.img_file_dict) == {'b'}
+
+
+def test_apply_events():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir = Path(tmp)
+        worker = create_worker()
+        a, b = write_image(img_dir, 'a'), write_image(img_dir, 'b')
+
+        # Closed files are indexed right away, created files once they are stable
+        created, removed = worker.apply_events([(DirectoryEvent.created, a), (DirectoryEvent.closed, b),
+                                                (DirectoryEvent.created, img_dir / 'notes.txt')])
+        assert (created, removed) == ({'b'}, set())
+        assert a in worker.stability
+
+        # Files waiting for stability are observed again without new events
+        time.sleep(STABLE_TIME)
+        assert worker.apply_events([]) == ({'a'}, set())
+        assert set(worker.img_file_dict) == {'a', 'b'}
+
+        # Events of indexed files are ignored until they are removed
+        assert worker.apply_events([(DirectoryEvent.modified, a)]) == (set(), set())
+
+        a.unlink()
+        assert worker.apply_events([(DirectoryEvent.removed, a)]) == (set(), {'a'})
+        assert set(worker.img_file_dict) == {'b'}
+        assert 'a.' + FileDirectoryWorker.image_file_extension not in worker.stat_index
+
+        # Created and removed within the same events
+        c = write_image(img_dir, 'c')
+        assert worker.apply_events([(DirectoryEvent.closed, c), (DirectoryEvent.removed, c)]) == (set(), set())
+        assert 'c' not in worker.img_file_dict
+
+        # Removed files that were never indexed are not reported
+        assert worker.apply_events([(DirectoryEvent.removed, img_dir / 'd.sgi')]) == (set(), set())
+
+
+def test_apply_events_empty_file():
+    """ Renderers create the file before writing, empty files are never indexed """
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir = Path(tmp)
+        worker = create_worker()
+        img_file = write_image(img_dir, 'a', b'')
+
+        assert worker.apply_events([(DirectoryEvent.closed, img_file)]) == (set(), set())
+        time.sleep(STABLE_TIME)
+        assert worker.apply_events([]) == (set(), set())
+        assert not worker.img_file_dict
+
+        img_file.write_bytes(b'image')
+        assert worker.apply_events([(DirectoryEvent.closed, img_file)]) == ({'a'}, set())
+
+
+def test_apply_events_overflow():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir = Path(tmp)
+        worker = create_worker()
+        img_file = write_image(img_dir, 'a')
+
+        assert worker.apply_events([(DirectoryEvent.closed, img_file), (DirectoryEvent.overflow, img_dir)]) is None
+
+        # Files of the lost events are reported by the following scan
+        assert 'a' not in worker.img_file_dict
+        worker.index_img_files(img_dir)
+        time.sleep(STABLE_TIME)
+        assert worker.index_img_files(img_dir) == ({'a'}, set())
+
+
+if __name__ == '__main__':
+    for test in (test_index_img_files, test_apply_events, test_apply_events_empty_file, test_apply_events_overflow):
+        test()
+    print('FileDirectoryWorker tests passed.')
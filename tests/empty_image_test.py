@@ -0,0 +1,163 @@
+import struct
+import tempfile
+from itertools import groupby
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from modules.empty_image import ImageDetectionError, SgiAlphaDetector, detect_empty_image
+from tests.iff_reader_test import rgba_image, write_iff
+
+
+def compress_sgi_row(row: np.ndarray) -> bytes:
+    """ SGI RLE: low 7 bits count, high bit set for literal values, otherwise a repeated value. 0 ends the row """
+    values = list()
+
+    for value, run in groupby(row.tolist()):
+        count = len(list(run))
+        if count == 1:
+            values += [0x81, value]
+            continue
+        while count:
+            n = min(count, 127)
+            values += [n, value]
+            count -= n
+
+    return np.array(values + [0], dtype='>u2' if row.dtype.itemsize == 2 else np.uint8).tobytes()
+
+
+def write_sgi(img_file: Path, pixels: np.ndarray, rle: bool=True):
+    """ Write a (height, width, channels) uint8 or uint16 SGI image, first row is the top row """
+    height, width, channels = pixels.shape
+    bpc = 2 if pixels.dtype == np.uint16 else 1
+    header = struct.pack('>HBBHHHH', SgiAlphaDetector.magic, 1 if rle else 0, bpc, 3, width, height, channels)
+    header += b'\x00' * (SgiAlphaDetector.header_size - len(header))
+
+    # Channel planes with rows stored bottom to top
+    planes = [pixels[::-1, :, z].astype('>u2' if bpc == 2 else np.uint8) for z in range(channels)]
+    if not rle:
+        img_file.write_bytes(header + b''.join(p.tobytes() for p in planes))
+        return
+
+    starts, lengths, data = list(), list(), b''
+    offset = SgiAlphaDetector.header_size + 2 * channels * height * 4
+    # Identical rows share their data like in files written by Maya
+    row_offsets = dict()
+
+    for plane in planes:
+        for row in plane:
+            row_data = compress_sgi_row(row)
+            if row_data not in row_offsets:
+                row_offsets[row_data] = offset + len(data)
+                data += row_data
+            starts.append(row_offsets[row_data])
+            lengths.append(len(row_data))
+
+    tables = np.array(starts, dtype='>u4').tobytes() + np.array(lengths, dtype='>u4').tobytes()
+    img_file.write_bytes(header + tables + data)
+
+
+def write_fixtures(directory: Path, suffix: str, dtype=np.uint8) -> List[Path]:
+    """ Empty and non empty RGBA SGI images in RLE and verbatim storage """
+    empty_pixels = rgba_image(dtype=dtype)
+    alpha_pixels = rgba_image((4, 5), dtype=dtype)
+    if dtype == np.uint16:
+        # Alpha only in the low byte
+        alpha_pixels[4, 5, 3] = 1
+
+    files = list()
+    for rle in (True, False):
+        for name, pixels in (('empty', empty_pixels), ('alpha', alpha_pixels)):
+            img_file = directory / f'{name}_{"rle" if rle else "verbatim"}_{np.dtype(dtype).name}{suffix}'
+            write_sgi(img_file, pixels, rle)
+            files.append(img_file)
+
+    return files
+
+
+def test_sgi_8bit():
+    with tempfile.TemporaryDirectory() as tmp:
+        empty_rle, alpha_rle, empty_verbatim, alpha_verbatim = write_fixtures(Path(tmp), '.sgi')
+
+        # Color without alpha coverage is empty
+        assert detect_empty_image(empty_rle)
+        assert detect_empty_image(empty_verbatim)
+        assert not detect_empty_image(alpha_rle)
+        assert not detect_empty_image(alpha_verbatim)
+
+
+def test_sgi_16bit():
+    with tempfile.TemporaryDirectory() as tmp:
+        empty_rle, alpha_rle, empty_verbatim, alpha_verbatim = write_fixtures(Path(tmp), '.rgba', np.uint16)
+
+        assert detect_empty_image(empty_rle)
+        assert detect_empty_image(empty_verbatim)
+        assert not detect_empty_image(alpha_rle)
+        assert not detect_empty_image(alpha_verbatim)
+
+
+def test_sgi_without_alpha():
+    """ Images without alpha channel are only empty if all channels are zero """
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        for rle in (True, False):
+            black_file, color_file = tmp / f'black_{rle}.rgb', tmp / f'color_{rle}.rgb'
+            write_sgi(black_file, np.zeros((6, 8, 3), dtype=np.uint8), rle)
+            write_sgi(color_file, rgba_image()[:, :, :3], rle)
+
+            assert detect_empty_image(black_file)
+            assert not detect_empty_image(color_file)
+
+
+def test_sgi_rle_literal_row():
+    # Literal packet with a single non zero value
+    assert SgiAlphaDetector._rle_row_is_empty(bytes((0x83, 0, 0, 0, 0)), 1)
+    assert not SgiAlphaDetector._rle_row_is_empty(bytes((0x83, 0, 7, 0, 0)), 1)
+    assert not SgiAlphaDetector._rle_row_is_empty(np.array((0x82, 0, 1, 0), dtype='>u2').tobytes(), 2)
+    # Data behind the end of row marker is ignored
+    assert SgiAlphaDetector._rle_row_is_empty(bytes((0x05, 0, 0, 9)), 1)
+
+
+def test_iff():
+    with tempfile.TemporaryDirectory() as tmp:
+        empty_file, alpha_file = Path(tmp) / 'empty.iff', Path(tmp) / 'alpha.iff'
+        write_iff(empty_file, rgba_image())
+        write_iff(alpha_file, rgba_image((2, 2)))
+
+        assert detect_empty_image(empty_file)
+        assert not detect_empty_image(alpha_file)
+
+
+def test_detection_errors():
+    """ Unsupported formats and broken files raise ImageDetectionError so the caller can fall back """
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        png_file = tmp / 'image.png'
+        png_file.write_bytes(b'\x89PNG\r\n\x1a\n')
+
+        not_sgi = tmp / 'not_sgi.sgi'
+        not_sgi.write_bytes(b'\x00' * SgiAlphaDetector.header_size)
+
+        truncated_sgi = tmp / 'truncated.sgi'
+        write_sgi(truncated_sgi, rgba_image(), rle=False)
+        truncated_sgi.write_bytes(truncated_sgi.read_bytes()[:SgiAlphaDetector.header_size + 100])
+
+        broken_iff = tmp / 'broken.iff'
+        broken_iff.write_bytes(b'FOR4')
+
+        for img_file in (png_file, not_sgi, truncated_sgi, broken_iff, tmp / 'missing.sgi'):
+            try:
+                detect_empty_image(img_file)
+                assert False, f'{img_file.name} must raise ImageDetectionError'
+            except ImageDetectionError:
+                pass
+
+
+if __name__ == '__main__':
+    for test in (test_sgi_8bit, test_sgi_16bit, test_sgi_without_alpha, test_sgi_rle_literal_row, test_iff,
+                 test_detection_errors):
+        test()
+    print('Empty image detection tests passed.')
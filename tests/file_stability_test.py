@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from modules.file_stability import FileStabilityTracker
+
+STABLE_TIME = 0.05
+
+
+def test_stable_after_two_observations():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_file = Path(tmp) / 'a.sgi'
+        img_file.write_bytes(b'image')
+        tracker = FileStabilityTracker(STABLE_TIME)
+
+        # First observation only records the file
+        assert not tracker.observe(img_file, img_file.stat())
+        assert img_file in tracker
+
+        # Unchanged but observed again too early
+        assert not tracker.observe(img_file, img_file.stat())
+        assert not tracker.due_files()
+
+        time.sleep(STABLE_TIME)
+        assert tracker.due_files() == [img_file]
+        assert tracker.observe(img_file, img_file.stat())
+        assert img_file not in tracker and not len(tracker)
+
+
+def test_growing_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_file = Path(tmp) / 'a.sgi'
+        img_file.write_bytes(b'image')
+        tracker = FileStabilityTracker(STABLE_TIME)
+        assert not tracker.observe(img_file, img_file.stat())
+
+        # Size changed, stability time starts again
+        time.sleep(STABLE_TIME)
+        with open(img_file.as_posix(), 'ab') as f:
+            f.write(b' data')
+        assert not tracker.observe(img_file, img_file.stat())
+        assert not tracker.due_files()
+
+        # Same size with a new modification time
+        time.sleep(STABLE_TIME)
+        stat = img_file.stat()
+        os.utime(img_file.as_posix(), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert not tracker.observe(img_file, img_file.stat())
+
+        time.sleep(STABLE_TIME)
+        assert tracker.observe(img_file, img_file.stat())
+
+
+def test_zero_size_files():
+    """ Renderers create files before writing, empty files are never stable """
+    with tempfile.TemporaryDirectory() as tmp:
+        img_file = Path(tmp) / 'a.sgi'
+        img_file.write_bytes(b'')
+        tracker = FileStabilityTracker(STABLE_TIME)
+
+        assert not tracker.observe(img_file, img_file.stat())
+        time.sleep(STABLE_TIME)
+        assert not tracker.due_files()
+        assert not tracker.observe(img_file, img_file.stat())
+        assert not tracker.closed(img_file, img_file.stat())
+        assert img_file in tracker
+
+
+def test_closed_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        img_file = Path(tmp) / 'a.sgi'
+        img_file.write_bytes(b'image')
+        tracker = FileStabilityTracker(STABLE_TIME)
+
+        # Closed after writing is stable without waiting and stops tracking
+        assert not tracker.observe(img_file, img_file.stat())
+        assert tracker.closed(img_file, img_file.stat())
+        assert img_file not in tracker
+
+
+def test_remove_and_reset():
+    with tempfile.TemporaryDirectory() as tmp:
+        a, b = Path(tmp) / 'a.sgi', Path(tmp) / 'b.sgi'
+        tracker = FileStabilityTracker(STABLE_TIME)
+        for img_file in (a, b):
+            img_file.write_bytes(b'image')
+            tracker.observe(img_file, img_file.stat())
+
+        tracker.remove(a)
+        tracker.remove(a)
+        assert a not in tracker and b in tracker
+
+        tracker.reset()
+        assert not len(tracker)
+
+
+if __name__ == '__main__':
+    for test in (test_stable_after_two_observations, test_growing_file, test_zero_size_files, test_closed_files,
+                 test_remove_and_reset):
+        test()
+    print('FileStabilityTracker tests passed.')
@@ -0,0 +1,52 @@
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from maya_mod.start_mayapy import run_module_in_standalone
+from modules.iff_reader import detect_empty_iff
+from modules.setup_paths import get_current_modules_dir
+
+logging.basicConfig(level=logging.DEBUG)
+LOGGER = logging.getLogger(__name__)
+
+
+def detect_mayapy(img_file: Path, mod_dir: str) -> bool:
+    """ Detection as done by ProcessImage, the mayapy process deletes empty images """
+    img_check_module = Path(mod_dir) / 'maya_mod/run_empty_img_check.py'
+    process = run_module_in_standalone(img_check_module.as_posix(), img_file.as_posix(), mod_dir, pipe_output=True)
+    process.communicate()
+
+    return not img_file.exists()
+
+
+def main():
+    """ Compare native IFF empty image detection against the Maya standalone detection """
+    img_dir = Path(r'D:\temp\iff_test')
+    mod_dir = get_current_modules_dir()
+    img_files = sorted(img_dir.glob('*.iff'))
+
+    start_time = time.time()
+    native_results = {f.name: detect_empty_iff(f) for f in img_files}
+    native_duration = time.time() - start_time
+
+    # Maya removes empty images, work on copies
+    mayapy_results = dict()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start_time = time.time()
+        for img_file in img_files:
+            tmp_file = Path(tmp_dir) / img_file.name
+            shutil.copy(img_file.as_posix(), tmp_file.as_posix())
+            mayapy_results[img_file.name] = detect_mayapy(tmp_file, mod_dir)
+        mayapy_duration = time.time() - start_time
+
+    mismatches = [name for name in native_results if native_results[name] != mayapy_results[name]]
+
+    LOGGER.info(f'{len(img_files)} images, {sum(native_results.values())} empty: '
+                f'native {native_duration:.4f}s - mayapy {mayapy_duration:.4f}s')
+    LOGGER.info(f'Mismatching results: {mismatches}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import struct
+import tempfile
+from itertools import groupby
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+from modules.iff_reader import IffError, IffReader, decompress_rle, detect_empty_iff, read_iff
+
+
+def chunk(tag: bytes, data: bytes) -> bytes:
+    return tag + struct.pack('>I', len(data)) + data + b'\x00' * (-len(data) % 4)
+
+
+def compress_rle(plane: bytes) -> bytes:
+    """ IFF RLE: repeat packets for runs, literal packets for single bytes """
+    out, literals = bytearray(), bytearray()
+
+    def flush_literals():
+        for i in range(0, len(literals), 128):
+            part = literals[i:i + 128]
+            out.extend(bytes((len(part) - 1,)) + part)
+        literals.clear()
+
+    for value, run in groupby(plane):
+        count = len(list(run))
+        if count == 1:
+            literals.append(value)
+            continue
+
+        flush_literals()
+        while count:
+            n = min(count, 128)
+            out.extend(bytes((0x80 | (n - 1), value)))
+            count -= n
+
+    flush_literals()
+    return bytes(out)
+
+
+def write_iff(img_file: Path, pixels: np.ndarray, tile_size: Tuple=(4, 3), compressed: bool=True,
+              corrupt_last_tile: bool=False):
+    """
+        Write a Maya IFF image of (height, width, channels) uint8 or uint16 pixels, first row is the top row.
+        Channel bytes are stored in reversed order, RLE tiles as one plane per channel byte.
+    """
+    height, width, channels = pixels.shape
+    bytes_flag = 1 if pixels.dtype == np.uint16 else 0
+    # Channel bytes of every pixel, big endian for 16 bit images
+    pixel_bytes = pixels.astype('>u2' if bytes_flag else np.uint8).view(np.uint8).reshape(height, width, -1)
+    # IFF rows are stored bottom to top
+    pixel_bytes = pixel_bytes[::-1]
+
+    flags = (0x01 if channels >= 3 else 0) | (0x02 if channels in (1, 4) else 0)
+    tile_w, tile_h = tile_size
+    tiles = list()
+
+    for ymin in range(0, height, tile_h):
+        for xmin in range(0, width, tile_w):
+            xmax, ymax = min(xmin + tile_w, width) - 1, min(ymin + tile_h, height) - 1
+            tile = pixel_bytes[ymin:ymax + 1, xmin:xmax + 1, ::-1]
+
+            if compressed:
+                data = b''.join(compress_rle(tile[:, :, c].tobytes()) for c in range(tile.shape[2]))
+            else:
+                data = tile.tobytes()
+            tiles.append(struct.pack('>HHHH', xmin, ymin, xmax, ymax) + data)
+
+    if corrupt_last_tile:
+        tiles[-1] = tiles[-1][:9]
+
+    tbhd = struct.pack('>IIHHIHHI', width, height, 1, 1, flags, bytes_flag, len(tiles), 1 if compressed else 0)
+    tbmp = b'TBMP' + b''.join(chunk(b'RGBA', t) + chunk(b'ZBUF', t[:8]) for t in tiles)
+    cimg = b'CIMG' + chunk(b'TBHD', tbhd + b'\x00' * 8) + chunk(b'FOR4', tbmp)
+    img_file.write_bytes(chunk(b'FOR4', cimg))
+
+
+def rgba_image(alpha_pos: Tuple=None, dtype=np.uint8) -> np.ndarray:
+    """ 6x8 RGBA image with color but no alpha except at alpha_pos """
+    pixels = np.zeros((6, 8, 4), dtype=dtype)
+    pixels[:, :, 0] = np.arange(8, dtype=dtype)
+    pixels[2:4, 1:6, 1] = 200
+    if alpha_pos is not None:
+        pixels[alpha_pos + (3,)] = 255
+    return pixels
+
+
+def test_decompress_rle():
+    data = compress_rle(bytes([0, 0, 0, 5, 6, 7] + [9] * 300))
+    plane, offset = decompress_rle(data + b'\xff', 0, 306)
+
+    assert plane == bytes([0, 0, 0, 5, 6, 7] + [9] * 300)
+    assert offset == len(data)
+
+    try:
+        decompress_rle(data[:-1], 0, 306)
+        assert False, 'Truncated RLE data must raise IffError'
+    except IffError:
+        pass
+
+
+def test_read_8bit():
+    with tempfile.TemporaryDirectory() as tmp:
+        for compressed in (True, False):
+            img_file = Path(tmp) / f'image_{compressed}.iff'
+            pixels = rgba_image((1, 6))
+            write_iff(img_file, pixels, compressed=compressed)
+
+            with IffReader(img_file) as reader:
+                assert (reader.width, reader.height, reader.channels, reader.bytes) == (8, 6, 4, 1)
+                assert reader.compressed == compressed
+                assert reader.tile_count == 4
+
+            assert np.array_equal(read_iff(img_file), pixels)
+
+
+def test_detect_empty_8bit():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        for compressed in (True, False):
+            empty_file, alpha_file = tmp / f'empty_{compressed}.iff', tmp / f'alpha_{compressed}.iff'
+            write_iff(empty_file, rgba_image(), compressed=compressed)
+            # Alpha in the last tile only
+            write_iff(alpha_file, rgba_image((0, 7)), compressed=compressed)
+
+            assert detect_empty_iff(empty_file)
+            assert not detect_empty_iff(alpha_file)
+
+        # Detection stops at the first tile with alpha, the broken last tile is never read
+        first_tile_file = tmp / 'first_tile.iff'
+        write_iff(first_tile_file, rgba_image((5, 0)), corrupt_last_tile=True)
+        assert not detect_empty_iff(first_tile_file)
+
+        write_iff(first_tile_file, rgba_image(), corrupt_last_tile=True)
+        try:
+            detect_empty_iff(first_tile_file)
+            assert False, 'Empty images must read the broken last tile'
+        except IffError:
+            pass
+
+
+def test_detect_empty_16bit():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        for compressed in (True, False):
+            empty_file, alpha_file = tmp / f'empty_{compressed}.iff', tmp / f'alpha_{compressed}.iff'
+            pixels = rgba_image(dtype=np.uint16)
+            pixels[:, :, :3] = 0
+            write_iff(empty_file, pixels, compressed=compressed)
+
+            # Low byte of the alpha value only
+            pixels[3, 3, 3] = 1
+            write_iff(alpha_file, pixels, compressed=compressed)
+
+            with IffReader(alpha_file) as reader:
+                assert (reader.channels, reader.bytes, reader.pixel_bytes) == (4, 2, 8)
+
+            assert detect_empty_iff(empty_file)
+            assert not detect_empty_iff(alpha_file)
+
+
+def test_invalid_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        not_iff = tmp / 'not_iff.iff'
+        not_iff.write_bytes(chunk(b'FORM', b'ILBM'))
+
+        truncated = tmp / 'truncated.iff'
+        write_iff(truncated, rgba_image((1, 1)))
+        truncated.write_bytes(truncated.read_bytes()[:40])
+
+        for img_file in (not_iff, truncated):
+            try:
+                detect_empty_iff(img_file)
+                assert False, f'{img_file.name} must raise IffError'
+            except IffError:
+                pass
+
+
+if __name__ == '__main__':
+    for test in (test_decompress_rle, test_read_8bit, test_detect_empty_8bit, test_detect_empty_16bit,
+                 test_invalid_files):
+        test()
+    print('IffReader tests passed.')
@@ -0,0 +1,161 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from modules.layer_composite import LayerCompositor, alpha_bbox_crop
+from modules.psd_writer import PsdWriter, find_psd_preview
+
+WIDTH, HEIGHT = 40, 24
+
+
+def create_layers() -> list:
+    """ Straight alpha 8 bit RGBA layers with partly transparent, overlapping rectangles """
+    layers = list()
+
+    for idx, (color, alpha, (y0, y1, x0, x1)) in enumerate((
+            ((255, 0, 0), 255, (2, 14, 3, 20)),
+            ((0, 128, 255), 128, (8, 20, 10, 32)),
+            ((40, 220, 90), 64, (5, 24, 15, 40)))):
+        rgba = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+        rgba[y0:y1, x0:x1, :3] = color
+        rgba[y0:y1, x0:x1, 3] = alpha
+        # Soft edge with a different alpha
+        rgba[y0:y1, x0, 3] = alpha // 2 + idx
+        layers.append(rgba)
+
+    return layers
+
+
+def reference_over(layers: list) -> np.ndarray:
+    """ Straight alpha over blend of the layers bottom to top, per pixel in float64 """
+    color, alpha = np.zeros((HEIGHT, WIDTH, 3)), np.zeros((HEIGHT, WIDTH, 1))
+
+    for rgba in layers:
+        src_color, src_alpha = rgba[:, :, :3] / 255.0, rgba[:, :, 3:4] / 255.0
+        out_alpha = src_alpha + alpha * (1.0 - src_alpha)
+        premultiplied = src_color * src_alpha + color * alpha * (1.0 - src_alpha)
+        color = np.divide(premultiplied, out_alpha, out=np.zeros_like(premultiplied), where=out_alpha > 0.0)
+        alpha = out_alpha
+
+    return np.concatenate((color, alpha), axis=2)
+
+
+def composite_layers(layers: list, cropped: bool=False) -> LayerCompositor:
+    compositor = LayerCompositor(WIDTH, HEIGHT)
+
+    for rgba in layers:
+        if cropped:
+            left, top, rgba = alpha_bbox_crop(rgba)
+            compositor.add(rgba, left, top)
+        else:
+            compositor.add(rgba)
+
+    return compositor
+
+
+def test_alpha_bbox_crop():
+    rgba = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+    assert alpha_bbox_crop(rgba) is None
+
+    # Color without alpha is not visible
+    rgba[0, 0, :3] = 255
+    rgba[3:7, 5:9, 3] = 10
+    rgba[11, 30, 3] = 1
+
+    left, top, cropped = alpha_bbox_crop(rgba)
+    assert (left, top) == (5, 3)
+    assert cropped.shape == (9, 26, 4) and cropped.flags.c_contiguous
+    assert np.array_equal(cropped, rgba[3:12, 5:31])
+
+
+def test_composite_matches_reference_over():
+    layers = create_layers()
+    expected = reference_over(layers)
+
+    for cropped in (False, True):
+        compositor = composite_layers(layers, cropped)
+        assert compositor.layer_count == 3
+
+        result = compositor.composite()
+        assert result.dtype == np.uint8
+        assert np.abs(result[:, :, 3].astype(np.int32) - np.round(expected[:, :, 3] * 255.0)).max() <= 1
+
+        # Color is only defined for visible pixels
+        visible = expected[:, :, 3] > 0.0
+        assert not result[~visible].any()
+        assert np.abs(result[visible, :3].astype(np.int32) - np.round(expected[visible, :3] * 255.0)).max() <= 1
+
+        # Premultiplied accumulation buffer
+        assert np.allclose(compositor.pixels[:, :, :3], expected[:, :, :3] * expected[:, :, 3:4], atol=1e-5)
+
+    # Layers partly or fully outside the document
+    compositor = LayerCompositor(WIDTH, HEIGHT)
+    compositor.add(np.full((4, 4, 4), 255, dtype=np.uint8), left=-2, top=HEIGHT - 2)
+    compositor.add(np.full((4, 4, 4), 255, dtype=np.uint8), left=WIDTH, top=0)
+    assert compositor.layer_count == 2
+    assert compositor.composite()[:, :, 3].sum() == 4 * 255
+
+
+def test_matted_composite():
+    layers = create_layers()
+    expected = reference_over(layers)
+    compositor = composite_layers(layers)
+
+    for matte in (1.0, 0.0):
+        matted = expected[:, :, :3] * expected[:, :, 3:4] + matte * (1.0 - expected[:, :, 3:4])
+        result = compositor.matted_composite(matte)
+        assert np.abs(result[:, :, :3].astype(np.int32) - np.round(matted * 255.0)).max() <= 1
+        assert np.array_equal(result[:, :, 3], compositor.composite()[:, :, 3])
+
+    # Transparent pixels are white with the default matte
+    assert (compositor.matted_composite()[0, 0] == (255, 255, 255, 0)).all()
+
+
+def test_mip_levels():
+    compositor = composite_layers(create_layers())
+    compositor.min_mip_size = 5
+    levels = compositor.mip_levels()
+
+    assert [l.shape[:2] for l in levels] == [(24, 40), (12, 20), (6, 10), (3, 5)]
+    assert levels[0] is compositor.pixels
+
+    # Every level is the 2x2 box filter of the premultiplied pixels of the previous level
+    for level, previous in zip(levels[1:], levels):
+        h, w = level.shape[:2]
+        expected = previous[:h * 2, :w * 2].reshape(h, 2, w, 2, 4).mean(axis=(1, 3))
+        assert np.allclose(level, expected, atol=1e-6)
+
+
+def test_thumbnail():
+    layers = create_layers()
+    compositor = composite_layers(layers)
+
+    thumbnail = compositor.thumbnail(max_size=20)
+    assert thumbnail.shape == (12, 20, 4) and thumbnail.dtype == np.uint8
+
+    # Alpha of the downsampled composite
+    expected = compositor.mip_levels()[1][:, :, 3] * 255.0
+    assert np.abs(thumbnail[:, :, 3].astype(np.int32) - expected).max() <= 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        psd_file = Path(tmp) / 'scene_Pfade.psd'
+        writer = PsdWriter(psd_file, WIDTH, HEIGHT)
+        assert find_psd_preview(Path(tmp)) is None
+
+        assert compositor.save_thumbnail(writer.thumbnail_file, max_size=16)
+        assert find_psd_preview(Path(tmp)) == writer.thumbnail_file
+
+        with Image.open(writer.thumbnail_file.as_posix()) as img:
+            assert img.mode == 'RGBA' and img.size == (16, 10)
+
+    assert find_psd_preview(Path(tmp)) is None
+    assert not compositor.save_thumbnail(Path(tmp) / 'missing_dir' / 'preview.png')
+
+
+if __name__ == '__main__':
+    for test in (test_alpha_bbox_crop, test_composite_matches_reference_over, test_matted_composite, test_mip_levels,
+                 test_thumbnail):
+        test()
+    print('LayerCompositor tests passed.')
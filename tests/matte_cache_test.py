@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from modules.compact_matte import CompactMatte
+from modules.matte_cache import MatteCache
+
+MANIFEST = {'leather': '3f8a0c21', 'chrome': '1b2e44d0', 'glass': '0c9d1e7a'}
+SHAPE = (32, 48)
+
+
+def create_image(directory: Path, content: bytes=b'cryptomatte') -> Path:
+    img_file = directory / 'crypto.exr'
+    img_file.write_bytes(content)
+    return img_file
+
+
+def create_mattes() -> dict:
+    matte = np.zeros(SHAPE, dtype=np.float32)
+    matte[4:10, 6:20] = 0.5
+    return {'leather': CompactMatte.from_dense(matte)}
+
+
+def test_store_load_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        img_file = create_image(tmp)
+        cache = MatteCache(img_file, MANIFEST, cache_dir=tmp / 'cache')
+        mattes = create_mattes()
+
+        # Nothing cached yet
+        loaded, missing = cache.load(['leather', 'chrome'])
+        assert not loaded and missing == ['leather', 'chrome']
+
+        cache.store(mattes, ['leather', 'chrome'], SHAPE)
+        loaded, missing = MatteCache(img_file, MANIFEST, cache_dir=tmp / 'cache').load(['leather', 'chrome', 'glass'])
+
+        # Empty mattes are cached but not returned, glass was never decoded
+        assert missing == ['glass']
+        assert list(loaded.keys()) == ['leather']
+        assert loaded['leather'].bbox == mattes['leather'].bbox
+        assert np.array_equal(loaded['leather'].to_dense(), mattes['leather'].to_dense())
+
+
+def test_key_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        img_file = create_image(tmp)
+        key = MatteCache(img_file, MANIFEST, cache_dir=tmp).entry_dir
+
+        # Decoding options and manifest are part of the key
+        assert MatteCache(img_file, MANIFEST, alpha_over_compositing=True, cache_dir=tmp).entry_dir != key
+        assert MatteCache(img_file, dict(MANIFEST, paint='7d7d7d7d'), cache_dir=tmp).entry_dir != key
+
+        # Same content with a new modification time
+        stat = img_file.stat()
+        os.utime(img_file.as_posix(), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert MatteCache(img_file, MANIFEST, cache_dir=tmp).entry_dir != key
+
+
+class SampledMatteCache(MatteCache):
+    hash_chunk_size = 64
+
+
+def test_key_sampled_chunks():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        content = bytearray(b'header' + bytes(range(256)) * 8 + b'footer')
+        img_file = create_image(tmp, bytes(content))
+        stat = img_file.stat()
+
+        def key_with(position: int) -> Path:
+            """ Key after changing a single byte while keeping size and modification time """
+            changed = bytearray(content)
+            changed[position] ^= 0xFF
+            img_file.write_bytes(bytes(changed))
+            os.utime(img_file.as_posix(), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+            return SampledMatteCache(img_file, MANIFEST, cache_dir=tmp).entry_dir
+
+        cache = SampledMatteCache(img_file, MANIFEST, cache_dir=tmp)
+        key = cache.entry_dir
+        assert cache._sample_offsets(len(content)) == [0, (len(content) - 64) // 2, len(content) - 64]
+
+        # Header, middle and last chunk are hashed
+        for position in (3, len(content) // 2, len(content) - 3):
+            assert key_with(position) != key
+
+        # Bytes between the sampled chunks are not read
+        assert key_with(len(content) // 4) == key
+
+
+def test_lru_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache_dir = tmp / 'cache'
+        caches = list()
+
+        for idx in range(3):
+            img_dir = tmp / f'img_{idx}'
+            img_dir.mkdir()
+            cache = MatteCache(create_image(img_dir, f'image {idx}'.encode()), MANIFEST, cache_dir=cache_dir)
+            cache.max_disk_bytes = 10 ** 9
+            cache.store(create_mattes(), list(MANIFEST.keys()), SHAPE)
+
+            # Distinct last used times
+            used = time.time() - 100 + idx
+            os.utime(cache.entry_dir.as_posix(), (used, used))
+            caches.append(cache)
+
+        # Use the oldest entry again
+        caches[0].load(['leather'])
+
+        entry_size = sum(f.stat().st_size for f in caches[2].entry_dir.iterdir())
+        caches[2].max_disk_bytes = entry_size * 2
+        caches[2].evict()
+
+        # Entry 1 was the least recently used
+        assert caches[0].entry_dir.exists()
+        assert not caches[1].entry_dir.exists()
+        assert caches[2].entry_dir.exists()
+
+
+def test_evict_skips_vanished_entries():
+    """ Entries removed by another process while scanning must not fail the store """
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache = MatteCache(create_image(tmp), MANIFEST, cache_dir=tmp / 'cache')
+        cache.max_disk_bytes = 0
+        cache.store(create_mattes(), ['leather'], SHAPE)
+
+        vanished = tmp / 'cache' / 'vanished'
+        vanished.mkdir()
+        (vanished / 'matte.npz').write_bytes(b'0' * 16)
+
+        original_iterdir = Path.iterdir
+
+        def iterdir_removing_entry(path):
+            if path == vanished:
+                shutil.rmtree(vanished.as_posix())
+            return original_iterdir(path)
+
+        Path.iterdir = iterdir_removing_entry
+        try:
+            cache.evict()
+        finally:
+            Path.iterdir = original_iterdir
+
+        assert cache.entry_dir.exists()
+
+
+if __name__ == '__main__':
+    for test in (test_store_load_round_trip, test_key_changes, test_key_sampled_chunks, test_lru_eviction,
+                 test_evict_skips_vanished_entries):
+        test()
+    print('MatteCache tests passed.')
@@ -0,0 +1,163 @@
+import tempfile
+import threading
+from pathlib import Path
+
+from modules.mayapy_pool import MayapyPool, MayapyWorkerError
+
+# Task module appending the worker process id to a file after a delay
+TASK_MODULE = """
+import os
+import sys
+import time
+
+out_file, delay, exit_code = sys.argv[1], float(sys.argv[2]), int(sys.argv[3])
+time.sleep(delay)
+
+with open(out_file, 'a') as f:
+    f.write(str(os.getpid()) + '\\n')
+
+sys.exit(exit_code)
+"""
+
+
+class TaskDir:
+    """ Temporary directory with the task module, collects the process ids of the workers that ran tasks """
+    def __init__(self, tmp: str):
+        self.module_file = Path(tmp) / 'task.py'
+        self.module_file.write_text(TASK_MODULE)
+        self.out_file = Path(tmp) / 'pids.txt'
+
+    def run(self, pool: MayapyPool, delay: float=0.0, exit_code: int=0, timeout: float=None) -> dict:
+        return pool.run_module(self.module_file, self.out_file.as_posix(), delay, exit_code, timeout=timeout)
+
+    def pids(self) -> list:
+        if not self.out_file.exists():
+            return list()
+        return [int(p) for p in self.out_file.read_text().split()]
+
+
+def test_round_trip():
+    pool = MayapyPool(max_workers=1, stub=True)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            task = TaskDir(tmp)
+
+            result = task.run(pool)
+            assert result.get('ok') and result.get('exit_code') == 0
+
+            result = task.run(pool, exit_code=3)
+            assert not result.get('ok') and result.get('exit_code') == 3
+
+            # Both tasks ran in the same warm worker
+            pids = task.pids()
+            assert len(pids) == 2 and pids[0] == pids[1]
+    finally:
+        pool.shutdown()
+
+
+def test_recycle_after_max_tasks():
+    pool = MayapyPool(max_workers=1, stub=True)
+    pool.max_tasks_per_worker = 2
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            task = TaskDir(tmp)
+            for _ in range(3):
+                assert task.run(pool).get('ok')
+
+            first, second, third = task.pids()
+            assert first == second
+            assert third != second
+    finally:
+        pool.shutdown()
+
+
+def test_max_workers():
+    pool = MayapyPool(max_workers=2, stub=True)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            task = TaskDir(tmp)
+            results = list()
+
+            threads = [threading.Thread(target=lambda: results.append(task.run(pool, delay=0.5))) for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            assert len(results) == 5 and all(r.get('ok') for r in results)
+            assert len(set(task.pids())) <= 2
+            assert pool._worker_count <= 2
+    finally:
+        pool.shutdown()
+
+
+def test_timeout():
+    pool = MayapyPool(max_workers=1, stub=True)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            task = TaskDir(tmp)
+
+            try:
+                task.run(pool, delay=10.0, timeout=0.5)
+                assert False, 'Task exceeding its timeout must raise MayapyWorkerError'
+            except MayapyWorkerError:
+                pass
+
+            # The timed out worker was killed and does not block the pool
+            assert pool._worker_count == 0
+            assert task.run(pool).get('ok')
+            assert len(task.pids()) == 1
+    finally:
+        pool.shutdown()
+
+
+def test_health_check():
+    pool = MayapyPool(max_workers=1, stub=True)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            task = TaskDir(tmp)
+            assert task.run(pool).get('ok')
+
+            # Idle worker dies and is removed
+            idle_worker = pool._idle[0]
+            idle_worker.kill()
+            idle_worker.process.wait()
+
+            pool.health_check()
+            assert not pool._idle and pool._worker_count == 0
+
+            assert task.run(pool).get('ok')
+            first, second = task.pids()
+            assert first != second
+    finally:
+        pool.shutdown()
+
+
+def test_periodic_health_check():
+    pool = MayapyPool(max_workers=1, stub=True)
+    checks = list()
+    health_check = pool.health_check
+    pool.health_check = lambda: checks.append(1) or health_check()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            task = TaskDir(tmp)
+            assert task.run(pool).get('ok')
+            assert not checks
+
+            pool.health_check_interval = 0.0
+            assert task.run(pool).get('ok')
+            assert task.run(pool).get('ok')
+            assert len(checks) == 2
+
+            # Healthy idle workers are kept
+            assert len(set(task.pids())) == 1
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    for test in (test_round_trip, test_recycle_after_max_tasks, test_max_workers, test_timeout, test_health_check,
+                 test_periodic_health_check):
+        test()
+    print('MayapyPool tests passed.')
@@ -0,0 +1,298 @@
+import struct
+import tempfile
+from pathlib import Path
+
+import OpenImageIO as oiio
+import numpy as np
+import pytest
+
+from maya_mod.layer_names import mladenka_renamer
+from modules.psd_writer import IncrementalPsdWriter, PsdLayer, PsdWriter, create_layered_psd, expand_cropped_layers, \
+    packbits_rows
+from modules.utils import OpenImageUtil
+
+WIDTH, HEIGHT = 24, 16
+
+
+def image_output_available() -> bool:
+    """ Writing layer images needs an OpenImageIO build with ImageOutput """
+    try:
+        return oiio.ImageOutput.create('probe.png') is not None
+    except Exception:
+        return False
+
+
+IMAGE_OUTPUT = image_output_available()
+
+
+def unpack_bits(data: bytes, size: int) -> np.ndarray:
+    """ Decode a single PackBits compressed row """
+    row, pos = bytearray(), 0
+    while pos < len(data):
+        header = data[pos]
+        pos += 1
+        if header < 128:
+            row += data[pos:pos + header + 1]
+            pos += header + 1
+        elif header > 128:
+            row += bytes(data[pos:pos + 1]) * (257 - header)
+            pos += 1
+
+    assert len(row) == size
+    return np.frombuffer(bytes(row), dtype=np.uint8)
+
+
+def read_rle_channel(data: bytes, pos: int, height: int, width: int, psb: bool) -> (np.ndarray, int):
+    """ Decode RLE channel data starting at the row byte counts """
+    count_size = 4 if psb else 2
+    counts = np.frombuffer(data[pos:pos + height * count_size], dtype='>u4' if psb else '>u2')
+    pos += height * count_size
+
+    rows = list()
+    for count in counts:
+        rows.append(unpack_bits(data[pos:pos + count], width))
+        pos += int(count)
+
+    return np.array(rows, dtype=np.uint8).reshape(height, width), pos
+
+
+def read_psd(psd_file: Path) -> dict:
+    """ Minimal PSD/PSB reader returning the header, layer records with their pixels and the merged image """
+    data = psd_file.read_bytes()
+    assert data[:4] == b'8BPS'
+    version, = struct.unpack_from('>H', data, 4)
+    psb = version == 2
+    length = ('>Q', 8) if psb else ('>I', 4)
+
+    channels, height, width, depth, mode = struct.unpack_from('>HIIHH', data, 12)
+    pos = 26
+
+    # Color mode data and image resources
+    for _ in range(2):
+        section_length, = struct.unpack_from('>I', data, pos)
+        pos += 4 + section_length
+
+    layer_section_length, = struct.unpack_from(length[0], data, pos)
+    merged_pos = pos + length[1] + layer_section_length
+    pos += length[1] * 2
+    layer_count, = struct.unpack_from('>h', data, pos)
+    pos += 2
+
+    layers = list()
+    for _ in range(abs(layer_count)):
+        rect = struct.unpack_from('>iiii', data, pos)
+        channel_count, = struct.unpack_from('>H', data, pos + 16)
+        pos += 18
+
+        channel_info = list()
+        for _ in range(channel_count):
+            channel_id, = struct.unpack_from('>h', data, pos)
+            channel_length, = struct.unpack_from(length[0], data, pos + 2)
+            channel_info.append((channel_id, channel_length))
+            pos += 2 + length[1]
+
+        assert data[pos:pos + 12] == b'8BIMnorm' + bytes((255, 0, 0, 0))
+        extra_length, = struct.unpack_from('>I', data, pos + 12)
+        extra = data[pos + 16:pos + 16 + extra_length]
+        pos += 16 + extra_length
+
+        # Skip empty layer mask and blending ranges, pascal name padded to 4 bytes
+        name_pos = 8 + ((extra[8] + 1 + 3) // 4) * 4
+        assert extra[name_pos:name_pos + 8] == b'8BIMluni'
+        name_length, = struct.unpack_from('>I', extra, name_pos + 12)
+        name = extra[name_pos + 16:name_pos + 16 + name_length * 2].decode('utf-16-be')
+
+        layers.append(dict(name=name, rect=rect, channel_info=channel_info))
+
+    # Channel image data follows all records
+    for layer in layers:
+        top, left, bottom, right = layer['rect']
+        layer['pixels'] = dict()
+
+        for channel_id, channel_length in layer['channel_info']:
+            compression, = struct.unpack_from('>H', data, pos)
+            if compression == 0:
+                assert channel_length == 2 and bottom - top == 0
+                pos += 2
+                continue
+
+            assert compression == 1
+            layer['pixels'][channel_id], end = read_rle_channel(data, pos + 2, bottom - top, right - left, psb)
+            assert end - pos == channel_length
+            pos = end
+
+    # Merged image, row counts of all channels precede the channel data
+    compression, = struct.unpack_from('>H', data, merged_pos)
+    assert compression == 1
+    merged_counts = np.frombuffer(data[merged_pos + 2:merged_pos + 2 + channels * height * length[1] // 2],
+                                  dtype='>u4' if psb else '>u2')
+    assert merged_pos + 2 + merged_counts.nbytes + int(merged_counts.sum()) == len(data)
+
+    return dict(psb=psb, width=width, height=height, channels=channels, depth=depth, mode=mode,
+                layer_count=layer_count, layers=layers)
+
+
+def layer_rgba(top: int, left: int, height: int, width: int, color: tuple) -> np.ndarray:
+    """ Opaque rectangle of color on a transparent frame """
+    rgba = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+    rgba[top:top + height, left:left + width] = (*color, 255)
+    return rgba
+
+
+def test_packbits_round_trip():
+    rng = np.random.RandomState(0)
+    channel = np.zeros((6, 300), dtype=np.uint8)
+    channel[1] = rng.randint(0, 256, 300)
+    channel[2, 100:250] = 7
+    channel[3] = rng.randint(0, 2, 300)
+    channel[4, ::2] = 255
+    channel[5, 200:] = rng.randint(0, 256, 100)
+
+    packed, row_counts = packbits_rows(channel)
+    assert int(row_counts.sum()) == packed.size
+
+    data, pos = packed.tobytes(), 0
+    for row, count in zip(channel, row_counts):
+        assert np.array_equal(unpack_bits(data[pos:pos + count], channel.shape[1]), row)
+        pos += int(count)
+
+    # Runs longer than a single packet compress into repeat packets
+    packed, row_counts = packbits_rows(np.full((2, 1000), 3, dtype=np.uint8))
+    assert list(row_counts) == [16, 16]
+
+
+def check_written_layers(psb: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        psd_file = Path(tmp) / f'layers.{"psb" if psb else "psd"}'
+        top_rgba = layer_rgba(2, 3, 4, 5, (200, 10, 20))
+        bottom_rgba = layer_rgba(8, 0, 8, 24, (30, 40, 50))
+
+        layers = [PsdLayer('top', top_rgba), PsdLayer('empty', np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)),
+                  PsdLayer('bottom', bottom_rgba)]
+        assert PsdWriter(psd_file, WIDTH, HEIGHT, psb=psb, workers=1).write(layers)
+
+        psd = read_psd(psd_file)
+        assert psd['psb'] == psb
+        assert (psd['width'], psd['height'], psd['channels'], psd['depth'], psd['mode']) == (WIDTH, HEIGHT, 4, 8, 3)
+        assert psd['layer_count'] == -3
+
+        # Records are ordered bottom to top
+        bottom, empty, top = psd['layers']
+        assert [l['name'] for l in psd['layers']] == ['bottom', 'empty', 'top']
+
+        # Layers are cropped to their visible pixels
+        assert top['rect'] == (2, 3, 6, 8)
+        assert bottom['rect'] == (8, 0, 16, 24)
+        assert np.array_equal(top['pixels'][0], top_rgba[2:6, 3:8, 0])
+        assert np.array_equal(top['pixels'][-1], top_rgba[2:6, 3:8, 3])
+        assert np.array_equal(bottom['pixels'][2], bottom_rgba[8:16, :, 2])
+
+        # Empty layers have an empty rect and no channel data
+        assert empty['rect'] == (0, 0, 0, 0)
+        assert not empty['pixels']
+        assert [i for i, _ in empty['channel_info']] == [0, 1, 2, -1]
+
+
+def test_write_psd():
+    check_written_layers(psb=False)
+
+
+def test_write_psb():
+    check_written_layers(psb=True)
+
+
+def test_create_layered_psd():
+    """ Layer images read from layer buffers, one of them stored cropped with it's offset """
+    with tempfile.TemporaryDirectory() as tmp:
+        img_path = Path(tmp)
+        buffer_dir = img_path / OpenImageUtil.layer_buffer_dir_name
+        buffer_dir.mkdir()
+
+        images = {
+            't_int_door_001_pfad': layer_rgba(1, 2, 3, 4, (255, 0, 0)),
+            'ext_roof_002_pfad': np.full((5, 6, 4), 255, dtype=np.uint8),
+            'seat_003_pfad': np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8),
+        }
+        for stem, rgba in images.items():
+            (img_path / f'{stem}.png').write_bytes(b'')
+            np.save((buffer_dir / f'{stem}.npy').as_posix(), rgba)
+
+        OpenImageUtil.write_layer_offsets(img_path, {'ext_roof_002_pfad': (10, 4)})
+
+        psd_file = img_path / 'layers.psd'
+        assert create_layered_psd(psd_file, img_path, 'png', WIDTH, HEIGHT)
+
+        psd = read_psd(psd_file)
+        assert not psd['psb'] and (psd['width'], psd['height']) == (WIDTH, HEIGHT)
+
+        names = {l['name']: l for l in psd['layers']}
+        assert set(names) == {mladenka_renamer(stem) for stem in images}
+        assert set(names) == {'door_int', 'roof_ext', 'seat'}
+
+        assert names['door_int']['rect'] == (1, 2, 4, 6)
+        assert names['roof_ext']['rect'] == (4, 10, 9, 16)
+        assert names['seat']['rect'] == (0, 0, 0, 0)
+        assert np.array_equal(names['door_int']['pixels'][0], np.full((3, 4), 255, dtype=np.uint8))
+
+
+def test_staged_writer_resolution():
+    """ Writers staging layers during the job are created with default resolution """
+    with tempfile.TemporaryDirectory() as tmp:
+        img_path = Path(tmp)
+        buffer_dir = img_path / OpenImageUtil.layer_buffer_dir_name
+        buffer_dir.mkdir()
+
+        img_file = img_path / 'door_001_pfad.png'
+        img_file.write_bytes(b'')
+        np.save((buffer_dir / 'door_001_pfad.npy').as_posix(), layer_rgba(1, 2, 3, 4, (255, 0, 0)))
+
+        psd_file = img_path / 'layers.psd'
+        writer = IncrementalPsdWriter(psd_file, 4000, 2000, workers=1)
+        try:
+            writer.add_layer_file(img_file)
+            assert create_layered_psd(psd_file, img_path, 'png', WIDTH, HEIGHT, writer=writer)
+        finally:
+            writer.close()
+
+        psd = read_psd(psd_file)
+        assert (psd['width'], psd['height']) == (WIDTH, HEIGHT)
+        assert psd['layers'][0]['rect'] == (1, 2, 4, 6)
+
+
+@pytest.mark.skipif(not IMAGE_OUTPUT, reason='OpenImageIO ImageOutput is not available')
+def test_expand_cropped_layers():
+    """ Cropped layer images are expanded to full frame for the mayapy PSD creation """
+    with tempfile.TemporaryDirectory() as tmp:
+        img_path = Path(tmp)
+        full_frame = {'door': layer_rgba(1, 2, 3, 4, (255, 0, 0)), 'roof': layer_rgba(9, 14, 7, 10, (0, 0, 255))}
+        # Bounding boxes as left, top, right, bottom
+        bboxes = {'door': (2, 1, 6, 4), 'roof': (14, 9, 24, 16)}
+
+        for stem, (x0, y0, x1, y1) in bboxes.items():
+            OpenImageUtil.write_image(img_path / f'{stem}.png', np.ascontiguousarray(full_frame[stem][y0:y1, x0:x1]))
+        OpenImageUtil.write_layer_offsets(img_path, {stem: bbox[:2] for stem, bbox in bboxes.items()})
+
+        assert expand_cropped_layers(img_path, 'png', WIDTH, HEIGHT) == 2
+        assert not (img_path / OpenImageUtil.layer_offsets_file_name).exists()
+
+        for stem, rgba in full_frame.items():
+            assert np.array_equal(OpenImageUtil.read_image(img_path / f'{stem}.png'), rgba)
+
+        # Layers are placed at their offsets without the offsets file
+        psd_file = img_path / 'layers.psd'
+        assert create_layered_psd(psd_file, img_path, 'png', WIDTH, HEIGHT)
+
+        names = {l['name']: l for l in read_psd(psd_file)['layers']}
+        assert names['door']['rect'] == (1, 2, 4, 6)
+        assert names['roof']['rect'] == (9, 14, 16, 24)
+
+
+if __name__ == '__main__':
+    tests = [test_packbits_round_trip, test_write_psd, test_write_psb, test_create_layered_psd,
+             test_staged_writer_resolution]
+    if IMAGE_OUTPUT:
+        tests.append(test_expand_cropped_layers)
+
+    for test in tests:
+        test()
+    print('PsdWriter tests passed.')